@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+OPENAI_MODELS = [
+    "gpt-3.5-turbo",
+    "gpt-4-1106-preview",
+    "gpt-4-0125-preview",
+    "gpt-4o-2024-05-13",
+    "gpt-4o-mini-2024-07-18"
+]
+
+ANTHROPIC_MODELS = [
+    "claude-3-opus-20240229",
+    "claude-3-5-sonnet-20240620",
+    "claude-3-haiku-20240307"
+]
+
+HUGGINGFACE_MODELS = [
+    "meta-llama/Llama-2-70b-chat-hf",
+    "mistralai/Mixtral-8x7B-Instruct-v0.1",
+    "mistralai/Mistral-7B-Instruct-v0.3",
+    "google/gemma-2-9b-it",
+    "google/gemma-7b-it",
+    "google/gemma-2b-it",
+    "meta-llama/Meta-Llama-3-70B-Instruct",
+    "microsoft/Phi-3-mini-128k-instruct",
+]
+
+class Backend:
+    """A named provider of chat models for the model names it matches."""
+
+    def __init__(self, name, factory, models=None, pattern=None):
+        """
+        Initializes a backend.
+
+        Parameters:
+            name: The provider name, used e.g. for per-provider concurrency limits.
+            factory: A function (model, temperature, cache) returning a langchain chat model or LLM.
+            models: A list of model names served by this backend (default None).
+            pattern: A regular expression matching the model names served by this backend (default None).
+         """
+        self.name = name
+        self.factory = factory
+        self.models = list(models or [])
+        self.pattern = re.compile(pattern) if pattern else None
+
+    def matches(self, model):
+        return model in self.models or (self.pattern is not None and self.pattern.fullmatch(model) is not None)
+
+# Backends in order of precedence; register() puts new backends first so they can override the built-in ones
+REGISTRY = []
+
+_clients = {}
+_lock = threading.Lock()
+
+def register(name, factory, models=None, pattern=None):
+    """
+    Registers a backend and returns it.
+
+    Parameters:
+        name: The provider name.
+        factory: A function (model, temperature, cache) returning a langchain chat model or LLM.
+        models: A list of model names served by the backend (default None).
+        pattern: A regular expression matching the model names served by the backend (default None).
+    """
+    backend = Backend(name, factory, models, pattern)
+    REGISTRY.insert(0, backend)
+    return backend
+
+def backend(model):
+    """Returns the backend serving a model, raising an exception if there is none."""
+    for candidate in REGISTRY:
+        if candidate.matches(model):
+            return candidate
+    raise Exception(f'Model {model} not supported')
+
+def create(model, temperature=0.1, cache=None):
+    """
+    Returns a langchain model for a model name from the backend serving it.
+
+    Parameters:
+        model: The name of the model, e.g. "gpt-4o-2024-05-13" or "local:llama3".
+        temperature: The temperature parameter for the model (default 0.1).
+        cache: A langchain cache for the model, or None (default None).
+    """
+    return backend(model).factory(model, temperature, cache)
+
+def shared_client(key, factory):
+    """
+    Returns the process-wide client stored under key, creating it with factory() on first use.
+
+    Clients own the HTTP connection pools, so every model created with the same key reuses the same warm connections.
+
+    Parameters:
+        key: A hashable key, e.g. (provider, base URL, credentials digest).
+        factory: A function of no arguments returning a new client.
+    """
+    with _lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+def _digest(secret):
+    # Credentials only distinguish pools; they are not kept in the keys in clear
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+def openai_chat(model, temperature=0.1, cache=None, base_url=None, api_key=None):
+    """Returns a ChatOpenAI model whose HTTP clients are shared per (base URL, API key)."""
+    import openai
+    from langchain_openai import ChatOpenAI
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    key = ("openai", base_url, _digest(api_key))
+    return ChatOpenAI(
+        model_name=model,
+        temperature=temperature,
+        cache=cache,
+        openai_api_key=api_key,
+        openai_api_base=base_url,
+        http_client=shared_client(key + ("sync",), openai.DefaultHttpxClient),
+        http_async_client=shared_client(key + ("async",), openai.DefaultAsyncHttpxClient)
+    )
+
+def anthropic_chat(model, temperature=0.1, cache=None, base_url=None, api_key=None):
+    """Returns a ChatAnthropic model whose Anthropic clients are shared per (API URL, API key)."""
+    import anthropic
+    from langchain_anthropic import ChatAnthropic
+    llm = ChatAnthropic(
+        temperature=temperature,
+        anthropic_api_key=api_key or os.environ["ANTHROPIC_API_KEY"],
+        anthropic_api_url=base_url,
+        model_name=model,
+        cache=cache
+    )
+    params = {
+        "api_key": llm.anthropic_api_key.get_secret_value(),
+        "base_url": llm.anthropic_api_url,
+        "max_retries": llm.max_retries,
+        "timeout": llm.default_request_timeout,
+    }
+    key = ("anthropic", params["base_url"], _digest(params["api_key"]), params["max_retries"], params["timeout"])
+    # ChatAnthropic builds its own clients in a validator and exposes no parameter to pass them in
+    object.__setattr__(llm, "_client", shared_client(key + ("sync",), lambda: anthropic.Client(**params)))
+    object.__setattr__(llm, "_async_client", shared_client(key + ("async",), lambda: anthropic.AsyncClient(**params)))
+    return llm
+
+def huggingface_endpoint(model, temperature=0.1, cache=None, endpoint_url=None):
+    """
+    Returns a HuggingFaceEndpoint; huggingface_hub already shares one HTTP session across its clients.
+    With an endpoint_url, e.g. a text-generation-inference server, the model is served there without a token.
+    """
+    from langchain_huggingface import HuggingFaceEndpoint
+    if endpoint_url is not None:
+        return HuggingFaceEndpoint(endpoint_url=endpoint_url, temperature=temperature, timeout=300, cache=cache)
+    return HuggingFaceEndpoint(
+        repo_id=model,
+        temperature=temperature,
+        timeout=300,
+        huggingfacehub_api_token=os.environ["HUGGINGFACEHUB_API_TOKEN"],
+        cache=cache
+    )
+
+def local_chat(model, temperature=0.1, cache=None):
+    """
+    Returns a ChatOpenAI model for a "local:<name>" model served by an OpenAI-compatible server,
+    e.g. vLLM, llama.cpp or Ollama, at LOCAL_LLM_BASE_URL (default "http://localhost:8000/v1").
+    """
+    return openai_chat(
+        model.split(":", 1)[1],
+        temperature,
+        cache,
+        base_url=os.environ.get("LOCAL_LLM_BASE_URL", "http://localhost:8000/v1"),
+        api_key=os.environ.get("LOCAL_LLM_API_KEY", "local")
+    )
+
+def replay_key(prompt):
+    """Returns the key of a prompt in a replay file."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+class ReplayChatModel(BaseChatModel):
+    """Deterministic in-process chat model answering from recorded completions keyed by prompt."""
+
+    responses: Dict[str, str] = {}
+    default: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self.responses.get(replay_key(prompt), self.default)
+        if text is None:
+            raise Exception(f'No recorded response for prompt {replay_key(prompt)}')
+        for sequence in stop or []:
+            text = text.split(sequence, 1)[0]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+def replay_chat(model, temperature=0.1, cache=None):
+    """
+    Returns a ReplayChatModel for a "replay:<path>" model, reading a JSON object mapping replay_key(prompt)
+    to completion text; a "*" entry is returned for prompts that were not recorded.
+    """
+    path = model.split(":", 1)[1] if ":" in model else os.environ.get("REPLAY_PATH")
+    responses = json.load(open(path, "r")) if path else {}
+    return ReplayChatModel(responses=responses, default=responses.get("*"), cache=cache)
+
+register("huggingface", huggingface_endpoint, models=HUGGINGFACE_MODELS)
+register("anthropic", anthropic_chat, models=ANTHROPIC_MODELS)
+register("openai", openai_chat, models=OPENAI_MODELS)
+register("local", local_chat, pattern=r"local:.+")
+register("replay", replay_chat, pattern=r"replay(:.+)?")
@@ -0,0 +1,242 @@
+"""
+Offline runs through the provider batch APIs (OpenAI Batch, Anthropic Message Batches) for any LLM
+subclass, e.g. Intension or FNExampleGenerator.
+
+    workdir/requests.jsonl  the rendered prompts as batch requests in the provider's format
+    workdir/job.json        the provider, batch id and last known status, so an interrupted run resumes polling
+    workdir/results.jsonl   the batch output in the provider's format
+
+Responses are parsed by the LLM's own output parser into the standard result records. LocalBatches
+answers request files through a langchain model in the same formats, for testing without a provider.
+"""
+import json
+import os
+import time
+from engine import to_record
+
+def custom_id(i):
+    return f"query-{i}"
+
+class OpenAIBatches:
+    """OpenAI Batch API: JSONL requests to /v1/chat/completions uploaded as a file, results downloaded as a file."""
+
+    FORMAT = "openai"
+
+    def __init__(self, client=None):
+        if client is None:
+            import openai
+            client = openai.OpenAI()
+        self.client = client
+
+    def submit(self, path):
+        upload = self.client.files.create(file=open(path, "rb"), purpose="batch")
+        return self.client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h").id
+
+    def status(self, batch_id):
+        """Returns "ended", "failed" or "running"."""
+        status = self.client.batches.retrieve(batch_id).status
+        return "ended" if status == "completed" else "failed" if status in ("failed", "expired", "cancelled") else "running"
+
+    def download(self, batch_id, path):
+        batch = self.client.batches.retrieve(batch_id)
+        with open(path, "w") as f:
+            # Requests that failed are reported in a separate error file in the same line format
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).text)
+
+class AnthropicBatches:
+    """Anthropic Message Batches API: requests sent in the body of the create call, results streamed back as JSONL."""
+
+    FORMAT = "anthropic"
+
+    def __init__(self, client=None):
+        if client is None:
+            import anthropic
+            client = anthropic.Anthropic()
+        self.client = client
+
+    def submit(self, path):
+        return self.client.messages.batches.create(requests=list(read_jsonl(path))).id
+
+    def status(self, batch_id):
+        """Returns "ended" or "running"; failed requests are reported per result."""
+        return "ended" if self.client.messages.batches.retrieve(batch_id).processing_status == "ended" else "running"
+
+    def download(self, batch_id, path):
+        with open(path, "w") as f:
+            for result in self.client.messages.batches.results(batch_id):
+                f.write(result.model_dump_json() + "\n")
+
+class LocalBatches:
+    """Stand-in for a provider batch API that answers a request file through a langchain model, in the provider's formats."""
+
+    def __init__(self, model=None, format="openai", delay=0.0):
+        """
+        Initializes a local batch API.
+
+        Parameters:
+            model: The langchain chat model or LLM answering the requests, e.g. a backends.ReplayChatModel
+                (default None, backends.create() for each request's model).
+            format: The batch format read and written, "openai" or "anthropic" (default "openai").
+            delay: The seconds before a submitted batch ends, to exercise polling (default 0.0).
+         """
+        self.FORMAT = format
+        self.model = model
+        self.delay = delay
+
+    def submit(self, path):
+        # The batch id is the request file, with the batch's end time kept beside it, so that polling resumes across processes
+        json.dump({ "ends": time.time() + self.delay }, open(f"{path}.local", "w+"))
+        return path
+
+    def status(self, batch_id):
+        return "ended" if time.time() >= json.load(open(f"{batch_id}.local", "r"))["ends"] else "running"
+
+    def download(self, batch_id, path):
+        import backends
+        with open(path, "w") as f:
+            for request in read_jsonl(batch_id):
+                body = request["body"] if self.FORMAT == "openai" else request["params"]
+                model = self.model or backends.create(body["model"], body.get("temperature", 0.1))
+                stop = body.get("stop") if self.FORMAT == "openai" else body.get("stop_sequences")
+                try:
+                    output = model.invoke(body["messages"][-1]["content"], stop=stop)
+                    text = output if isinstance(output, str) else output.content
+                    f.write(json.dumps(self._succeeded(request["custom_id"], body["model"], text)) + "\n")
+                except Exception as e:
+                    f.write(json.dumps(self._errored(request["custom_id"], f"{type(e).__name__}: {e}")) + "\n")
+
+    def _succeeded(self, custom_id, model, text):
+        if self.FORMAT == "openai":
+            message = { "role": "assistant", "content": text }
+            body = { "object": "chat.completion", "model": model, "choices": [ { "index": 0, "message": message, "finish_reason": "stop" } ] }
+            return { "custom_id": custom_id, "response": { "status_code": 200, "body": body }, "error": None }
+        message = { "type": "message", "role": "assistant", "model": model, "content": [ { "type": "text", "text": text } ], "stop_reason": "end_turn" }
+        return { "custom_id": custom_id, "result": { "type": "succeeded", "message": message } }
+
+    def _errored(self, custom_id, message):
+        if self.FORMAT == "openai":
+            return { "custom_id": custom_id, "response": None, "error": { "code": "local_error", "message": message } }
+        return { "custom_id": custom_id, "result": { "type": "errored", "error": { "type": "local_error", "message": message } } }
+
+def read_jsonl(path):
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def batch_api(llm):
+    """Returns the batch API client for the provider of an LLM, raising an exception for providers without one."""
+    if llm.provider == "openai":
+        return OpenAIBatches()
+    if llm.provider == "anthropic":
+        return AnthropicBatches()
+    raise Exception(f'Provider {llm.provider} has no batch API; use LocalBatches')
+
+def write_requests(llm, queries, path, format):
+    """
+    Renders the prompts of an LLM for queries into a batch request file and returns the number of requests.
+
+    Requests carry the model, temperature and stop sequences of interactive calls, and the JSON mode of
+    structured LLMs, so that batch and interactive runs are comparable.
+
+    Parameters:
+        llm: An LLM instance, e.g. an Intension or FNExampleGenerator.
+        queries: A list of query dicts.
+        path: The path of the JSONL request file.
+        format: "openai" or "anthropic".
+    """
+    model = llm.model.split(":", 1)[1] if llm.provider == "local" else llm.model
+    bound = getattr(llm.llm, "kwargs", {})
+    with open(path, "w") as f:
+        for i, query in enumerate(queries):
+            body = {
+                "model": model,
+                "messages": [ { "role": "user", "content": llm.chain.prompt.format(**query) } ],
+                "temperature": llm.temperature,
+            }
+            if format == "openai":
+                if llm.STOP_SEQUENCES:
+                    body["stop"] = llm.STOP_SEQUENCES
+                if "response_format" in bound:
+                    body["response_format"] = bound["response_format"]
+                request = { "custom_id": custom_id(i), "method": "POST", "url": "/v1/chat/completions", "body": body }
+            else:
+                body["max_tokens"] = getattr(getattr(llm.llm, "bound", llm.llm), "max_tokens", None) or 1024
+                if llm.STOP_SEQUENCES:
+                    body["stop_sequences"] = llm.STOP_SEQUENCES
+                request = { "custom_id": custom_id(i), "params": body }
+            f.write(json.dumps(request) + "\n")
+    return len(queries)
+
+def read_results(path, format):
+    """Yields (custom_id, text, error) for each response in a batch output file, with text None for failed requests."""
+    for result in read_jsonl(path):
+        if format == "openai":
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                yield result["custom_id"], None, json.dumps(result.get("error") or response.get("body"))
+            else:
+                yield result["custom_id"], response["body"]["choices"][0]["message"]["content"], None
+        else:
+            outcome = result["result"]
+            if outcome["type"] != "succeeded":
+                yield result["custom_id"], None, json.dumps(outcome.get("error") or outcome["type"])
+            else:
+                yield result["custom_id"], "".join(block.get("text", "") for block in outcome["message"]["content"]), None
+
+def run_batch(llm, queries, workdir, api=None, poll_every=60, timeout=None):
+    """
+    Runs an LLM over queries through a batch API and returns the result records in query order.
+
+    The prompts are written and submitted once; rerunning with the same workdir resumes polling the
+    submitted batch. Failed requests, and outputs the LLM's parser rejects, yield records with an "error" entry.
+
+    Parameters:
+        llm: An LLM instance, e.g. an Intension or FNExampleGenerator.
+        queries: A list of query dicts.
+        workdir: The directory holding the request, job and result files of the run.
+        api: The batch API, e.g. LocalBatches() (default batch_api(llm)).
+        poll_every: The seconds between status checks (default 60).
+        timeout: The seconds to wait before raising an exception; the batch keeps running and can be resumed (default None, no limit).
+    """
+    api = api or batch_api(llm)
+    os.makedirs(workdir, exist_ok=True)
+    requests, job_path, results = (os.path.join(workdir, name) for name in ("requests.jsonl", "job.json", "results.jsonl"))
+    job = json.load(open(job_path, "r")) if os.path.isfile(job_path) else None
+    if job is None:
+        write_requests(llm, queries, requests, api.FORMAT)
+        job = { "format": api.FORMAT, "model": llm.model, "requests": len(queries), "batch_id": api.submit(requests), "status": "running" }
+        json.dump(job, open(job_path, "w+"))
+    elif job["requests"] != len(queries) or job["model"] != llm.model:
+        raise Exception(f'Batch in {workdir} was submitted for other queries or another model')
+    start = time.time()
+    while job["status"] == "running":
+        job["status"] = api.status(job["batch_id"])
+        json.dump(job, open(job_path, "w+"))
+        if job["status"] == "running":
+            if timeout is not None and time.time() - start > timeout:
+                raise Exception(f'Batch {job["batch_id"]} still running after {timeout}s; rerun to resume polling')
+            time.sleep(poll_every)
+    if job["status"] == "failed":
+        raise Exception(f'Batch {job["batch_id"]} failed')
+    if not os.path.isfile(results):
+        api.download(job["batch_id"], f"{results}.tmp")
+        os.replace(f"{results}.tmp", results)
+    responses = { key: (text, error) for key, text, error in read_results(results, job["format"]) }
+    records = []
+    for i, query in enumerate(queries):
+        text, error = responses.get(custom_id(i), (None, "No response in batch output"))
+        parsed = {}
+        if text is not None:
+            try:
+                parsed = llm.chain.output_parser.parse(text)
+            except Exception as e:
+                # An output the parser rejects fails its own record rather than the whole batch
+                error = f"{type(e).__name__}: {e}"
+        record = to_record(query, { "text": parsed }, llm.model)
+        if error is not None:
+            record["error"] = error
+        records.append(record)
+    return records
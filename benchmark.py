@@ -0,0 +1,296 @@
+"""
+Offline end-to-end benchmark of the experiment pipeline against the local mock LLM server.
+
+    python -m benchmark --queries 200 --history benchmarks/history.jsonl
+
+Times ontology parsing and closure, query building, rendering of the {graph} slot, chain execution per
+provider wire format, output parsing and metric computation; appends the results to a history file
+and exits with status 1 when a stage is slower, or peaks at more memory, than its recent history.
+A run in which a chain stage has failed requests exits with status 1 and is not added to the history.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from rdflib import Graph, Literal, Namespace, OWL, RDF, RDFS
+import backends
+from closure import load_closure
+from engine import AsyncEngine
+from intension import Intension
+from metrics import Results
+from mock_server import MockLLM, MockServer
+from parsing import AnswerParser
+from queries import is_testable_triple, to_query
+
+DEFAULT_MODELS = [ "gpt-4o-mini-2024-07-18", "claude-3-haiku-20240307", "meta-llama/Meta-Llama-3-70B-Instruct" ]
+
+def synthetic_ontology(classes=300, properties=40, seed=0):
+    """
+    Returns the Turtle text of a random ontology with a class hierarchy, and properties with
+    super-properties, domains, ranges and comments, shaped like the NeSy4VRD ontology.
+
+    Parameters:
+        classes: The number of classes (default 300).
+        properties: The number of object properties (default 40).
+        seed: The random seed (default 0).
+    """
+    rng = random.Random(seed)
+    ns = Namespace("http://example.org/benchmark#")
+    graph = Graph()
+    graph.bind("", ns)
+    graph.bind("owl", OWL)
+    names = [ ns[f"Class{i}"] for i in range(classes) ]
+    for i, name in enumerate(names):
+        graph.add((name, RDF.type, OWL.Class))
+        graph.add((name, RDFS.subClassOf, names[rng.randrange(i)] if i else OWL.Thing))
+        graph.add((name, RDFS.comment, Literal(f"Class {i} of the benchmark ontology.", lang="en")))
+    for i in range(properties):
+        name = ns[f"property{i}"]
+        graph.add((name, RDF.type, OWL.ObjectProperty))
+        if i:
+            graph.add((name, RDFS.subPropertyOf, ns[f"property{rng.randrange(i)}"]))
+        graph.add((name, RDFS.domain, rng.choice(names)))
+        graph.add((name, RDFS.range, rng.choice(names)))
+    return graph.serialize(format="turtle")
+
+def use_mock(url):
+    """Routes the OpenAI, Anthropic and Hugging Face model names to a mock server, keeping their provider names and limits."""
+    backends.register("openai", lambda model, temperature, cache: backends.openai_chat(model, temperature, cache, base_url=f"{url}/v1", api_key="mock"),
+                      models=backends.OPENAI_MODELS)
+    backends.register("anthropic", lambda model, temperature, cache: backends.anthropic_chat(model, temperature, cache, base_url=url, api_key="mock"),
+                      models=backends.ANTHROPIC_MODELS)
+    backends.register("huggingface", lambda model, temperature, cache: backends.huggingface_endpoint(model, temperature, cache, endpoint_url=f"{url}/hf/{model}"),
+                      models=backends.HUGGINGFACE_MODELS)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+class Benchmark:
+    """End-to-end benchmark of the pipeline stages, each timed over repeated runs after a warm-up run that measures memory."""
+
+    def __init__(self, ontology=None, format="turtle", queries=200, models=DEFAULT_MODELS, streaming=False, mock=None, repeat=3):
+        """
+        Initializes a benchmark.
+
+        Parameters:
+            ontology: The path of the ontology file (default None, a synthetic_ontology() written to a temporary file).
+            format: The rdflib format of the ontology (default "turtle").
+            queries: The number of inferred triples sampled as queries (default 200).
+            models: The model names run against the mock server, one per wire format (default DEFAULT_MODELS).
+            streaming: True to stream completions (default False).
+            mock: The MockLLM simulating the models (default a MockLLM with default settings).
+            repeat: The number of timed runs of each stage (default 3).
+         """
+        # Removed by close(); use the benchmark as a context manager
+        self.temporary = tempfile.TemporaryDirectory(prefix="benchmark-")
+        self.directory = self.temporary.name
+        if ontology is None:
+            ontology = os.path.join(self.directory, "ontology.ttl")
+            with open(ontology, "w") as f:
+                f.write(synthetic_ontology())
+        self.ontology = ontology
+        self.format = format
+        self.queries = queries
+        self.models = models
+        self.streaming = streaming
+        self.mock = mock or MockLLM()
+        self.repeat = repeat
+        self.state = {}
+
+    def config(self):
+        """Returns the settings that make runs comparable; history is only compared between runs with equal configs."""
+        with open(self.ontology, "rb") as f:
+            ontology = hashlib.sha256(f.read()).hexdigest()[:16]
+        mock = { name: getattr(self.mock, name) for name in ("latency", "tokens_per_second", "completion_tokens", "rate_limit", "max_concurrent", "malformed") }
+        return { "ontology": ontology, "queries": self.queries, "models": self.models, "streaming": self.streaming, "mock": mock }
+
+    def stages(self):
+        """Returns the (name, function) pairs of the stages in pipeline order; each function returns the number of items processed."""
+        stages = [
+            ("parse_closure", self.parse_closure),
+            ("build_queries", self.build_queries),
+            ("render_prompts", self.render_prompts),
+        ]
+        stages += [ (f"chain:{backends.backend(model).name}", lambda model=model: self.run_chain(model)) for model in self.models ]
+        stages += [
+            ("parse_outputs", self.parse_outputs),
+            ("compute_metrics", self.compute_metrics),
+        ]
+        return stages
+
+    def parse_closure(self):
+        # A fresh cache directory, so that the parse and the reasoner run every time
+        with tempfile.TemporaryDirectory(dir=self.directory) as cache_dir:
+            graph, _, inferred = load_closure(self.ontology, self.format, cache_dir=cache_dir)
+        self.state.update(graph=graph, inferred=inferred, text=open(self.ontology, "r").read())
+        return len(graph) + len(inferred)
+
+    def build_queries(self):
+        triples = sorted(filter(is_testable_triple, self.state["inferred"]))
+        triples = random.Random(0).sample(triples, min(self.queries, len(triples)))
+        self.state["queries"] = [ to_query(self.state["graph"], triple, self.state["text"]) for triple in triples ]
+        return len(self.state["queries"])
+
+    def render_prompts(self):
+        prompt = Intension.PROMPT
+        self.state["prompts"] = [ prompt.format(**query) for query in self.state["queries"] ]
+        return len(self.state["prompts"])
+
+    def run_chain(self, model):
+        llm = Intension(model, cache=False, streaming=self.streaming)
+        engine = AsyncEngine(base_delay=0.01)
+        records = asyncio.run(engine.run(llm, self.state["queries"], desc=f"{model:36}"))
+        self.state.setdefault("results", {})[model] = records
+        self.state.setdefault("extra", {})[f"chain:{backends.backend(model).name}"] = {
+            "errors": sum("error" in r for r in records),
+            "unparsed": sum(r.get("answer") not in ("0", "1") for r in records if "error" not in r),
+            "retries": engine.retries,
+        }
+        return len(records)
+
+    def parse_outputs(self):
+        parser = AnswerParser()
+        outputs = self.state.get("outputs")
+        if outputs is None:
+            outputs = self.state["outputs"] = [ "".join(self.mock.complete(prompt, Intension.STOP_SEQUENCES)) for prompt in self.state["prompts"] ]
+        # Parsing is fast, so the outputs are parsed many times over to time it above the clock resolution
+        rounds = max(1, 20000 // max(len(outputs), 1))
+        for _ in range(rounds):
+            for output in outputs:
+                parser.parse(output)
+        return rounds * len(outputs)
+
+    def compute_metrics(self):
+        results = Results.from_records(self.state["results"])
+        results.summary()
+        results.breakdown()
+        results.bootstrap(resamples=200)
+        return len(results.models) * len(results.triples)
+
+    def run(self):
+        """Runs every stage and returns a history record of the per-stage timings, throughputs and peak memory."""
+        stages = {}
+        for name, stage in self.stages():
+            tracemalloc.start()
+            stage()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            seconds, items = [], 0
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                items = stage()
+                seconds.append(time.perf_counter() - start)
+            stages[name] = {
+                "seconds": min(seconds),
+                "median_seconds": statistics.median(seconds),
+                "items": items,
+                "items_per_second": items / min(seconds) if min(seconds) else None,
+                "peak_mb": peak / 2**20,
+                **self.state.get("extra", {}).get(name, {}),
+            }
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "config": self.config(),
+            "stages": stages,
+            "mock": self.mock.stats(),
+        }
+
+    def close(self):
+        self.temporary.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_history(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r") as f:
+        return [ json.loads(line) for line in f if line.strip() ]
+
+def regressions(history, run, tolerance=0.25, window=5):
+    """
+    Returns a list of (stage, measure, baseline, value) for the stages of a run that are slower, or peak
+    at more memory, than tolerance above the median of the last window comparable runs in history.
+
+    Parameters:
+        history: A list of earlier run records, oldest first.
+        run: The run record to check.
+        tolerance: The allowed relative increase (default 0.25).
+        window: The number of earlier comparable runs the baseline is the median of (default 5).
+    """
+    previous = [ r for r in history if r["config"] == run["config"] ][-window:]
+    found = []
+    for name, stage in run["stages"].items():
+        for measure in ("seconds", "peak_mb"):
+            values = [ r["stages"][name][measure] for r in previous if name in r["stages"] ]
+            if not values:
+                continue
+            baseline = statistics.median(values)
+            if stage[measure] > baseline * (1 + tolerance):
+                found.append((name, measure, baseline, stage[measure]))
+    return found
+
+def failures(run):
+    """Returns a list of (stage, errors) for the chain stages of a run with failed requests; their timings measure nothing."""
+    return [ (name, stage["errors"]) for name, stage in run["stages"].items() if stage.get("errors") ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmarks the pipeline against a local mock LLM server.")
+    parser.add_argument("--ontology", help="ontology file (default a synthetic ontology)")
+    parser.add_argument("--format", default="turtle", help="rdflib format of the ontology (default turtle)")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries (default 200)")
+    parser.add_argument("--model", action="append", help="model name, one per wire format; repeatable (default one each of OpenAI, Anthropic and HF)")
+    parser.add_argument("--streaming", action="store_true", help="stream completions")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (default 3)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token (default 0.05)")
+    parser.add_argument("--tokens-per-second", type=float, default=1000.0, help="mock generation speed (default 1000)")
+    parser.add_argument("--rate-limit", type=float, default=0.02, help="mock probability of a 429 (default 0.02)")
+    parser.add_argument("--malformed", type=float, default=0.02, help="mock probability of an output without an answer (default 0.02)")
+    parser.add_argument("--history", default="benchmarks/history.jsonl", help="history file (default benchmarks/history.jsonl)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression is reported (default 0.25)")
+    args = parser.parse_args(argv)
+    # A Hugging Face token would make the endpoint client log in to the Hub
+    os.environ.pop("HUGGINGFACEHUB_API_TOKEN", None)
+    mock = MockLLM(args.latency, args.tokens_per_second, rate_limit=args.rate_limit, malformed=args.malformed)
+    with MockServer(mock) as server, Benchmark(args.ontology, args.format, args.queries, args.model or DEFAULT_MODELS,
+                                               args.streaming, mock, args.repeat) as benchmark:
+        use_mock(server.url)
+        run = benchmark.run()
+    failed = failures(run)
+    history = load_history(args.history)
+    found = regressions(history, run, args.tolerance)
+    if not failed:
+        directory = os.path.dirname(args.history)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.history, "a") as f:
+            f.write(json.dumps(run) + "\n")
+    for name, stage in run["stages"].items():
+        rate = f'{stage["items_per_second"]:12.1f}/s' if stage["items_per_second"] else " " * 14
+        errors = f'  {stage["errors"]} errors, {stage["retries"]} retries' if "errors" in stage else ""
+        print(f'{name:20} {stage["seconds"]:8.3f}s {rate} {stage["peak_mb"]:8.1f} MB{errors}')
+    for name, measure, baseline, value in found:
+        print(f"REGRESSION {name} {measure}: {value:.3f} vs median {baseline:.3f}", file=sys.stderr)
+    for name, errors in failed:
+        print(f"FAILED {name}: {errors} failed requests; the run was not added to the history", file=sys.stderr)
+    sys.exit(1 if found or failed else 0)
+
+if __name__ == "__main__":
+    main()
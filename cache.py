@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+class ResponseCache(BaseCache):
+    """Persistent SQLite-backed cache of model responses, shared by every LLM chain in the process."""
+
+    def __init__(self, path=".llm_cache.sqlite", max_entries=None, max_age=None, evict_every=100):
+        """
+        Initializes a response cache stored in a SQLite database file.
+
+        Entries are keyed on a hash of the model configuration string (model name, temperature and
+        other invocation parameters) and the fully rendered prompt (prompt template plus inputs).
+
+        Parameters:
+            path: The path of the SQLite database file (default ".llm_cache.sqlite").
+            max_entries: The maximum number of entries kept; least recently used entries are evicted first (default None, unbounded).
+            max_age: The maximum age of an entry in seconds before it is treated as a miss and evicted (default None, never expires).
+            evict_every: The number of updates between eviction passes (default 100).
+         """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._updates = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, llm_string TEXT, value TEXT, created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age is not None and now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return self._decode(row[0])
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, llm_string, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, dumps(list(return_val)), now, now)
+            )
+            self._updates += 1
+            if self._updates % self.evict_every == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def evict(self):
+        """Removes expired entries and trims the cache to max_entries."""
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _evict(self, now):
+        if self.max_age is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def _decode(self, value):
+        try:
+            generations = loads(value)
+        except Exception:
+            generations = [Generation(text=value)]
+        # Marks the generations as cached for callbacks such as instrumentation.CallTracer
+        for generation in generations:
+            generation.generation_info = { **(generation.generation_info or {}), "cached": True }
+        return generations
+
+class SaltedCache(BaseCache):
+    """View of another cache under a salt, so that repeated samples of the same prompt are cached separately."""
+
+    def __init__(self, cache, salt):
+        """
+        Initializes a salted view of a cache.
+
+        Parameters:
+            cache: The underlying cache, e.g. a ResponseCache.
+            salt: A string distinguishing this view's entries, e.g. the sample number.
+         """
+        self.cache = cache
+        self.salt = salt
+
+    def lookup(self, prompt, llm_string):
+        return self.cache.lookup(prompt, self._salted(llm_string))
+
+    def update(self, prompt, llm_string, return_val):
+        self.cache.update(prompt, self._salted(llm_string), return_val)
+
+    def clear(self, **kwargs):
+        # Entries are not tracked per salt, and clearing the underlying cache would drop every other view's entries too
+        raise Exception("Clear the underlying cache instead of a salted view")
+
+    def _salted(self, llm_string):
+        return f"{llm_string}\x00salt={self.salt}"
+
+_shared_caches = {}
+
+def shared_cache(path=None):
+    """
+    Returns the process-wide ResponseCache for a database file, creating it on first use.
+
+    Parameters:
+        path: The path of the SQLite database file (default the LLM_CACHE_PATH environment variable, or ".llm_cache.sqlite").
+    """
+    path = path or os.environ.get("LLM_CACHE_PATH", ".llm_cache.sqlite")
+    if path not in _shared_caches:
+        _shared_caches[path] = ResponseCache(path)
+    return _shared_caches[path]
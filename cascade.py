@@ -0,0 +1,149 @@
+import asyncio
+import time
+import pandas as pd
+from context import estimate_tokens
+from engine import AsyncEngine
+
+# USD per million prompt and completion tokens, used to estimate the cost of each tier
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4-0125-preview": (10.00, 30.00),
+    "gpt-4-1106-preview": (10.00, 30.00),
+    "gpt-4o-2024-05-13": (5.00, 15.00),
+    "gpt-4o-mini-2024-07-18": (0.15, 0.60),
+    "claude-3-opus-20240229": (15.00, 75.00),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+
+class Cascade:
+    """Cheap-to-expensive cascade of intensions that escalates a triple only when a tier's answer is not trusted."""
+
+    POLICIES = ("negative", "unparsed", "uncertain")
+
+    def __init__(self, tiers, escalate=POLICIES, min_agreement=0.75, engine=None):
+        """
+        Initializes a cascade.
+
+        Parameters:
+            tiers: A list of Intension (or SelfConsistency) instances, cheapest first.
+            escalate: The reasons to pass a triple to the next tier: "negative" (answer 0), "unparsed" (no answer)
+                and "uncertain" (self-consistency samples agree less than min_agreement) (default all three).
+            min_agreement: The fraction of samples that must agree with the majority answer (default 0.75).
+            engine: The AsyncEngine running each tier (default a new AsyncEngine).
+         """
+        for reason in escalate:
+            if reason not in self.POLICIES:
+                raise Exception(f'Unknown escalation policy {reason}')
+        self.tiers = tiers
+        self.escalate = escalate
+        self.min_agreement = min_agreement
+        self.engine = engine or AsyncEngine()
+        self.stats = [ self._counters() for _ in tiers ]
+
+    def run(self, queries):
+        """Classifies queries through the cascade; see arun()."""
+        return asyncio.run(self.arun(queries))
+
+    async def arun(self, queries):
+        """
+        Classifies queries through the cascade and returns records in the order of the queries.
+
+        Each record holds the answer of the tier that settled it, the index of that tier under "tier",
+        and the answers of the tiers it was escalated from under "escalations".
+
+        Parameters:
+            queries: A list of query dicts with "s", "p", "o" and "graph" entries.
+        """
+        results = [None] * len(queries)
+        escalations = [ [] for _ in queries ]
+        remaining = list(range(len(queries)))
+        for t, tier in enumerate(self.tiers):
+            if not remaining:
+                break
+            stats = self.stats[t]
+            timed = _Timed(tier, stats)
+            start = time.perf_counter()
+            records = await self.engine.run(timed, [ queries[i] for i in remaining ], desc=f"tier {t} {tier.model:29}")
+            stats["seconds"] += time.perf_counter() - start
+            last = t == len(self.tiers) - 1
+            escalated = []
+            for i, record in zip(remaining, records):
+                stats["queries"] += 1
+                # A voting tier sends the prompt once per sample; its rationale is a sample's, so completions are approximate
+                samples = len(record.get("samples") or [None])
+                stats["prompt_tokens"] += samples * estimate_tokens(getattr(tier, "intension", tier).chain.prompt.format(**queries[i]))
+                stats["completion_tokens"] += samples * estimate_tokens(record.get("rationale", ""))
+                reason = None if last else self.reason(record)
+                if reason is None:
+                    results[i] = { **record, "tier": t, "escalations": escalations[i] }
+                else:
+                    stats["escalated"] += 1
+                    stats[reason] += 1
+                    escalations[i].append({ "model": record["model"], "answer": record.get("answer", "") })
+                    escalated.append(i)
+            remaining = escalated
+        return results
+
+    def reason(self, record):
+        """Returns the reason a record is escalated, or None if its answer is accepted."""
+        answer = record.get("answer", "")
+        if "unparsed" in self.escalate and answer not in ("0", "1"):
+            return "unparsed"
+        if "negative" in self.escalate and answer == "0":
+            return "negative"
+        samples = record.get("samples")
+        if "uncertain" in self.escalate and samples and samples.count(answer) / len(samples) < self.min_agreement:
+            return "uncertain"
+        return None
+
+    def report(self, results):
+        """
+        Returns a DataFrame with, per tier, the number of triples sent, settled and escalated (by reason),
+        the estimated tokens and cost, the mean latency and wall time, and the agreement of the tier's
+        escalated answers with the final answers.
+
+        Parameters:
+            results: The records returned by run().
+        """
+        rows = []
+        for t, (tier, stats) in enumerate(zip(self.tiers, self.stats)):
+            prompt_price, completion_price = PRICES.get(tier.model, (0.0, 0.0))
+            final = [ (r["escalations"][t]["answer"], r["answer"]) for r in results if len(r["escalations"]) > t ]
+            rows.append({
+                "tier": t,
+                "model": tier.model,
+                "queries": stats["queries"],
+                "settled": stats["queries"] - stats["escalated"],
+                **{ reason: stats[reason] for reason in self.POLICIES },
+                "calls": stats["calls"],
+                "prompt_tokens": stats["prompt_tokens"],
+                "completion_tokens": stats["completion_tokens"],
+                "cost": (stats["prompt_tokens"] * prompt_price + stats["completion_tokens"] * completion_price) / 1e6,
+                "mean_latency": stats["latency"] / stats["calls"] if stats["calls"] else 0.0,
+                "seconds": stats["seconds"],
+                "agreement": sum(a == b for a, b in final) / len(final) if final else None,
+            })
+        return pd.DataFrame(rows)
+
+    def _counters(self):
+        counters = { "queries": 0, "escalated": 0, "calls": 0, "latency": 0.0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0 }
+        counters.update({ reason: 0 for reason in self.POLICIES })
+        return counters
+
+class _Timed:
+    # Passes calls through to a tier, adding each call's latency to the tier's counters
+
+    def __init__(self, llm, stats):
+        self.llm = llm
+        self.model = llm.model
+        self.provider = llm.provider
+        self.stats = stats
+
+    async def ainvoke(self, query):
+        start = time.perf_counter()
+        try:
+            return await self.llm.ainvoke(query)
+        finally:
+            self.stats["calls"] += 1
+            self.stats["latency"] += time.perf_counter() - start
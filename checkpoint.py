@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+
+class RunWriter:
+    """Append-only JSONL writer for experiment results that supports resuming interrupted runs."""
+
+    KEY_FIELDS = ("model", "s", "p", "o")
+
+    def __init__(self, path, fsync_every=10):
+        """
+        Opens a JSONL results file for appending, recovering the keys of results already written.
+
+        A partially written trailing line left by a crash is truncated before appending, and complete lines
+        that do not decode as records are dropped.
+
+        Parameters:
+            path: The path of the JSONL results file, e.g. "experiments/nesy4vrd/claude-3-haiku-20240307-owl-inf.jsonl".
+            fsync_every: The number of records written between fsyncs of the file; 0 only flushes (default 10).
+         """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.completed = set()
+        self._unsynced = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def key(cls, record):
+        return tuple(record.get(field) for field in cls.KEY_FIELDS)
+
+    def is_complete(self, query, model):
+        return self.key({ **query, "model": model }) in self.completed
+
+    def remaining(self, queries, model):
+        """
+        Yields the queries for a model whose results have not yet been written.
+
+        Parameters:
+            queries: An iterable of query dicts with "s", "p" and "o" entries.
+            model: The name of the model the queries are run against.
+        """
+        for query in queries:
+            if not self.is_complete(query, model):
+                yield query
+
+    def write(self, record):
+        """
+        Appends a result record, e.g. { "s", "p", "o", "model", "rationale", "answer" }, to the file.
+
+        Parameters:
+            record: The result record to append.
+        """
+        self._file.write(json.dumps(record) + "\n")
+        self.completed.add(self.key(record))
+        self._unsynced += 1
+        if self._unsynced >= max(self.fsync_every, 1):
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        if self.fsync_every:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recover(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            good, corrupt = 0, 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                good += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    self.completed.add(self.key(_decode(line)))
+                except ValueError:
+                    corrupt += 1
+            f.truncate(good)
+        if corrupt:
+            # Rare, so the file is only rewritten when it holds undecodable lines
+            with open(self.path, "rb") as f, open(f"{self.path}.tmp", "wb") as out:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        _decode(line)
+                    except ValueError:
+                        continue
+                    out.write(line)
+            os.replace(f"{self.path}.tmp", self.path)
+            print(f"{self.path}: dropped {corrupt} undecodable lines", file=sys.stderr)
+
+def _decode(line):
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError(f"Not a result record: {line!r}")
+    return record
+
+def read_records(path):
+    """
+    Yields the result records of a JSONL results file one at a time, skipping lines that do not decode as records.
+
+    Parameters:
+        path: The path of the JSONL results file.
+    """
+    skipped = 0
+    # Read as bytes, so that a line with invalid UTF-8 is skipped like any other undecodable line
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = _decode(line)
+            except ValueError:
+                skipped += 1
+                continue
+            yield record
+    if skipped:
+        print(f"{path}: skipped {skipped} undecodable lines", file=sys.stderr)
+
+def export_json(path, filename):
+    """
+    Streams a JSONL results file into the JSON array format read by the metric notebooks.
+
+    Parameters:
+        path: The path of the JSONL results file.
+        filename: The path of the JSON file to write, e.g. "experiments/nesy4vrd/claude-3-haiku-20240307-owl-inf.json".
+    """
+    with open(filename, "w+", encoding="utf-8") as f:
+        f.write("[")
+        for i, record in enumerate(read_records(path)):
+            f.write((", " if i else "") + json.dumps(record))
+        f.write("]")
@@ -0,0 +1,347 @@
+"""
+Command-line experiment runner covering the data preparation, run and exemplar generation notebooks.
+
+    python -m cli prepare --ontology data/NeSy4VRD/nesy4vrd_ontology/vrd_world_v1.owl --split test=100 --split train=100
+    python -m cli run --model gpt-4o-mini-2024-07-18 --split test
+    python -m cli exemplars --model claude-3-haiku-20240307 --results experiments/nesy4vrd/claude-3-haiku-20240307-train.json
+
+python -m intension runs the same commands, with the import of the intension and llm modules counted in its startup.
+
+Modules are imported only by the commands that need them, and provider packages only for the models
+actually run, so short-lived workers start quickly; import and startup times are reported on stderr,
+with the time spent loading the ontology, closure and queries reported apart from startup.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+IMPORT_TIMES = {}
+
+# Time spent in a command's own work before startup is reported, e.g. computing the closure, kept out of the startup time
+PHASE_TIMES = {}
+
+REPORTED = False
+
+INTENSIONS = {
+    "intension": "intension",
+    "v2": "intension_v2",
+    "v2-test": "intension_v2_test",
+}
+
+def lazy_import(name):
+    """Imports a module, recording how long the import took if it was not already loaded."""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+@contextlib.contextmanager
+def phase(name):
+    """Times a step of a command, e.g. computing the closure, so that it is reported apart from startup."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_TIMES[name] = PHASE_TIMES.get(name, 0.0) + time.perf_counter() - start
+
+def report_startup(stream=sys.stderr):
+    """
+    Prints, once per process, the time since the runner was loaded less the phases timed so far,
+    the time spent in each lazy import, and the time of each phase.
+    """
+    global REPORTED
+    if REPORTED:
+        return
+    REPORTED = True
+    startup = time.perf_counter() - STARTED - sum(PHASE_TIMES.values())
+    imports = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in IMPORT_TIMES.items())
+    phases = "".join(f"; {name} {seconds:.2f}s" for name, seconds in PHASE_TIMES.items())
+    print(f"startup {startup:.2f}s (imports: {imports or 'none'}){phases}", file=stream)
+
+def queries_path(data, experiment, split):
+    return os.path.join(data, f"experiment_{experiment}_{split}_set.json")
+
+def results_path(experiments, experiment, model, split):
+    return os.path.join(experiments, experiment, f'{model.split("/")[-1]}-{split}.json')
+
+def prepare(args):
+    """Samples testable inferred triples of an ontology into per-split query files."""
+    random = lazy_import("random")
+    closure = lazy_import("closure")
+    queries = lazy_import("queries")
+    rdflib = lazy_import("rdflib")
+    compact = lazy_import("compact") if args.compact else None
+    sizes = [ (name, int(size)) for name, size in (split.split("=") for split in args.split) ]
+    with phase("closure"):
+        if args.streaming or args.stratify:
+            graph = rdflib.Graph()
+            graph.parse(args.ontology, format=args.format)
+        else:
+            graph, _, inferred = closure.load_closure(args.ontology, args.format)
+    with phase("ontology"):
+        text = open(args.ontology, "r").read()
+        if args.compact:
+            text = compact.compact_turtle(graph, comments=not args.drop_comments)
+    report_startup()
+    if args.streaming or args.stratify:
+        splits = lazy_import("sampling").sample_splits(graph, sizes, args.seed, args.stratify, reasoner=args.reasoner == "numpy")
+    else:
+        triples = sorted(filter(queries.is_testable_triple, inferred))
+        sample_size = sum(size for _, size in sizes)
+        if sample_size < len(triples):
+            triples = random.Random(args.seed).sample(triples, sample_size)
+        splits, start = {}, 0
+        for name, size in sizes:
+            splits[name] = triples[start:start + size]
+            start += size
+    os.makedirs(args.data, exist_ok=True)
+    for name, _ in sizes:
+        split = [ queries.to_query(graph, triple, text) for triple in splits[name] ]
+        json.dump(split, open(queries_path(args.data, args.experiment, name), "w+"))
+        print(f"{name:10}: {len(split)} queries")
+
+def compact(args):
+    """Serializes an ontology compactly, checks that it parses back to the same graph and reports the token savings."""
+    compact = lazy_import("compact")
+    rdflib = lazy_import("rdflib")
+    with phase("ontology"):
+        graph = rdflib.Graph()
+        graph.parse(args.ontology, format=args.format)
+        text = compact.compact_turtle(graph, comments=not args.drop_comments)
+    report_startup()
+    if not compact.round_trip(graph, text, comments=not args.drop_comments):
+        raise Exception(f'Compact serialization of {args.ontology} does not parse back to an isomorphic graph')
+    if args.output:
+        open(args.output, "w").write(text)
+    print(compact.savings({ "raw": open(args.ontology, "r").read(), "compact": text }, download=args.download).to_string(index=False))
+
+def run(args):
+    """Runs models over a split's queries, checkpointing as results arrive and skipping finished runs."""
+    asyncio = lazy_import("asyncio")
+    checkpoint = lazy_import("checkpoint")
+    engine = lazy_import("engine")
+    intension = lazy_import(INTENSIONS[args.intension])
+    with phase("queries"):
+        queries = json.load(open(args.queries or queries_path(args.data, args.experiment, args.split), "r"))
+    runner = engine.AsyncEngine()
+    tracer = lazy_import("instrumentation").CallTracer(args.metrics) if args.metrics else None
+    for model in args.model:
+        filename = results_path(args.experiments, args.experiment, model, args.split)
+        if os.path.isfile(filename):
+            print(f"{model:36}: EXISTS")
+            continue
+        if args.exemplars:
+            llm = lazy_import("intension_fewshot").FewShotIntension(exemplar_index(args), model, cache=not args.no_cache, streaming=args.streaming)
+        else:
+            llm = intension.Intension(model=model, cache=not args.no_cache, streaming=args.streaming)
+        if tracer is not None:
+            llm.instrument(tracer)
+        if args.votes > 1:
+            llm = lazy_import("voting").SelfConsistency(llm, k=args.votes, temperature=args.vote_temperature)
+        if args.symbolic != "off":
+            llm = lazy_import("symbolic").ShortCircuit(llm, symbolic_filter(args), args.symbolic)
+        if args.coalesce:
+            llm = lazy_import("coalesce").SingleFlight(llm)
+        report_startup()
+        with checkpoint.RunWriter(f"{filename}l") as writer:
+            errors = asyncio.run(runner.checkpoint(llm, queries, writer))
+        if args.coalesce:
+            report = llm.report()
+            print(f"{model:36}: {report['calls']} calls for {report['queries']} queries, {report['saved']} saved by coalescing", file=sys.stderr)
+        if errors:
+            print(f"{model:36}: {errors} failed requests, rerun to retry them", file=sys.stderr)
+            continue
+        checkpoint.export_json(f"{filename}l", filename)
+        os.remove(f"{filename}l")
+    if tracer is not None:
+        tracer.close()
+        print(tracer.summary().to_string(index=False), file=sys.stderr)
+
+def shard(args):
+    """Runs models over a split's queries in sharded worker processes, then merges the shards into result files."""
+    sharding = lazy_import("sharding")
+    workdir = args.workdir or os.path.join(args.experiments, args.experiment, f"shards-{args.split}")
+    if args.join:
+        report_startup()
+        print(f"{sharding.work(workdir, args.worker)} shards completed")
+        return
+    with phase("queries"):
+        queries = json.load(open(args.queries or queries_path(args.data, args.experiment, args.split), "r"))
+        sharding.plan(workdir, queries, args.model, args.shards, INTENSIONS[args.intension], args.streaming, not args.no_cache)
+    report_startup()
+    if args.workers:
+        sharding.run_local(workdir, args.workers)
+    _, report = sharding.merge(workdir, lambda model: results_path(args.experiments, args.experiment, model, args.split))
+    for model, counts in report.items():
+        status = f"{len(counts['missing'])} missing, rerun to complete" if counts["missing"] else "merged"
+        print(f"{model:36}: {counts['records']} records, {len(counts['duplicates'])} duplicates, {status}")
+
+def batch(args):
+    """Runs models over a split's queries through the provider batch APIs, resuming submitted batches."""
+    batch = lazy_import("batch")
+    intension = lazy_import(INTENSIONS[args.intension])
+    with phase("queries"):
+        queries = json.load(open(args.queries or queries_path(args.data, args.experiment, args.split), "r"))
+    for model in args.model:
+        filename = results_path(args.experiments, args.experiment, model, args.split)
+        if os.path.isfile(filename):
+            print(f"{model:36}: EXISTS")
+            continue
+        llm = intension.Intension(model=model, cache=False)
+        api = batch.LocalBatches(format=args.local) if args.local else None
+        workdir = os.path.join(args.experiments, args.experiment, "batches", f'{model.split("/")[-1]}-{args.split}')
+        report_startup()
+        records = llm.offline(queries, workdir, api, args.poll_every, args.timeout)
+        errors = sum("error" in record for record in records)
+        if errors:
+            print(f"{model:36}: {errors} failed requests", file=sys.stderr)
+            continue
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        json.dump(records, open(filename, "w+"))
+        print(f"{model:36}: {len(records)} records")
+
+def exemplar_index(args):
+    exemplars = lazy_import("exemplars")
+    rdflib = lazy_import("rdflib") if args.ontology is not None else None
+    with phase("exemplars"):
+        graph = None
+        if args.ontology is not None:
+            graph = rdflib.Graph()
+            graph.parse(args.ontology, format=args.format)
+        pool = exemplars.parse_exemplars(open(args.exemplars, "r").read())
+        return exemplars.ExemplarIndex(pool, graph, k=args.shots)
+
+def symbolic_filter(args):
+    symbolic = lazy_import("symbolic")
+    if args.ontology is None:
+        return symbolic.SymbolicFilter(patterns=[ p for p in symbolic.SymbolicFilter.PATTERNS if p != "asserted" ])
+    rdflib = lazy_import("rdflib")
+    with phase("ontology"):
+        graph = rdflib.Graph()
+        graph.parse(args.ontology, format=args.format)
+        return symbolic.SymbolicFilter(graph)
+
+def exemplars(args):
+    """Revises the false negatives of a training run into validated exemplars in the format of examples.json."""
+    pipeline = lazy_import("exemplar_pipeline")
+    generator = lazy_import("fn_example_generator")
+    fewshot = lazy_import("intension_fewshot")
+    with phase("ontology"):
+        text = open(args.ontology, "r").read()
+    store = args.store or f"{args.output}l"
+    llm = generator.FNExampleGenerator(args.model, cache=not args.no_cache)
+    validator = fewshot.FewShotIntension(None, args.validator or args.model, cache=not args.no_cache)
+    report_startup()
+    counts = pipeline.ExemplarPipeline(llm, validator, text, store).run(pipeline.read_results(args.results))
+    written = pipeline.export_examples(store, args.output, validated_only=not args.keep_rejected)
+    print(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items()))
+    print(f"{written} exemplars written to {args.output}")
+
+def parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Runs LLM intension experiments.")
+    parser.add_argument("--data", default="data", help="directory of query files (default data)")
+    parser.add_argument("--experiment", default="nesy4vrd", help="experiment name (default nesy4vrd)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("prepare", help="sample inferred triples into query files")
+    command.add_argument("--ontology", required=True, help="ontology file")
+    command.add_argument("--format", default="turtle", help="rdflib format of the ontology (default turtle)")
+    command.add_argument("--split", action="append", required=True, help="NAME=SIZE, e.g. test=100; repeatable")
+    command.add_argument("--seed", type=int, default=None, help="random seed")
+    command.add_argument("--compact", action="store_true", help="fill the {graph} slot with the compact serialization instead of the file")
+    command.add_argument("--drop-comments", action="store_true", help="leave rdfs:comment triples out of the compact serialization")
+    command.add_argument("--streaming", action="store_true", help="sample inferred triples in one pass as the reasoner yields them, bypassing the closure cache")
+    command.add_argument("--stratify", action="store_true", help="sample each predicate in proportion to its inferred triples (implies --streaming)")
+    command.add_argument("--reasoner", choices=["owlrl", "numpy"], default="owlrl", help="reasoner for --streaming (default owlrl)")
+    command.set_defaults(func=prepare)
+
+    command = commands.add_parser("compact", help="write the compact serialization of an ontology and report its token savings")
+    command.add_argument("--ontology", required=True, help="ontology file")
+    command.add_argument("--format", default="turtle", help="rdflib format of the ontology (default turtle)")
+    command.add_argument("--output", help="file to write the compact serialization to")
+    command.add_argument("--drop-comments", action="store_true", help="leave rdfs:comment triples out")
+    command.add_argument("--download", action="store_true", help="download tokenizers that are not cached")
+    command.set_defaults(func=compact)
+
+    command = commands.add_parser("run", help="run models over a split")
+    command.add_argument("--model", action="append", required=True, help="model name; repeatable")
+    command.add_argument("--split", required=True, help="split name, e.g. owl-inf, train, test or validate")
+    command.add_argument("--queries", help="query file (default DATA/experiment_EXPERIMENT_SPLIT_set.json)")
+    command.add_argument("--experiments", default="experiments", help="results directory (default experiments)")
+    command.add_argument("--intension", choices=INTENSIONS, default="intension", help="prompt variant (default intension)")
+    command.add_argument("--streaming", action="store_true", help="stop reading completions once the answer is emitted")
+    command.add_argument("--votes", type=int, default=1, help="maximum self-consistency samples per triple (default 1)")
+    command.add_argument("--vote-temperature", type=float, default=None, help="sampling temperature when voting")
+    command.add_argument("--exemplars", help="exemplars file, e.g. examples.json, to retrieve few-shot exemplars per triple from")
+    command.add_argument("--shots", type=int, default=5, help="maximum exemplars per triple with --exemplars (default 5)")
+    command.add_argument("--symbolic", choices=["off", "answer", "tag"], default="off", help="answer or tag axiomatic triples without the model")
+    command.add_argument("--ontology", help="ontology file, for --symbolic asserted triples and the --exemplars class hierarchy")
+    command.add_argument("--format", default="turtle", help="rdflib format of the ontology (default turtle)")
+    command.add_argument("--metrics", help="JSONL file to append per-call tokens, latency, retries, cache and parse outcomes to")
+    command.add_argument("--coalesce", action="store_true", help="share one call between queries with the same canonical triple and ontology")
+    command.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    command.set_defaults(func=run)
+
+    command = commands.add_parser("batch", help="run models over a split through the provider batch APIs")
+    command.add_argument("--model", action="append", required=True, help="model name; repeatable")
+    command.add_argument("--split", required=True, help="split name, e.g. owl-inf, train, test or validate")
+    command.add_argument("--queries", help="query file (default DATA/experiment_EXPERIMENT_SPLIT_set.json)")
+    command.add_argument("--experiments", default="experiments", help="results directory (default experiments)")
+    command.add_argument("--intension", choices=INTENSIONS, default="intension", help="prompt variant (default intension)")
+    command.add_argument("--local", choices=["openai", "anthropic"], help="answer the batch locally in this provider's format instead of submitting it")
+    command.add_argument("--poll-every", type=float, default=60, help="seconds between status checks (default 60)")
+    command.add_argument("--timeout", type=float, default=None, help="seconds to wait before exiting; rerun to resume polling")
+    command.set_defaults(func=batch)
+
+    command = commands.add_parser("shard", help="run models over a split in sharded worker processes and merge the results")
+    command.add_argument("--model", action="append", required=True, help="model name; repeatable")
+    command.add_argument("--split", required=True, help="split name, e.g. owl-inf, train, test or validate")
+    command.add_argument("--queries", help="query file (default DATA/experiment_EXPERIMENT_SPLIT_set.json)")
+    command.add_argument("--experiments", default="experiments", help="results directory (default experiments)")
+    command.add_argument("--workdir", help="work directory, shared by all nodes (default EXPERIMENTS/EXPERIMENT/shards-SPLIT)")
+    command.add_argument("--shards", type=int, default=16, help="number of shards (default 16)")
+    command.add_argument("--workers", type=int, default=4, help="local worker processes; 0 only merges (default 4)")
+    command.add_argument("--join", action="store_true", help="work on an existing work directory, e.g. from another node, without merging")
+    command.add_argument("--worker", type=int, default=0, help="index of this worker with --join, spreading workers over shards (default 0)")
+    command.add_argument("--intension", choices=INTENSIONS, default="intension", help="prompt variant (default intension)")
+    command.add_argument("--streaming", action="store_true", help="stop reading completions once the answer is emitted")
+    command.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    command.set_defaults(func=shard)
+
+    command = commands.add_parser("exemplars", help="generate exemplars from the false negatives of a run")
+    command.add_argument("--model", required=True, help="model name")
+    command.add_argument("--results", required=True, help="results file of a training run")
+    command.add_argument("--ontology", required=True, help="ontology file filled into the {graph} slot")
+    command.add_argument("--output", default="examples.json", help="exemplars file (default examples.json)")
+    command.add_argument("--store", help="resumable exemplar store (default OUTPUT with an l appended)")
+    command.add_argument("--validator", help="model re-classifying each triple with its revision as the exemplar (default --model)")
+    command.add_argument("--keep-rejected", action="store_true", help="also write exemplars that failed validation")
+    command.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    command.set_defaults(func=exemplars)
+    return parser
+
+def main(argv=None, started=None):
+    """
+    Runs a command.
+
+    Parameters:
+        argv: The command-line arguments (default sys.argv[1:]).
+        started: The time.perf_counter() at which the process began importing, for entry points such as
+            python -m intension that import modules before this one (default when this module was loaded).
+    """
+    global STARTED
+    if started is not None:
+        STARTED = started
+    args = parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
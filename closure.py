@@ -0,0 +1,86 @@
+import hashlib
+import os
+import pickle
+import owlrl
+from rdflib import Graph
+from owlrl import DeductiveClosure, OWLRL_Semantics
+
+def closure_key(path, semantics=OWLRL_Semantics):
+    """
+    Returns the content address of the deductive closure of an ontology file.
+
+    The key changes whenever the file contents, the reasoner semantics or the owlrl version change.
+
+    Parameters:
+        path: The path of the ontology file.
+        semantics: The owlrl semantics class used to compute the closure (default OWLRL_Semantics).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(f"{semantics.__module__}.{semantics.__qualname__}".encode("utf-8"))
+    digest.update(getattr(owlrl, "__version__", "").encode("utf-8"))
+    return digest.hexdigest()
+
+def cached_closure(path, format="turtle", semantics=OWLRL_Semantics, cache_dir=".closure_cache"):
+    """
+    Returns a dict with the parsed triples of an ontology ("graph"), its namespace bindings ("namespaces")
+    and the triples of its deductive closure that are not in the ontology itself ("inferred").
+
+    The entry is computed once per closure_key and persisted as a pickle in cache_dir; later calls load it
+    instead of parsing the ontology and rerunning the reasoner. The parsed triples are cached alongside the
+    inferred ones so that blank node identifiers stay consistent between them.
+
+    Parameters:
+        path: The path of the ontology file.
+        format: The rdflib format of the file (default "turtle").
+        semantics: The owlrl semantics class used to compute the closure (default OWLRL_Semantics).
+        cache_dir: The directory holding cached closures (default ".closure_cache").
+    """
+    filename = os.path.join(cache_dir, f"{closure_key(path, semantics)}.pickle")
+    if os.path.isfile(filename):
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    graph = Graph()
+    graph.parse(path, format=format)
+    closure = Graph()
+    closure += graph
+    DeductiveClosure(semantics).expand(closure)
+    entry = {
+        "graph": list(graph),
+        "namespaces": list(graph.namespaces()),
+        "inferred": list(closure - graph),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f"{filename}.tmp", "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{filename}.tmp", filename)
+    return entry
+
+def load_closure(path, format="turtle", namespaces=None, semantics=OWLRL_Semantics, cache_dir=".closure_cache"):
+    """
+    Returns the (graph, closure, inferred) graphs built in the experiment notebooks for an ontology file,
+    loading them from the closure cache when available.
+
+    Parameters:
+        path: The path of the ontology file, e.g. "data/NeSy4VRD/nesy4vrd_ontology/vrd_world_v1.owl".
+        format: The rdflib format of the file (default "turtle").
+        namespaces: A dict of prefix bindings applied to all three graphs, e.g. { "vrd": VRD } (default None).
+        semantics: The owlrl semantics class used to compute the closure (default OWLRL_Semantics).
+        cache_dir: The directory holding cached closures (default ".closure_cache").
+    """
+    entry = cached_closure(path, format, semantics, cache_dir)
+    graph, closure, inferred = Graph(), Graph(), Graph()
+    for g in (graph, closure, inferred):
+        for prefix, namespace in entry["namespaces"]:
+            g.bind(prefix, namespace)
+        for prefix, namespace in (namespaces or {}).items():
+            g.bind(prefix, namespace, replace=True)
+    for triple in entry["graph"]:
+        graph.add(triple)
+    for triple in entry["inferred"]:
+        inferred.add(triple)
+    closure += graph
+    closure += inferred
+    return graph, closure, inferred
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from rdflib import URIRef
+from queries import pp_node
+
+@lru_cache(maxsize=64)
+def ontology_hash(text):
+    """Returns a content hash of an ontology serialization that ignores line endings and trailing whitespace."""
+    lines = [ line.rstrip() for line in text.strip().splitlines() ]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+def template_version(llm):
+    """Returns a hash identifying the prompt template of an LLM, looking through wrappers such as SelfConsistency."""
+    chain = getattr(llm, "chain", None)
+    while chain is None and (hasattr(llm, "intension") or hasattr(llm, "llm")):
+        llm = getattr(llm, "intension", None) or llm.llm
+        chain = getattr(llm, "chain", None)
+    template = chain.prompt.template if chain is not None else type(llm).__name__
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+class QueryCanonicalizer:
+    """Maps queries that only differ in how their triple or ontology is written to the same canonical key."""
+
+    def __init__(self, graph=None):
+        """
+        Initializes a query canonicalizer.
+
+        Parameters:
+            graph: An rdflib Graph whose namespace bindings print full IRIs as CURIEs, as pp_node does
+                when queries are built (default None, IRIs are kept as written).
+         """
+        self.graph = graph
+
+    def term(self, term):
+        """Returns the canonical form of a subject, predicate or object: its pp_node CURIE where graph binds the namespace."""
+        term = term.strip()
+        if term.startswith("<") and term.endswith(">"):
+            term = term[1:-1]
+        if self.graph is not None and term.startswith(("http:", "https:", "urn:")):
+            return pp_node(self.graph, URIRef(term))
+        return term
+
+    def key(self, query, llm):
+        """
+        Returns the canonical key of a query to an LLM: the canonical triple, the content hash of every other
+        prompt input (the ontology, exemplars, ...), the prompt template version, the model and the temperature.
+
+        Parameters:
+            query: The input dict for the chain.
+            llm: The LLM (or SelfConsistency, ShortCircuit, ...) the query is sent to.
+        """
+        triple = tuple(self.term(query[field]) for field in ("s", "p", "o"))
+        inputs = tuple(sorted(
+            (name, ontology_hash(value) if isinstance(value, str) else repr(value))
+            for name, value in query.items() if name not in ("s", "p", "o")
+        ))
+        return (triple, inputs, template_version(llm), llm.model, getattr(llm, "temperature", None))
+
+class SingleFlight:
+    """Front end to an LLM that shares one call between identical concurrent queries and remembers finished ones."""
+
+    def __init__(self, llm, canonicalizer=None, remember=True):
+        """
+        Initializes a single-flight layer.
+
+        A query whose canonical key is already in flight waits for that call instead of making its own;
+        with remember, a query whose key has already completed in this process is answered from memory,
+        which deduplicates repeated triples across the owl-inf, train, test and validate runs. Failed calls
+        are passed to every waiting query and are not remembered.
+
+        Parameters:
+            llm: An Intension (or SelfConsistency, ShortCircuit, ...).
+            canonicalizer: The QueryCanonicalizer computing keys (default a QueryCanonicalizer without a graph).
+            remember: True to keep the response of every completed key for later queries (default True).
+         """
+        self.llm = llm
+        self.canonicalizer = canonicalizer or QueryCanonicalizer()
+        self.remember = remember
+        self.model = llm.model
+        self.provider = llm.provider
+        self.chain = getattr(llm, "chain", None)
+        self.counts = { "queries": 0, "calls": 0, "coalesced": 0, "remembered": 0 }
+        self._completed = {}
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._tasks = {}
+
+    def invoke(self, query):
+        """Returns the chain response for one query, sharing the call of an identical query in flight on another thread."""
+        key = self.canonicalizer.key(query, self.llm)
+        with self._lock:
+            self.counts["queries"] += 1
+            if key in self._completed:
+                self.counts["remembered"] += 1
+                return self._response(query, self._completed[key])
+            future = self._threads.get(key)
+            leader = future is None
+            if leader:
+                future = self._threads[key] = Future()
+                self.counts["calls"] += 1
+            else:
+                self.counts["coalesced"] += 1
+        if leader:
+            try:
+                future.set_result(self.llm.invoke(query)["text"])
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._finish(key, self._threads, future)
+        return self._response(query, future.result())
+
+    async def ainvoke(self, query):
+        """Returns the chain response for one query asynchronously, sharing the call of an identical query in flight."""
+        key = self.canonicalizer.key(query, self.llm)
+        self.counts["queries"] += 1
+        if key in self._completed:
+            self.counts["remembered"] += 1
+            return self._response(query, self._completed[key])
+        task = self._tasks.get(key)
+        if task is None:
+            self.counts["calls"] += 1
+            task = self._tasks[key] = asyncio.ensure_future(self._call(query))
+            task.add_done_callback(lambda task: self._finish(key, self._tasks, task))
+        else:
+            self.counts["coalesced"] += 1
+        # Shielded so that a cancelled waiter does not cancel the call the others are waiting for
+        return self._response(query, await asyncio.shield(task))
+
+    def report(self):
+        """Returns the number of queries, calls made, and calls saved by coalescing and by remembered responses."""
+        saved = self.counts["coalesced"] + self.counts["remembered"]
+        return { **self.counts, "saved": saved, "saved_rate": saved / self.counts["queries"] if self.counts["queries"] else 0.0 }
+
+    async def _call(self, query):
+        return (await self.llm.ainvoke(query))["text"]
+
+    def _finish(self, key, flights, future):
+        flights.pop(key, None)
+        if self.remember and not future.cancelled() and future.exception() is None:
+            self._completed[key] = future.result()
+
+    def _response(self, query, text):
+        # Each caller gets its own response, built from its own query, so records keep the triple as the caller wrote it
+        return { **query, "text": dict(text) if isinstance(text, dict) else text }
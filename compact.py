@@ -0,0 +1,213 @@
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+import pandas as pd
+from rdflib import BNode, Graph, Literal, RDF, RDFS, URIRef, XSD
+from rdflib.compare import isomorphic
+from context import estimate_tokens
+
+# Local names that can be written after a prefix in Turtle without escaping
+LOCAL_NAME = re.compile(r"([A-Za-z0-9_]([\w.-]*[\w-])?)?")
+
+# Literals that Turtle can write bare, without quotes and datatype
+BARE_LITERALS = {
+    XSD.integer: re.compile(r"[+-]?[0-9]+"),
+    XSD.decimal: re.compile(r"[+-]?[0-9]*\.[0-9]+"),
+    XSD.boolean: re.compile(r"true|false"),
+}
+
+def compact_turtle(graph, comments=True):
+    """
+    Returns a token-minimal Turtle serialization of a graph for the {graph} slot of a prompt.
+
+    IRIs are written as the same CURIEs pp_node prints for subjects, predicates and objects, and only
+    the prefixes used are declared. Triples are grouped by subject, one subject per line, with rdf:type
+    written as "a"; blank nodes referenced once are nested in [ ] and well-formed RDF lists written as ( ).
+    Apart from dropped comments the result parses back to a graph isomorphic to the input.
+
+    Parameters:
+        graph: The rdflib Graph to serialize.
+        comments: False to drop rdfs:comment triples (default True).
+    """
+    return CompactSerializer(graph, comments).serialize()
+
+class CompactSerializer:
+    """Serializer behind compact_turtle()."""
+
+    def __init__(self, graph, comments=True):
+        """
+        Initializes a compact serializer.
+
+        Parameters:
+            graph: The rdflib Graph to serialize.
+            comments: False to drop rdfs:comment triples (default True).
+         """
+        self.graph = graph
+        self.namespaces = graph.namespace_manager
+        self.subjects = defaultdict(lambda: defaultdict(list))
+        references = Counter()
+        for s, p, o in graph:
+            if p == RDFS.comment and not comments:
+                continue
+            self.subjects[s][p].append(o)
+            if isinstance(o, BNode):
+                references[o] += 1
+        self.inline = { b for b, n in references.items() if n == 1 and b in self.subjects }
+        self._root_cycles()
+        self.prefixes = set()
+        # Blank nodes that must be labelled get short labels in place of rdflib's 33-character identifiers
+        self.labels = {}
+
+    def serialize(self):
+        lines = []
+        for subject in sorted(self.subjects, key=self._order):
+            if subject not in self.inline:
+                lines.append(f"{self._term(subject)} {self._predicates(subject)} .")
+        prefixes = [ f"@prefix {prefix}: <{namespace}> ." for prefix, namespace in sorted(self.namespaces.namespaces()) if prefix in self.prefixes ]
+        return "\n".join(prefixes + lines) + "\n"
+
+    def _root_cycles(self):
+        # Blank nodes referenced once but only from each other (a cycle) are never reached from a root,
+        # so one node of each such cycle is written as a subject of its own
+        reached = set()
+        def reach(node):
+            for objects in self.subjects[node].values():
+                for o in objects:
+                    if o in self.inline and o not in reached:
+                        reached.add(o)
+                        reach(o)
+        for subject in list(self.subjects):
+            if subject not in self.inline:
+                reach(subject)
+        for node in sorted(self.inline - reached, key=str):
+            if node not in reached:
+                self.inline.discard(node)
+                reach(node)
+
+    def _order(self, subject):
+        return (isinstance(subject, BNode), str(subject))
+
+    def _predicates(self, subject):
+        predicates = self.subjects[subject]
+        order = sorted(predicates, key=lambda p: (p != RDF.type, str(p)))
+        return "; ".join(f"{'a' if p == RDF.type else self._term(p)} {', '.join(self._object(o) for o in sorted(predicates[p], key=str))}"
+                         for p in order)
+
+    def _object(self, node):
+        if node in self.inline:
+            if self._is_list(node):
+                return f"( {' '.join(self._object(item) for item in self._items(node))} )"
+            return f"[ {self._predicates(node)} ]"
+        return self._term(node)
+
+    def _is_list(self, node):
+        # A well-formed list: every node has exactly one rdf:first and one rdf:rest, nested nodes are referenced once
+        while node != RDF.nil:
+            predicates = self.subjects.get(node)
+            if predicates is None or set(predicates) != { RDF.first, RDF.rest }:
+                return False
+            if len(predicates[RDF.first]) != 1 or len(predicates[RDF.rest]) != 1:
+                return False
+            node = predicates[RDF.rest][0]
+            if node != RDF.nil and node not in self.inline:
+                return False
+        return True
+
+    def _items(self, node):
+        while node != RDF.nil:
+            yield self.subjects[node][RDF.first][0]
+            node = self.subjects[node][RDF.rest][0]
+
+    def _term(self, node):
+        if isinstance(node, URIRef):
+            curie = self.namespaces.normalizeUri(node)
+            if curie.startswith("<") or ":" not in curie:
+                return f"<{node}>"
+            prefix, local = curie.split(":", 1)
+            if not LOCAL_NAME.fullmatch(local):
+                return f"<{node}>"
+            self.prefixes.add(prefix)
+            return curie
+        if isinstance(node, Literal):
+            bare = BARE_LITERALS.get(node.datatype)
+            if bare is not None and bare.fullmatch(str(node)):
+                return str(node)
+            text = node.n3(self.namespaces)
+            if node.datatype is not None and "^^" in text and not text.endswith(">"):
+                self.prefixes.add(text.rsplit("^^", 1)[1].split(":", 1)[0])
+            return text
+        return f"_:b{self.labels.setdefault(node, len(self.labels))}"
+
+def round_trip(graph, text, comments=True):
+    """
+    Returns True if a compact serialization parses back to a graph isomorphic to graph
+    (without its rdfs:comment triples when comments were dropped).
+
+    Parameters:
+        graph: The serialized rdflib Graph.
+        text: Its compact serialization.
+        comments: False if comments were dropped (default True).
+    """
+    expected = graph
+    if not comments:
+        expected = Graph()
+        for triple in graph:
+            if triple[1] != RDFS.comment:
+                expected.add(triple)
+    return isomorphic(expected, Graph().parse(data=text, format="turtle"))
+
+TOKENIZERS = {
+    "gpt-4o": ("tiktoken", "o200k_base"),
+    "gpt-4 / gpt-3.5": ("tiktoken", "cl100k_base"),
+    "llama-3": ("transformers", "meta-llama/Meta-Llama-3-70B-Instruct"),
+    "mistral": ("transformers", "mistralai/Mistral-7B-Instruct-v0.3"),
+    "gemma": ("transformers", "google/gemma-2-9b-it"),
+    "claude": (None, None),
+}
+
+@lru_cache(maxsize=None)
+def token_counter(library, name, download=False):
+    """
+    Returns a function counting the tokens of a text for a tokenizer, or None if it cannot be loaded.
+
+    Parameters:
+        library: "tiktoken" or "transformers".
+        name: The encoding or model name.
+        download: True to download transformers tokenizers that are not cached (default False).
+    """
+    try:
+        if library == "tiktoken":
+            import tiktoken
+            encoding = tiktoken.get_encoding(name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        if library == "transformers":
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(name, local_files_only=not download)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception:
+        return None
+    return None
+
+def savings(texts, tokenizers=TOKENIZERS, download=False):
+    """
+    Returns a DataFrame of the token counts of serializations per model family, with the saving of each
+    against the first. Families whose tokenizer is not published (Claude) or cannot be loaded, e.g. offline,
+    fall back to estimate_tokens(), as shown in the "tokenizer" column.
+
+    Parameters:
+        texts: A dict mapping names to serializations, e.g. { "raw": open(path).read(), "compact": compact_turtle(graph) }.
+        tokenizers: A dict mapping model families to (library, name) pairs (default TOKENIZERS).
+        download: True to download transformers tokenizers that are not cached (default False).
+    """
+    rows = []
+    names = list(texts)
+    for family, (library, name) in tokenizers.items():
+        count = token_counter(library, name, download)
+        row = { "family": family, "tokenizer": name if count else "estimate" }
+        count = count or estimate_tokens
+        for text_name in names:
+            row[text_name] = count(texts[text_name])
+        for text_name in names[1:]:
+            row[f"{text_name}_saving"] = 1 - row[text_name] / row[names[0]] if row[names[0]] else 0.0
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,175 @@
+from collections import deque
+from rdflib import Graph, URIRef, BNode
+from rdflib.collection import Collection
+from rdflib.namespace import RDF, RDFS, OWL
+from rdflib.term import Node
+from rdflib.util import from_n3
+
+def estimate_tokens(text):
+    """Returns a rough token count for text, at about four characters per token."""
+    return (len(text) + 3) // 4
+
+class ContextExtractor:
+    """Extracts a bounded Turtle subgraph relevant to a triple, for use in place of the full ontology in the {graph} slot."""
+
+    # Predicates along which a subject's meaning flows to the node it points at
+    SCHEMA_PREDICATES = [RDF.type, RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain, RDFS.range, OWL.inverseOf]
+
+    # Predicates that relate nodes in both directions
+    SYMMETRIC_PREDICATES = [OWL.equivalentClass, OWL.equivalentProperty, OWL.sameAs]
+
+    def __init__(self, graph, hops=3, token_budget=1500, full_text=None, namespaces=None):
+        """
+        Initializes an extractor over an ontology, precomputing its adjacency indexes.
+
+        Parameters:
+            graph: The rdflib Graph of the ontology.
+            hops: The maximum number of schema edges followed from the subject, predicate and object (default 3).
+            token_budget: The approximate maximum number of tokens in an extracted subgraph (default 1500).
+            full_text: The full ontology text otherwise rendered into the {graph} slot, used for reporting (default the Turtle serialization of graph).
+            namespaces: A dict of additional prefix bindings used in queries and output, e.g. { "vrd": VRD } (default None).
+         """
+        self.graph = graph
+        self.hops = hops
+        self.token_budget = token_budget
+        self.namespaces = { **dict(graph.namespaces()), **(namespaces or {}) }
+        self.full_tokens = estimate_tokens(full_text if full_text is not None else graph.serialize(format="turtle"))
+        self._forward = {}
+        self._backward = {}
+        # Superproperties and ranges of properties, followed from the properties pointing at a subject
+        self._ranges = {}
+        self._snippets = {}
+        self._described = set(s for s in graph.subjects() if not isinstance(s, BNode))
+        self._index()
+
+    def node(self, term):
+        """Returns the rdflib term for a CURIE or N3 string as produced by pp_node."""
+        prefix, _, name = term.partition(":")
+        if name and prefix in self.namespaces and not term.startswith(("<", '"')):
+            return URIRef(self.namespaces[prefix] + name)
+        return from_n3(term, nsm=self.graph.namespace_manager)
+
+    def extract(self, s, p, o):
+        """
+        Returns a Turtle rendering of the concise bounded descriptions of s, p and o, followed by
+        those of the nodes on the schema paths connecting s to o, then of the other nodes within the
+        hop limit above s, above p and above the properties describing s (their superproperties,
+        domains and ranges), and of the subjects of the assertions pointing at s with the ranges of
+        their properties, by distance, for as long as the token budget allows.
+
+        Parameters:
+            s: The subject, as a CURIE string or rdflib term.
+            p: The predicate, as a CURIE string or rdflib term.
+            o: The object, as a CURIE string or rdflib term.
+        """
+        s, p, o = [ t if isinstance(t, Node) else self.node(t) for t in (s, p, o) ]
+        from_s = self._distances(s, self._forward)
+        to_o = self._distances(o, self._backward)
+        on_path = []
+        if o in from_s:
+            on_path = sorted((n for n in from_s if from_s[n] + to_o.get(n, self.hops + 1) == from_s[o]), key=from_s.get)
+        # Schema edges are only followed upwards from s; the subclasses of o and the nodes above it are
+        # siblings or ancestors of s that do not bear on the entailment
+        nearby = dict(from_s)
+        for start, offset in [ (p, 0) ] + [ (q, 1) for q in sorted(set(self.graph.predicates(s))) ]:
+            for n, d in self._distances(start, self._forward).items():
+                nearby[n] = min(d + offset, nearby.get(n, d + offset))
+        # The assertions pointing at s type it through the ranges of their properties and superproperties,
+        # and so through the superclasses of those ranges
+        for x, q in sorted(set(self.graph.subject_predicates(s))):
+            if isinstance(x, BNode) or q in self.SCHEMA_PREDICATES or q in self.SYMMETRIC_PREDICATES:
+                continue
+            nearby[x] = min(1, nearby.get(x, 1))
+            for n, d in self._distances(q, self._ranges).items():
+                for m, e in self._distances(n, self._forward).items():
+                    nearby[m] = min(1 + d + e, nearby.get(m, 1 + d + e))
+        ordered = [s, p, o] + on_path + sorted(nearby, key=nearby.get)
+        prefixes, blocks, seen, tokens = set(), [], set(), 0
+        for n in ordered:
+            if n in seen or n not in self._described:
+                continue
+            seen.add(n)
+            header, body = self._snippet(n)
+            cost = estimate_tokens(body) + sum(estimate_tokens(line) for line in header - prefixes)
+            if blocks and tokens + cost > self.token_budget:
+                continue
+            prefixes |= header
+            blocks.append(body)
+            tokens += cost
+        return "\n".join(sorted(prefixes)) + "\n\n" + "\n".join(blocks)
+
+    def __call__(self, query):
+        """Returns a copy of a query dict with its "graph" entry replaced by the extracted subgraph."""
+        return { **query, "graph": self.extract(query["s"], query["p"], query["o"]) }
+
+    def report(self, queries):
+        """
+        Returns the mean extracted context size for queries against the size of the full ontology.
+
+        Parameters:
+            queries: A list of query dicts with "s", "p" and "o" entries.
+        """
+        sizes = [ estimate_tokens(self.extract(q["s"], q["p"], q["o"])) for q in queries ]
+        mean = sum(sizes) / len(sizes) if sizes else 0.0
+        return {
+            "full_tokens": self.full_tokens,
+            "mean_tokens": mean,
+            "max_tokens": max(sizes, default=0),
+            "reduction": 1.0 - mean / self.full_tokens if self.full_tokens else 0.0,
+        }
+
+    def _index(self):
+        for a, pred, b in self.graph:
+            if isinstance(a, BNode):
+                continue
+            if pred in (RDFS.subPropertyOf, RDFS.range) and not isinstance(b, BNode):
+                self._ranges.setdefault(a, []).append(b)
+            if pred in self.SCHEMA_PREDICATES:
+                self._link(a, b)
+            elif pred in self.SYMMETRIC_PREDICATES:
+                self._link(a, b)
+                self._link(b, a)
+            else:
+                continue
+            if isinstance(b, BNode):
+                # Class expressions: the members of a union equivalent to a are subclasses of a (a class that is only a
+                # subclass of a union says nothing of its members), and a subclass of an intersection is a subclass of its members
+                if pred == OWL.equivalentClass:
+                    for members in self.graph.objects(b, OWL.unionOf):
+                        for m in Collection(self.graph, members):
+                            self._link(m, a)
+                for members in self.graph.objects(b, OWL.intersectionOf):
+                    for m in Collection(self.graph, members):
+                        self._link(a, m)
+
+    def _link(self, a, b):
+        if isinstance(b, BNode):
+            return
+        self._forward.setdefault(a, []).append(b)
+        self._backward.setdefault(b, []).append(a)
+
+    def _distances(self, start, adjacency):
+        distances = { start: 0 }
+        frontier = deque([start])
+        while frontier:
+            n = frontier.popleft()
+            if distances[n] == self.hops:
+                continue
+            for m in adjacency.get(n, ()):
+                if m not in distances:
+                    distances[m] = distances[n] + 1
+                    frontier.append(m)
+        return distances
+
+    def _snippet(self, n):
+        if n not in self._snippets:
+            cbd = Graph()
+            for prefix, namespace in self.namespaces.items():
+                cbd.bind(prefix, namespace, override=True, replace=True)
+            for triple in self.graph.cbd(n):
+                cbd.add(triple)
+            lines = cbd.serialize(format="turtle").strip().splitlines()
+            header = frozenset(line for line in lines if line.startswith("@prefix"))
+            body = "\n".join(line for line in lines if not line.startswith("@prefix")).strip() + "\n"
+            self._snippets[n] = (header, body)
+        return self._snippets[n]
@@ -0,0 +1,194 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+from tqdm import tqdm
+
+# Query entries that only fill prompt slots and are not stored in result records
+PROMPT_INPUTS = ("graph", "exemplars")
+
+def to_record(query, response, model):
+    """
+    Flattens a chain response into the per-triple record format stored in the experiments/ files.
+
+    Parameters:
+        query: The input dict the chain was invoked with.
+        response: The dict returned by the chain, whose "text" entry holds the parsed output.
+        model: The name of the model that produced the response.
+    """
+    record = { key: value for key, value in query.items() if key not in PROMPT_INPUTS }
+    record["model"] = model
+    record.update(response["text"])
+    return record
+
+# The provider semaphore whose slot the current engine call holds, so that wrappers fanning one query out
+# into several calls, e.g. voting.SelfConsistency, can keep them within the provider's limit
+SLOT = contextvars.ContextVar("engine_slot", default=None)
+
+class AsyncEngine:
+    """Concurrent executor for LLM chains with per-provider concurrency limits and retries."""
+
+    DEFAULT_LIMITS = {
+        "openai": 32,
+        "anthropic": 8,
+        "huggingface": 8,
+        "local": 4,
+        "replay": 64,
+    }
+
+    RETRYABLE_ERRORS = ("Timeout", "Connection", "Overloaded", "RateLimit", "ServiceUnavailable", "InternalServer")
+
+    def __init__(self, limits=None, max_retries=6, base_delay=1.0, max_delay=60.0):
+        """
+        Initializes an execution engine that can be shared by many LLM instances.
+
+        Parameters:
+            limits: A dict mapping provider names to the maximum number of in-flight requests (default DEFAULT_LIMITS).
+            max_retries: The maximum number of retries on rate limiting, server or connection errors (default 6).
+            base_delay: The base delay in seconds of the exponential backoff (default 1.0).
+            max_delay: The maximum delay in seconds between retries (default 60.0).
+         """
+        self.limits = { **self.DEFAULT_LIMITS, **(limits or {}) }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._semaphores = {}
+
+    def limit(self, provider):
+        return self.limits.get(provider, 1)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, provider):
+        """
+        Holds a slot of a provider's limit, for calls made within an engine call to a provider other than its own,
+        e.g. a validation step run on another model; a slot the current call already holds is not acquired again.
+
+        Parameters:
+            provider: The provider name.
+        """
+        semaphore = self._semaphore(provider)
+        if SLOT.get() is semaphore:
+            yield
+            return
+        async with semaphore:
+            slot = SLOT.set(semaphore)
+            try:
+                yield
+            finally:
+                SLOT.reset(slot)
+
+    async def stream(self, llm, queries):
+        """
+        Runs an LLM chain over queries, yielding (index, record) pairs in order of completion.
+
+        At most limit(llm.provider) requests are in flight at once; a new request is started as soon
+        as any in-flight request completes. Requests failing after all retries yield a record with an
+        "error" entry instead of parsed output.
+
+        Parameters:
+            llm: An LLM instance, e.g. an Intension.
+            queries: An iterable of input dicts for the chain.
+        """
+        window = self.limit(llm.provider)
+        queries = iter(enumerate(queries))
+        pending = set()
+        while True:
+            while len(pending) < window:
+                item = next(queries, None)
+                if item is None:
+                    break
+                pending.add(asyncio.ensure_future(self._run(llm, *item)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    async def run(self, llm, queries, desc=None):
+        """
+        Runs an LLM chain over queries and returns the records in the order of the queries.
+
+        Parameters:
+            llm: An LLM instance, e.g. an Intension.
+            queries: A list of input dicts for the chain.
+            desc: The description of the progress bar (default the model name).
+        """
+        results = [None] * len(queries)
+        with tqdm(total=len(queries), desc=desc or f"{llm.model:36}") as progress:
+            async for i, record in self.stream(llm, queries):
+                results[i] = record
+                progress.update(1)
+        return results
+
+    async def checkpoint(self, llm, queries, writer, desc=None):
+        """
+        Runs an LLM chain over the queries not yet completed in a RunWriter, appending each record as it arrives.
+
+        Records are not accumulated in memory; failed requests are not written, so they are retried
+        when the run is resumed. Returns the number of failed requests.
+
+        Parameters:
+            llm: An LLM instance, e.g. an Intension.
+            queries: An iterable of input dicts for the chain.
+            writer: The checkpoint.RunWriter to append records to.
+            desc: The description of the progress bar (default the model name).
+        """
+        errors = 0
+        with tqdm(desc=desc or f"{llm.model:36}") as progress:
+            async for _, record in self.stream(llm, writer.remaining(queries, llm.model)):
+                if "error" in record:
+                    errors += 1
+                else:
+                    writer.write(record)
+                progress.update(1)
+        writer.sync()
+        return errors
+
+    async def _run(self, llm, i, query):
+        semaphore = self._semaphore(llm.provider)
+        attempt = 0
+        while True:
+            async with semaphore:
+                slot = SLOT.set(semaphore)
+                try:
+                    response = await llm.ainvoke(query)
+                    return i, to_record(query, response, llm.model)
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._retryable(e):
+                        record = to_record(query, { "text": {} }, llm.model)
+                        record["error"] = f"{type(e).__name__}: {e}"
+                        return i, record
+                    error = e
+                finally:
+                    SLOT.reset(slot)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(self._delay(attempt, error))
+
+    def _semaphore(self, provider):
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.limit(provider))
+        return self._semaphores[provider]
+
+    def _retryable(self, e):
+        status = self._status(e)
+        if status is not None:
+            return status == 429 or status >= 500
+        return isinstance(e, asyncio.TimeoutError) or any(name in type(e).__name__ for name in self.RETRYABLE_ERRORS)
+
+    def _status(self, e):
+        status = getattr(e, "status_code", None)
+        if status is None:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+        return status if isinstance(status, int) else None
+
+    def _delay(self, attempt, e):
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = 0.0
+        # Full jitter keeps concurrent retries from synchronising into bursts
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(retry_after, backoff)
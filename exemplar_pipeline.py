@@ -0,0 +1,114 @@
+import asyncio
+import json
+import re
+from checkpoint import RunWriter, read_records
+from engine import AsyncEngine, PROMPT_INPUTS
+from exemplars import format_exemplar
+
+def read_results(path):
+    """
+    Yields the result records of a results file: streamed line by line from a JSONL checkpoint,
+    or loaded from a JSON array as written by the experiment notebooks.
+
+    Parameters:
+        path: The path of the results file, e.g. "experiments/nesy4vrd/claude-3-haiku-20240307-train.json".
+    """
+    if path.endswith(".jsonl"):
+        yield from read_records(path)
+    else:
+        yield from json.load(open(path, "r"))
+
+class ExemplarPipeline:
+    """Concurrent, resumable pipeline revising the false negatives of a run into validated exemplars."""
+
+    def __init__(self, generator, validator, graph, store, engine=None):
+        """
+        Initializes an exemplar pipeline.
+
+        Parameters:
+            generator: The FNExampleGenerator revising the rationales of false negatives.
+            validator: The intension_fewshot.FewShotIntension re-classifying each triple with its revision as the exemplar.
+            graph: The serialization of the ontology filled into the {graph} slot.
+            store: The path of the JSONL exemplar store; revisions already in it are not regenerated.
+            engine: The AsyncEngine running both steps, each within its model's provider limit (default a new AsyncEngine).
+         """
+        self.generator = generator
+        self.validator = validator
+        self.graph = graph
+        self.store = store
+        self.engine = engine or AsyncEngine()
+        self.model = generator.model
+        self.provider = generator.provider
+        self.counts = { "false_negatives": 0, "duplicates": 0, "revised": 0, "validated": 0, "rejected": 0, "errors": 0 }
+
+    def run(self, results):
+        """Runs the pipeline; see arun()."""
+        return asyncio.run(self.arun(results))
+
+    async def arun(self, results):
+        """
+        Revises and validates the false negatives among results, appending each exemplar to the store as soon as
+        it is validated or rejected, and returns the pipeline counts.
+
+        Each triple is revised once, however often it occurs among the results. Each revision is checked by
+        classifying its triple with the revision as the only exemplar. Exemplars whose triple the validator
+        still answers 0 are stored with "validated" false.
+
+        Parameters:
+            results: An iterable of result records, e.g. read_results(path); it is consumed lazily.
+        """
+        with RunWriter(self.store) as writer:
+            async for _, record in self.engine.stream(self, writer.remaining(self._false_negatives(results), self.model)):
+                if "error" in record:
+                    self.counts["errors"] += 1
+                    continue
+                self.counts["revised"] += 1
+                self.counts["validated" if record["validated"] else "rejected"] += 1
+                writer.write(record)
+        return dict(self.counts)
+
+    async def ainvoke(self, query):
+        # Revises one false negative and validates the revision; the engine runs it under the generator's provider limit,
+        # and the validation also takes a slot of the validator's
+        revision = await self.generator.ainvoke(query)
+        exemplar = {
+            "s": query["s"],
+            "p": query["p"],
+            "o": query["o"],
+            # Revisions often restate the answer, which the exemplar format adds itself
+            "rationale": re.sub(r"\s*Answer:\s*[01]\W*$", "", revision["text"].get("revision", "")).strip(),
+            "answer": "1",
+        }
+        if not exemplar["rationale"]:
+            raise Exception("Empty revision")
+        async with self.engine.slot(self.validator.provider):
+            check = await self.validator.ainvoke({ **query, "exemplars": format_exemplar(exemplar) })
+        return { "text": { **exemplar, "validated": check["text"].get("answer") == "1", "original": query["rationale"] } }
+
+    def _false_negatives(self, results):
+        seen = set()
+        for result in results:
+            if result.get("answer") != "0":
+                continue
+            self.counts["false_negatives"] += 1
+            key = (result["s"], result["p"], result["o"])
+            if key in seen:
+                self.counts["duplicates"] += 1
+                continue
+            seen.add(key)
+            query = { k: v for k, v in result.items() if k not in PROMPT_INPUTS and k not in ("model", "answer") }
+            yield { **query, "graph": self.graph }
+
+def export_examples(store, filename, validated_only=True):
+    """
+    Writes the exemplars of a store to an exemplars file as exemplar_generation.ipynb does, a JSON string of
+    "###"-separated blocks, and returns how many were written.
+
+    Parameters:
+        store: The path of the JSONL exemplar store.
+        filename: The path of the exemplars file, e.g. "examples.json".
+        validated_only: Whether to leave out exemplars that failed validation (default True).
+    """
+    exemplars = [ format_exemplar(e) for e in read_records(store) if e.get("validated") or not validated_only ]
+    json.dump("".join(exemplars), open(filename, "w+"))
+    return len(exemplars)
@@ -0,0 +1,207 @@
+import json
+import re
+import numpy as np
+from rdflib import RDFS
+from context import estimate_tokens
+from queries import pp_node
+
+EXEMPLAR = re.compile(
+    r"Subject:\s*<(?P<s>[^>]*)>\s*Predicate:\s*<(?P<p>[^>]*)>\s*Object:\s*<(?P<o>[^>]*)>\s*"
+    r"Rationale:\s*(?P<rationale>.*?)\s*Answer:\s*(?P<answer>[01])",
+    re.DOTALL
+)
+
+def parse_exemplars(text):
+    """
+    Returns the exemplars in the "###"-separated format written to examples.json by exemplar_generation.ipynb
+    as a list of dicts with "s", "p", "o", "rationale" and "answer" entries.
+
+    Parameters:
+        text: The contents of the exemplars file, either the raw blocks or a JSON string of them.
+    """
+    if text.lstrip().startswith('"'):
+        text = json.loads(text)
+    blocks = re.split(r"(?m)^###[ \t]*\n(?=Subject:)", text)
+    return [ match.groupdict() for match in (EXEMPLAR.match(block.strip()) for block in blocks) if match ]
+
+def format_exemplar(exemplar):
+    return f"""###
+Subject: <{exemplar["s"]}>
+Predicate: <{exemplar["p"]}>
+Object: <{exemplar["o"]}>
+Rationale: {exemplar["rationale"]}
+Answer: {exemplar["answer"]}
+"""
+
+def tokenize(text):
+    """Returns the lower-cased words of a text, splitting CURIEs and camelCase names into their parts."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class ExemplarIndex:
+    """Index of few-shot exemplars that selects the most relevant ones for a triple under a token budget."""
+
+    WEIGHTS = { "predicate": 1.0, "namespace": 0.25, "hierarchy": 1.0, "lexical": 0.5 }
+
+    def __init__(self, exemplars, graph=None, k=5, token_budget=1500, weights=None, k1=1.2, b=0.75):
+        """
+        Initializes an exemplar index.
+
+        Exemplars are scored against a triple by a weighted sum of: the same predicate; the same namespaces
+        of subject and object; the overlap of the subject's and object's rdfs:subClassOf / rdfs:subPropertyOf
+        ancestors in graph; and BM25 of the triple's words against each exemplar's triple and rationale.
+
+        Parameters:
+            exemplars: A list of exemplar dicts with "s", "p", "o", "rationale" and "answer" entries.
+            graph: The ontology as an rdflib Graph, for the hierarchy feature (default None, feature unused).
+            k: The maximum number of exemplars selected (default 5).
+            token_budget: The estimated token budget of the selected exemplars (default 1500).
+            weights: A dict overriding entries of WEIGHTS (default None).
+            k1: The BM25 term frequency saturation (default 1.2).
+            b: The BM25 document length normalization (default 0.75).
+         """
+        self.exemplars = list(exemplars)
+        self.k = k
+        self.token_budget = token_budget
+        self.weights = { **self.WEIGHTS, **(weights or {}) }
+        self.texts = [ format_exemplar(e) for e in self.exemplars ]
+        self.tokens = np.array([ estimate_tokens(t) for t in self.texts ])
+        self.keys = { (e["s"], e["p"], e["o"]): i for i, e in enumerate(self.exemplars) }
+        self._codes = {}
+        self.predicates = self._encode([ e["p"] for e in self.exemplars ])
+        self.subject_namespaces = self._encode([ self._namespace(e["s"]) for e in self.exemplars ])
+        self.object_namespaces = self._encode([ self._namespace(e["o"]) for e in self.exemplars ])
+        self._ancestors(graph)
+        self._bm25(k1, b)
+
+    def scores(self, query):
+        """Returns the relevance score of every exemplar for a query's triple."""
+        s, p, o = query["s"], query["p"], query["o"]
+        w = self.weights
+        scores = (self.predicates == self._codes.get(p, -1)) * np.float32(w["predicate"])
+        scores += (self.subject_namespaces == self._codes.get(self._namespace(s), -1)) * np.float32(w["namespace"] / 2)
+        scores += (self.object_namespaces == self._codes.get(self._namespace(o), -1)) * np.float32(w["namespace"] / 2)
+        if self.hierarchy is not None:
+            scores += (self._jaccard(0, s) + self._jaccard(1, o)) * np.float32(w["hierarchy"] / 2)
+        postings = [ self.postings[t] for t in set(tokenize(f"{s} {p} {o}")) if t in self.postings ]
+        if postings:
+            lexical = np.zeros(len(self.exemplars), dtype=np.float32)
+            for ids, weights in postings:
+                if ids is None:
+                    lexical += weights
+                else:
+                    lexical[ids] += weights
+            scores += lexical * np.float32(w["lexical"] / lexical.max())
+        return scores
+
+    def select(self, query, k=None, token_budget=None):
+        """
+        Returns the most relevant exemplars for a query, best first, within the token budget.
+
+        An exemplar of the query's own triple is never selected.
+
+        Parameters:
+            query: A query dict with "s", "p" and "o" entries.
+            k: The maximum number of exemplars (default self.k).
+            token_budget: The estimated token budget (default self.token_budget).
+        """
+        k = k or self.k
+        token_budget = self.token_budget if token_budget is None else token_budget
+        scores = self.scores(query)
+        own = self.keys.get((query["s"], query["p"], query["o"]))
+        if own is not None:
+            scores[own] = -np.inf
+        top = self._top(scores, min(len(scores), 4 * k))
+        selected, used = [], 0
+        for i in top[np.argsort(-scores[top], kind="stable")]:
+            if len(selected) == k or scores[i] == -np.inf:
+                break
+            if used + self.tokens[i] <= token_budget:
+                selected.append(self.exemplars[i])
+                used += self.tokens[i]
+        return selected
+
+    def render(self, query):
+        """Returns the selected exemplars for a query formatted as prompt text."""
+        return "".join(format_exemplar(e) for e in self.select(query))
+
+    def __call__(self, query):
+        """Returns a copy of a query dict with an "exemplars" entry holding the selected exemplars."""
+        return { **query, "exemplars": self.render(query) }
+
+    def _top(self, scores, n, block=64):
+        # Indices of the n highest scores, in no order; large pools are first narrowed to the n blocks with the highest maxima,
+        # which must hold the top n scores, since a full partition dominates the cost of a lookup
+        if n == 0:
+            return np.array([], dtype=np.int64)
+        if len(scores) <= 64 * block:
+            return np.argpartition(scores, len(scores) - n)[len(scores) - n:]
+        padded = np.full(-(-len(scores) // block) * block, -np.inf, dtype=scores.dtype)
+        padded[:len(scores)] = scores
+        maxima = padded.reshape(-1, block).max(axis=1)
+        blocks = np.argpartition(maxima, len(maxima) - n)[len(maxima) - n:]
+        ids = (blocks[:, None] * block + np.arange(block)).ravel()
+        return ids[np.argpartition(padded[ids], len(ids) - n)[len(ids) - n:]]
+
+    def _encode(self, values):
+        return np.array([ self._codes.setdefault(v, len(self._codes)) for v in values ], dtype=np.int32)
+
+    def _namespace(self, term):
+        if term.startswith("http"):
+            return re.split(r"[#/]", term[::-1], 1)[-1][::-1]
+        return term.split(":", 1)[0] if ":" in term else ""
+
+    def _ancestors(self, graph):
+        # Sets of rdfs:subClassOf / rdfs:subPropertyOf ancestors (including the term itself) as rows of a boolean matrix
+        self.hierarchy = None
+        if graph is None:
+            return
+        self.ancestors = {}
+        for predicate in (RDFS.subClassOf, RDFS.subPropertyOf):
+            for node in set(graph.subjects(predicate, None)):
+                names = { pp_node(graph, a) for a in graph.transitive_objects(node, predicate) }
+                self.ancestors.setdefault(pp_node(graph, node), set()).update(names)
+        columns = { name: i for i, name in enumerate(sorted({ a for names in self.ancestors.values() for a in names })) }
+        self.columns = columns
+        self.hierarchy = np.zeros((2, len(self.exemplars), len(columns)), dtype=bool)
+        for i, e in enumerate(self.exemplars):
+            for side, term in enumerate((e["s"], e["o"])):
+                self.hierarchy[side, i, [ columns[a] for a in self.ancestors.get(term, ()) ]] = True
+        self.hierarchy_sizes = self.hierarchy.sum(axis=2)
+
+    def _jaccard(self, side, term):
+        columns = [ self.columns[a] for a in self.ancestors.get(term, ()) ]
+        if not columns:
+            return np.zeros(len(self.exemplars), dtype=np.float32)
+        intersection = self.hierarchy[side][:, columns].sum(axis=1, dtype=np.float32)
+        union = self.hierarchy_sizes[side] + len(columns) - intersection
+        return intersection / np.maximum(union, 1)
+
+    def _bm25(self, k1, b):
+        # Inverted index of per-posting BM25 weights, so that scoring a query only touches its own terms' postings
+        vocabulary = {}
+        documents, tokens = [], []
+        for i, e in enumerate(self.exemplars):
+            words = tokenize(f'{e["s"]} {e["p"]} {e["o"]}') + re.findall(r"[a-z0-9]+", e["rationale"].lower())
+            tokens.extend(vocabulary.setdefault(w, len(vocabulary)) for w in words)
+            documents.append(len(words))
+        lengths = np.array(documents, dtype=np.float32)
+        average = lengths.mean() if len(lengths) else 0.0
+        # Term frequencies of every (token, document) pair, sorted by token
+        pairs = np.array(tokens, dtype=np.int64) * len(self.exemplars) + np.repeat(np.arange(len(documents)), documents)
+        pairs, freqs = np.unique(pairs, return_counts=True)
+        token_ids, ids = np.divmod(pairs, len(self.exemplars))
+        freqs = freqs.astype(np.float32)
+        df = np.bincount(token_ids, minlength=len(vocabulary))
+        idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        weights = idf[token_ids] * freqs * (k1 + 1) / (freqs + k1 * (1 - b + b * lengths[ids] / average))
+        bounds = np.searchsorted(token_ids, np.arange(len(vocabulary) + 1))
+        self.postings = {}
+        for word, t in vocabulary.items():
+            posting = (ids[bounds[t]:bounds[t + 1]], weights[bounds[t]:bounds[t + 1]])
+            if len(posting[0]) * 8 > len(documents):
+                # Scattering into many documents is slower than adding a dense row of weights
+                dense = np.zeros(len(documents), dtype=np.float32)
+                dense[posting[0]] = posting[1]
+                posting = (None, dense)
+            self.postings[word] = posting
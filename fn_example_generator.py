@@ -1,6 +1,6 @@
 from llm import LLM  # Import the LLM class
 from langchain_core.prompts import PromptTemplate
-from langchain.output_parsers import RegexParser
+from parsing import RevisionParser
 
 class FNExampleGenerator(LLM):  # Inherit from LLM
     """Represents a zero-shot chain-of-thought implementing an intension for triples."""
@@ -46,18 +46,20 @@ Rationale: {{revision}}
 
     PROMPT = PromptTemplate(input_variables=["s", "p", "o", "graph", "rationale"], template=PROMPT_TEMPLATE)
 
-    OUTPUT_PARSER = RegexParser(
-        regex=r"(?is).*Rationale:\**\s*(.*?)",
-        output_keys=["revision"],
-        default_output_key="revision"
-    )
+    OUTPUT_PARSER = RevisionParser()
+
+    STRUCTURED_INSTRUCTION = """
+Respond only with a JSON object with a "revision" string.
+"""
     
-    def __init__(self, model="gpt-4-0125-preview", temperature=0.1):
+    def __init__(self, model="gpt-4-0125-preview", temperature=0.1, cache=True, structured=False):
         """
         Initializes an intension-as-classifier.
         
         Parameters:
             model: The name of the model to be used for zero shot CoT classification (default "gpt-4-0125-preview").
             temperature: The temperature parameter for the model (default 0.1).
+            cache: True to use the shared on-disk response cache, a ResponseCache, or False to disable caching (default True).
+            structured: True to ask for the revision as a JSON object (default False).
          """
-        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature)
+        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature, cache, structured=structured)
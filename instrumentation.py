@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+from checkpoint import read_records
+from context import estimate_tokens
+
+class CallTracer(BaseCallbackHandler):
+    """Callback handler recording the tokens, latency, retries, cache use and parse outcome of every model call."""
+
+    # Handled on the caller's thread or event loop, rather than handed to an executor for every event
+    run_inline = True
+
+    def __init__(self, path=None, flush_every=100):
+        """
+        Initializes a tracer, attached to LLM instances with LLM.instrument().
+
+        Each call appends a record to records and, with a path, a line to a JSONL metrics file:
+        model, provider, prompt_tokens and completion_tokens (as reported by the provider, else
+        estimated), ttft (seconds to the first streamed token, None when not streaming), latency,
+        retries (failed attempts at the same prompt before this one), cache ("hit" or "miss"),
+        parse ("parsed", "unparsed", "failed" or None for calls outside a chain, e.g. repairs)
+        and, for failed calls, error and status.
+
+        Parameters:
+            path: The path of the JSONL metrics file appended to (default None, records kept in memory only).
+            flush_every: The number of records written between flushes of the file (default 100).
+         """
+        self.path = path
+        self.flush_every = flush_every
+        self.records = []
+        self._calls = {}
+        self._pending = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, metadata, "".join(str(m.content) for m in messages[0]))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, metadata, prompts[0])
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._calls.get(run_id)
+        if call is not None and call["ttft"] is None:
+            call["ttft"] = time.perf_counter() - call["start"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+        record = self._record(call)
+        record["prompt_tokens"] = usage.get("input_tokens") or call["prompt_tokens"]
+        record["completion_tokens"] = usage.get("output_tokens") or estimate_tokens(generation.text if generation else "")
+        record["retries"] = self._failures.pop(call["prompt"], 0)
+        record["cache"] = "hit" if generation is not None and (generation.generation_info or {}).get("cached") else "miss"
+        self._finish(call, run_id, record)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            # A stream closed once its answer was read ends with GeneratorExit; the call succeeded, and its
+            # completion tokens and parse outcome are added by the LLM that stopped it
+            record = self._record(call)
+            record.update({ "retries": self._failures.pop(call["prompt"], 0), "cache": "miss" })
+            self._finish(call, run_id, record)
+            return
+        with self._lock:
+            retries = self._failures.get(call["prompt"], 0)
+            self._failures[call["prompt"]] = retries + 1
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        record = self._record(call)
+        record.update({ "retries": retries, "cache": "miss", "parse": "failed", "error": type(error).__name__, "status": status })
+        self._write(record)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        record = self._pending.pop(run_id, None)
+        if record is not None:
+            self.parsed(record, outputs.get("text"))
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        record = self._pending.pop(run_id, None)
+        if record is not None:
+            record["parse"] = "failed"
+            self._write(record)
+
+    def parsed(self, record, text):
+        """Writes a call record with the parse outcome of its output, for outputs parsed outside a chain."""
+        if isinstance(text, dict) and "answer" in text:
+            record["parse"] = "parsed" if text["answer"] in ("0", "1") else "unparsed"
+        else:
+            record["parse"] = "parsed" if text else "unparsed"
+        self._write(record)
+
+    def pending(self, run_id):
+        """Returns the record of a finished streamed call whose output has not yet been parsed, or None."""
+        return self._pending.pop(run_id, None)
+
+    def summary(self):
+        """Returns the per-model summary of the records; see summarize()."""
+        return summarize(self.records)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self, run_id, parent_run_id, metadata, prompt):
+        metadata = metadata or {}
+        self._calls[run_id] = {
+            "start": time.perf_counter(),
+            "time": time.time(),
+            "ttft": None,
+            "parent": parent_run_id,
+            "deferred": metadata.get("trace_parse", False),
+            # Failed attempts are matched to their retry by the prompt's hash, which Python caches on the string
+            "prompt": hash(prompt),
+            "prompt_tokens": estimate_tokens(prompt),
+            "model": metadata.get("intension_model", metadata.get("ls_model_name")),
+            "provider": metadata.get("intension_provider", metadata.get("ls_provider")),
+        }
+
+    def _finish(self, call, run_id, record):
+        if call["parent"] is not None:
+            # The parse outcome is only known when the chain ends
+            self._pending[call["parent"]] = record
+        elif call["deferred"]:
+            # Streamed outputs are parsed by the LLM, which passes the record to parsed()
+            self._pending[run_id] = record
+        else:
+            self._write(record)
+
+    def _record(self, call):
+        return {
+            "time": call["time"],
+            "model": call["model"],
+            "provider": call["provider"],
+            "prompt_tokens": call["prompt_tokens"],
+            "completion_tokens": 0,
+            "ttft": call["ttft"],
+            "latency": time.perf_counter() - call["start"],
+            "parse": None,
+        }
+
+    def _write(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record) + "\n")
+                if len(self.records) % self.flush_every == 0:
+                    self._file.flush()
+
+def percentiles(values, prefix):
+    values = np.array([ v for v in values if v is not None ], dtype=float)
+    if not len(values):
+        return { f"{prefix}_p{q}": None for q in (50, 95, 99) }
+    return { f"{prefix}_p{q}": v for q, v in zip((50, 95, 99), np.percentile(values, [50, 95, 99])) }
+
+def summarize(records):
+    """
+    Returns a DataFrame with, per model: the number of calls, failed calls and 429 (rate limited) responses,
+    retries, cache hit rate, parse failures, token totals, p50/p95/p99 of latency and of time to first
+    token, and the completion tokens per second of calls answered by the provider.
+
+    Parameters:
+        records: A list of call records, or the path of a JSONL metrics file written by a CallTracer.
+    """
+    if isinstance(records, str):
+        records = list(read_records(records))
+    models = {}
+    for record in records:
+        models.setdefault(record["model"], []).append(record)
+    rows = []
+    for model, calls in models.items():
+        answered = [ c for c in calls if c["cache"] == "miss" and "error" not in c ]
+        # Generation speed excludes the time to the first token, mostly prompt processing, where it was measured
+        generating = sum(c["latency"] - (c["ttft"] or 0.0) for c in answered)
+        rows.append({
+            "model": model,
+            "provider": calls[0]["provider"],
+            "calls": len(calls),
+            "errors": sum("error" in c for c in calls),
+            "rate_limited": sum(c.get("status") == 429 for c in calls),
+            "retries": sum(c["retries"] for c in calls),
+            "cache_hit_rate": sum(c["cache"] == "hit" for c in calls) / len(calls),
+            "unparsed": sum(c["parse"] == "unparsed" for c in calls),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            **percentiles([ c["latency"] for c in calls ], "latency"),
+            **percentiles([ c["ttft"] for c in calls ], "ttft"),
+            "tokens_per_second": sum(c["completion_tokens"] for c in answered) / generating if generating else None,
+        })
+    return pd.DataFrame(rows)
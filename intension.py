@@ -1,8 +1,15 @@
-from llm import LLM  # Import the LLM class
+import time
+
+# Taken before the imports below, so that python -m intension reports them in its startup time
+STARTED = time.perf_counter()
+
+from llm import TripleClassifier  # Import the TripleClassifier class
 from langchain_core.prompts import PromptTemplate
-from langchain.output_parsers import RegexParser
+from parsing import AnswerParser
 
-class Intension(LLM):  # Inherit from LLM
+IMPORTED = time.perf_counter()
+
+class Intension(TripleClassifier):  # Inherit from TripleClassifier
     """Represents a zero-shot chain-of-thought implementing an intension for triples."""
 
     PROMPT_TEMPLATE = """
@@ -26,18 +33,26 @@ Answer: {{answer}}
 
     PROMPT = PromptTemplate(input_variables=["s", "p", "o", "graph"], template=PROMPT_TEMPLATE)
 
-    OUTPUT_PARSER = RegexParser(
-        regex=r"(?is).*Rationale:\**\s*(.*?)Answer:\**\s*(0|1)",
-        output_keys=["rationale", "answer"],
-        default_output_key="rationale"
-    )
+    OUTPUT_PARSER = AnswerParser()
     
-    def __init__(self, model="gpt-4-0125-preview", temperature=0.1):
+    def __init__(self, model="gpt-4-0125-preview", temperature=0.1, cache=True, streaming=False, structured=False, repair=True):
         """
         Initializes an intension-as-classifier.
         
         Parameters:
             model: The name of the model to be used for zero shot CoT classification (default "gpt-4-0125-preview").
             temperature: The temperature parameter for the model (default 0.1).
+            cache: True to use the shared on-disk response cache, a ResponseCache, or False to disable caching (default True).
+            streaming: True to stream completions and stop reading once the answer digit has been emitted (default False).
+            structured: True to ask for the rationale and answer as a JSON object (default False).
+            repair: True to re-ask only for the answer digit when an output has no parseable answer (default True).
          """
-        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature)
+        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature, cache, streaming, structured, repair)
+
+if __name__ == "__main__":
+    import cli
+    import sys
+    # The runner uses this module rather than importing it a second time
+    sys.modules.setdefault("intension", sys.modules[__name__])
+    cli.IMPORT_TIMES["intension"] = IMPORTED - STARTED
+    cli.main(started=STARTED)
@@ -0,0 +1,55 @@
+from llm import TripleClassifier  # Import the TripleClassifier class
+from langchain_core.prompts import PromptTemplate
+from parsing import AnswerParser
+
+class FewShotIntension(TripleClassifier):  # Inherit from TripleClassifier
+    """Represents a few-shot chain-of-thought intension for triples whose exemplars are retrieved per triple."""
+
+    PROMPT_TEMPLATE = """
+Determine the truth value of following knowledge graph triple 
+in a hypothetical world where the following is true:
+{graph}
+
+Let's think step by step. Provide a rationale for 
+your decision, then based on that rationale,
+provide an answer of 1 if true, otherwise 
+provide an answer of 0.
+{exemplars}###
+Subject: <{s}>
+Predicate: <{p}>
+Object: <{o}>
+Rationale: {{rationale}}
+Answer: {{answer}}
+"""
+
+    PROMPT = PromptTemplate(input_variables=["s", "p", "o", "graph", "exemplars"], template=PROMPT_TEMPLATE)
+
+    OUTPUT_PARSER = AnswerParser()
+    
+    def __init__(self, index, model="gpt-4-0125-preview", temperature=0.1, cache=True, streaming=False, structured=False, repair=True):
+        """
+        Initializes a few-shot intension-as-classifier.
+
+        Parameters:
+            index: The exemplars.ExemplarIndex selecting the exemplars of each triple.
+            model: The name of the model to be used for few shot CoT classification (default "gpt-4-0125-preview").
+            temperature: The temperature parameter for the model (default 0.1).
+            cache: True to use the shared on-disk response cache, a ResponseCache, or False to disable caching (default True).
+            streaming: True to stream completions and stop reading once the answer digit has been emitted (default False).
+            structured: True to ask for the rationale and answer as a JSON object (default False).
+            repair: True to re-ask only for the answer digit when an output has no parseable answer (default True).
+         """
+        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature, cache, streaming, structured, repair)
+        self.index = index
+
+    def invoke(self, query):
+        return super().invoke(self._with_exemplars(query))
+
+    async def ainvoke(self, query):
+        return await super().ainvoke(self._with_exemplars(query))
+
+    def batch(self, queries):
+        return super().batch([ self._with_exemplars(q) for q in queries ])
+
+    def _with_exemplars(self, query):
+        return query if "exemplars" in query else self.index(query)
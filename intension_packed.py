@@ -0,0 +1,167 @@
+import re
+from typing import Dict, List, Tuple
+from llm import LLM  # Import the LLM class
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.prompts import PromptTemplate
+
+class PackedOutputParser(BaseOutputParser[List[Tuple[int, Dict[str, str]]]]):
+    """Parses numbered Rationale/Answer blocks into a list of (item number, block) pairs in output order."""
+
+    ITEM = re.compile(r"^\s*#{3,}\s*(?:Triple\s*)?(\d+)\s*$", re.MULTILINE | re.IGNORECASE)
+    ANSWER = re.compile(r"Answer:\**\s*(0|1)", re.IGNORECASE)
+    RATIONALE = re.compile(r"Rationale:\**\s*", re.IGNORECASE)
+
+    @property
+    def _type(self) -> str:
+        return "packed_parser"
+
+    def parse(self, text: str) -> List[Tuple[int, Dict[str, str]]]:
+        """Returns (number, { "rationale", "answer" }) for every numbered block, with an empty answer for blocks without one."""
+        headers = list(self.ITEM.finditer(text))
+        blocks = []
+        for i, header in enumerate(headers):
+            block = text[header.end():headers[i + 1].start() if i + 1 < len(headers) else len(text)]
+            answer = self.ANSWER.search(block)
+            end = answer.start() if answer else len(block)
+            rationale = self.RATIONALE.search(block, 0, end)
+            blocks.append((int(header.group(1)), {
+                "rationale": block[rationale.end() if rationale else 0:end].strip(),
+                "answer": answer.group(1) if answer else "",
+            }))
+        return blocks
+
+class PackedIntension(LLM):  # Inherit from LLM
+    """Represents a zero-shot chain-of-thought intension that judges several triples against one rendering of the ontology."""
+
+    PROMPT_TEMPLATE = """
+Determine the truth value of each of the following numbered knowledge
+graph triples in a hypothetical world where the following is true:
+{graph}
+
+For each triple, let's think step by step. Provide a rationale for
+your decision, then based on that rationale, provide an answer of 1
+if true, otherwise provide an answer of 0.
+{triples}
+Respond with one block per triple, in order, using exactly this format:
+### <number>
+Rationale: {{rationale}}
+Answer: {{answer}}
+"""
+
+    TRIPLE_TEMPLATE = """###  {n}
+Subject: <{s}>
+Predicate: <{p}>
+Object: <{o}>
+"""
+
+    PROMPT = PromptTemplate(input_variables=["triples", "graph"], template=PROMPT_TEMPLATE)
+
+    OUTPUT_PARSER = PackedOutputParser()
+
+    # Number of triples per call; smaller packs trade throughput for latency and answer quality
+    PACK_SIZES = {
+        "gpt-4o-2024-05-13": 20,
+        "gpt-4o-mini-2024-07-18": 20,
+        "claude-3-5-sonnet-20240620": 20,
+        "claude-3-haiku-20240307": 10,
+        "mistralai/Mistral-7B-Instruct-v0.3": 5,
+        "mistralai/Mixtral-8x7B-Instruct-v0.1": 5,
+    }
+
+    DEFAULT_PACK_SIZE = 10
+
+    def __init__(self, model="gpt-4-0125-preview", temperature=0.1, cache=True, pack_size=None):
+        """
+        Initializes a packed intension-as-classifier.
+
+        Parameters:
+            model: The name of the model to be used for zero shot CoT classification (default "gpt-4-0125-preview").
+            temperature: The temperature parameter for the model (default 0.1).
+            cache: True to use the shared on-disk response cache, a ResponseCache, or False to disable caching (default True).
+            pack_size: The number of triples per call (default PACK_SIZES[model], or DEFAULT_PACK_SIZE).
+         """
+        super().__init__(self.PROMPT, self.OUTPUT_PARSER, model, temperature, cache)
+        self.pack_size = pack_size or self.PACK_SIZES.get(model, self.DEFAULT_PACK_SIZE)
+
+    def pack(self, queries, pack_size=None):
+        """
+        Groups queries sharing the same graph into chain inputs of at most pack_size triples.
+
+        Parameters:
+            queries: A list of query dicts with "s", "p", "o" and "graph" entries.
+            pack_size: The number of triples per pack (default self.pack_size).
+         """
+        pack_size = pack_size or self.pack_size
+        by_graph = {}
+        for query in queries:
+            by_graph.setdefault(query["graph"], []).append(query)
+        packs = []
+        for graph, group in by_graph.items():
+            for i in range(0, len(group), pack_size):
+                items = group[i:i + pack_size]
+                packs.append({
+                    "graph": graph,
+                    "triples": "".join(self.TRIPLE_TEMPLATE.format(n=n + 1, **q) for n, q in enumerate(items)),
+                    "queries": items,
+                })
+        return packs
+
+    def unpack(self, response):
+        """
+        Splits a packed chain response into per-triple records, the queries that need to be re-asked,
+        and the queries of a misnumbered pack, to be re-asked one per call.
+
+        Blocks are matched to triples by their numbers, which must be exactly 1..n in order: a model that
+        numbers from 0, skips or repeats an item would otherwise have its answers assigned to the wrong
+        triples, so such a pack fails as a whole. Unanswered items of a well-numbered pack are returned as failed.
+
+        Parameters:
+            response: The dict returned by chain.invoke for a pack.
+         """
+        blocks = response["text"]
+        if [ number for number, _ in blocks ] != list(range(1, len(response["queries"]) + 1)):
+            return [], [], list(response["queries"])
+        records, failed = [], []
+        for query, (_, item) in zip(response["queries"], blocks):
+            if not item["answer"]:
+                failed.append(query)
+                continue
+            record = { key: value for key, value in query.items() if key != "graph" }
+            record["model"] = self.model
+            record.update(item)
+            records.append(record)
+        return records, failed, []
+
+    def run(self, queries, max_rounds=3):
+        """
+        Classifies queries in packs, re-queueing only the triples whose answers were not parsed.
+
+        Failed triples are re-packed in halved pack sizes in each subsequent round, and the triples of
+        misnumbered packs one per call; triples still unanswered after max_rounds are returned with an
+        empty answer, as the unpacked Intension does.
+
+        Parameters:
+            queries: A list of query dicts with "s", "p", "o" and "graph" entries.
+            max_rounds: The maximum number of rounds of calls (default 3).
+         """
+        results = {}
+        remaining, singles, pack_size = list(queries), [], self.pack_size
+        for _ in range(max_rounds):
+            if not remaining and not singles:
+                break
+            failed, misnumbered = [], []
+            for response in self.chain.batch(self.pack(remaining, pack_size) + self.pack(singles, 1)):
+                records, unanswered, unaligned = self.unpack(response)
+                for record in records:
+                    results[self._key(record)] = record
+                failed.extend(unanswered)
+                misnumbered.extend(unaligned)
+            remaining, singles, pack_size = failed, misnumbered, max(1, pack_size // 2)
+        for query in remaining + singles:
+            record = { key: value for key, value in query.items() if key != "graph" }
+            record.update({ "model": self.model, "rationale": "", "answer": "" })
+            results[self._key(record)] = record
+        return [ results[self._key(query)] for query in queries ]
+
+    def _key(self, query):
+        return (query["s"], query["p"], query["o"])
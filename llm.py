@@ -1,69 +1,305 @@
-import os
-from langchain_huggingface import HuggingFaceEndpoint
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+import re
+import uuid
+import backends
 from langchain.chains import LLMChain
 from langchain.output_parsers import RegexParser
+from langchain_core.outputs import Generation
 from langchain_core.prompts import PromptTemplate
+from cache import ResponseCache, shared_cache
+from parsing import MarkerParser, count
+
+class AnswerScanner:
+    """Incremental detector of a complete "Answer: 0|1" after a "Rationale:" in streamed model output."""
+
+    RATIONALE = re.compile(r"Rationale:", re.IGNORECASE)
+    ANSWER = re.compile(r"Answer:\**\s*(0|1)", re.IGNORECASE)
+
+    # Characters re-scanned before each new chunk, so that a marker split across chunks is still found
+    OVERLAP = 32
+
+    def __init__(self):
+        self.text = ""
+        self.end = None
+        self._rationale = None
+        self._scanned = 0
+
+    def feed(self, chunk):
+        """Appends a chunk of output and returns True once a complete answer has been seen."""
+        self.text += chunk
+        start = max(0, self._scanned - self.OVERLAP)
+        self._scanned = len(self.text)
+        if self._rationale is None:
+            rationale = self.RATIONALE.search(self.text, start)
+            if rationale is None:
+                return False
+            self._rationale, start = rationale.end(), rationale.end()
+        answer = self.ANSWER.search(self.text, max(start, self._rationale))
+        if answer is not None:
+            self.end = answer.end()
+        return self.end is not None
+
+    @property
+    def output(self):
+        """The output up to and including the answer digit, or all output if no answer was seen."""
+        return self.text if self.end is None else self.text[:self.end]
 
 class LLM:
     """Convenience wrapper class for a large language model inference API."""
 
-    def __init__(self, prompt, output_parser, model="gpt-4-0125-preview", temperature=0.1):
+    OPENAI_MODELS = backends.OPENAI_MODELS
+
+    ANTHROPIC_MODELS = backends.ANTHROPIC_MODELS
+
+    HUGGINGFACE_MODELS = backends.HUGGINGFACE_MODELS
+
+    # Provider stop sequences passed when streaming; subclasses set these to markers that only follow a finished answer
+    STOP_SEQUENCES = None
+
+    # Appended to the prompt in structured output mode; subclasses describe the JSON object they expect
+    STRUCTURED_INSTRUCTION = None
+
+    # Follow-up prompt asking only for the answer digit when an output had no parseable answer
+    REPAIR_TEMPLATE = None
+
+    def __init__(self, prompt, output_parser, model="gpt-4-0125-preview", temperature=0.1, cache=True, streaming=False, structured=False, repair=True):
         """
         Initializes a classification procedure for a concept, given a unique identifier, a term, and a definition.
         
         Parameters:
             model_name: The name of the model to be used for zero shot CoT classification (default "gpt-4").
             temperature: The temperature parameter for the model (default 0.1).
+            cache: True to use the shared on-disk response cache, a ResponseCache to use a specific one, or False to disable caching (default True).
+            streaming: True to stream completions and stop reading as soon as an answer has been emitted; streamed outputs
+                are cached up to the answer, apart from complete outputs (default False).
+            structured: True to ask for a JSON object, using the provider's JSON mode where available (default False).
+            repair: True to re-ask only for the answer when an output cannot be parsed (default True).
          """
         self.model = model
         self.temperature = temperature
-        self.llm = self._llm(model, temperature)
+        self.provider = self._provider(model)
+        self.cache = self._cache(cache)
+        self.llm = self._llm(model, temperature, self.cache)
+        if structured and self.STRUCTURED_INSTRUCTION:
+            prompt = PromptTemplate(input_variables=prompt.input_variables, template=prompt.template + self.STRUCTURED_INSTRUCTION)
+            if self.provider in ("openai", "local"):
+                self.llm = self.llm.bind(response_format={ "type": "json_object" })
+        if isinstance(output_parser, MarkerParser):
+            output_parser = output_parser.for_model(model)
         self.chain = LLMChain(llm=self.llm, prompt=prompt, output_parser=output_parser)
+        self.streaming = streaming
+        self.repair = repair
+        self.stream_stats = { "calls": 0, "stopped": 0, "completion_tokens": 0, "tokens_saved": 0, "cached": 0 }
+        self.tracer = None
+
+    def instrument(self, tracer):
+        """
+        Attaches a callback handler, e.g. an instrumentation.CallTracer, to the model and the chain,
+        so that every call (chain, streamed and repair calls) is recorded. Returns self.
 
-    def _llm(self, model, temperature=0.1):
-        if model in [ 
-            "gpt-3.5-turbo", 
-            "gpt-4-1106-preview", 
-            "gpt-4-0125-preview", 
-            "gpt-4o-2024-05-13",
-            "gpt-4o-mini-2024-07-18" 
-            ]:
-            return ChatOpenAI(model_name=model, temperature=temperature)
-        elif model in [ 
-            "claude-3-opus-20240229", 
-            "claude-3-5-sonnet-20240620", 
-            "claude-3-haiku-20240307" 
-            ]:
-            return ChatAnthropic(
-                temperature=temperature, 
-                anthropic_api_key=os.environ["ANTHROPIC_API_KEY"], 
-                model_name=model
-            )
-        # elif model in [ 
-        #     "gemini-1.0-pro" 
-        #     ]:
-        #     return ChatGooglePalm(
-        #         temperature=temperature, 
-        #         google_api_key=os.environ["GOOGLE_API_KEY"], 
-        #         model=model
-        #     )
-        elif model in [
-            "meta-llama/Llama-2-70b-chat-hf", 
-            "mistralai/Mixtral-8x7B-Instruct-v0.1", 
-            "mistralai/Mistral-7B-Instruct-v0.3", 
-            "google/gemma-2-9b-it",
-            "google/gemma-7b-it", 
-            "google/gemma-2b-it",
-            "meta-llama/Meta-Llama-3-70B-Instruct", 
-            "microsoft/Phi-3-mini-128k-instruct",
-            ]:
-            return HuggingFaceEndpoint(
-                repo_id=model, 
-                temperature=temperature, 
-                timeout=300,
-                huggingfacehub_api_token=os.environ["HUGGINGFACEHUB_API_TOKEN"]
-            )
+        Parameters:
+            tracer: The callback handler.
+        """
+        model = getattr(self.llm, "bound", self.llm)
+        if tracer not in (model.callbacks or []):
+            model.callbacks = [ *(model.callbacks or []), tracer ]
+            model.metadata = { **(model.metadata or {}), "intension_model": self.model, "intension_provider": self.provider }
+        if tracer not in (self.chain.callbacks or []):
+            self.chain.callbacks = [ *(self.chain.callbacks or []), tracer ]
+        self.tracer = tracer
+        return self
+
+    def invoke(self, query):
+        """
+        Returns the chain response for one query, streaming the completion when streaming is enabled.
+
+        Parameters:
+            query: The input dict for the chain.
+        """
+        if not self.streaming:
+            return self._repaired(query, self.chain.invoke(query))
+        scanner = AnswerScanner()
+        prompt = self.chain.prompt.format(**query)
+        llm_string = self._stream_llm_string()
+        cached = self.cache.lookup(prompt, llm_string) if self.cache is not None else None
+        if cached:
+            scanner.feed(cached[0].text)
+            return self._repaired(query, self._streamed(query, scanner, cached=True))
+        config = self._trace_config()
+        stream = self.llm.stream(prompt, config, stop=self.STOP_SEQUENCES)
+        try:
+            for chunk in stream:
+                if scanner.feed(self._text(chunk)):
+                    break
+        finally:
+            # Closing the generator closes the HTTP response, so the provider stops generating
+            stream.close()
+        if self.cache is not None:
+            self.cache.update(prompt, llm_string, [ Generation(text=scanner.output) ])
+        return self._repaired(query, self._streamed(query, scanner, config))
+
+    async def ainvoke(self, query):
+        """
+        Returns the chain response for one query asynchronously; see invoke().
+
+        Parameters:
+            query: The input dict for the chain.
+        """
+        if not self.streaming:
+            return await self._arepaired(query, await self.chain.ainvoke(query))
+        scanner = AnswerScanner()
+        prompt = self.chain.prompt.format(**query)
+        llm_string = self._stream_llm_string()
+        cached = await self.cache.alookup(prompt, llm_string) if self.cache is not None else None
+        if cached:
+            scanner.feed(cached[0].text)
+            return await self._arepaired(query, self._streamed(query, scanner, cached=True))
+        config = self._trace_config()
+        stream = self.llm.astream(prompt, config, stop=self.STOP_SEQUENCES)
+        try:
+            async for chunk in stream:
+                if scanner.feed(self._text(chunk)):
+                    break
+        finally:
+            await stream.aclose()
+        if self.cache is not None:
+            await self.cache.aupdate(prompt, llm_string, [ Generation(text=scanner.output) ])
+        return await self._arepaired(query, self._streamed(query, scanner, config))
+
+    def batch(self, queries):
+        """
+        Returns the chain responses for a list of queries, as chain.batch does, with unparsed answers repaired.
+
+        Parameters:
+            queries: A list of input dicts for the chain.
+        """
+        responses = self.chain.batch(queries)
+        failed = [ i for i, response in enumerate(responses) if self._needs_repair(response) ]
+        if failed:
+            prompts = [ self._repair_prompt(queries[i], responses[i]) for i in failed ]
+            for i, answer in zip(failed, self._repair_llm().batch(prompts, stop=["\n"])):
+                self._apply_repair(responses[i], answer)
+        return responses
+
+    def offline(self, queries, workdir, api=None, poll_every=60, timeout=None):
+        """
+        Returns the result records for a list of queries run through the provider's batch API, at batch prices
+        and outside the interactive rate limits; see batch.run_batch(). Unparsed answers are not repaired.
+
+        Parameters:
+            queries: A list of input dicts for the chain.
+            workdir: The directory holding the batch request, job and result files; rerunning resumes the batch.
+            api: The batch API, e.g. batch.LocalBatches() (default the provider's).
+            poll_every: The seconds between status checks (default 60).
+            timeout: The seconds to wait before raising an exception (default None, no limit).
+        """
+        from batch import run_batch  # Deferred: only offline runs need it
+        return run_batch(self, queries, workdir, api, poll_every, timeout)
+
+    def _needs_repair(self, response):
+        text = response["text"]
+        return self.repair and self.REPAIR_TEMPLATE is not None and isinstance(text, dict) and text.get("answer") == ""
+
+    def _repair_prompt(self, query, response):
+        # The rationale is already written, so the follow-up omits the ontology and costs a few tokens
+        count(self.model, "repairs")
+        return self.REPAIR_TEMPLATE.format(**{ **query, "rationale": response["text"]["rationale"].strip() })
+
+    def _repair_llm(self):
+        # JSON mode requires a prompt asking for JSON, and the repair asks for a bare digit, so it goes to the unbound model
+        return getattr(self.llm, "bound", self.llm)
+
+    def _apply_repair(self, response, answer):
+        match = re.search(r"[01]", self._text(answer))
+        if match is not None:
+            response["text"]["answer"] = match.group(0)
+            count(self.model, "repaired")
+        return response
+
+    def _repaired(self, query, response):
+        if not self._needs_repair(response):
+            return response
+        return self._apply_repair(response, self._repair_llm().invoke(self._repair_prompt(query, response), stop=["\n"]))
+
+    async def _arepaired(self, query, response):
+        if not self._needs_repair(response):
+            return response
+        return self._apply_repair(response, await self._repair_llm().ainvoke(self._repair_prompt(query, response), stop=["\n"]))
+
+    def _stream_llm_string(self):
+        # Streaming bypasses langchain's cache, so streamed outputs are cached here; they end at the answer,
+        # so they are kept apart from the complete outputs of chain calls to the same model
+        model = getattr(self.llm, "bound", self.llm)
+        kwargs = getattr(self.llm, "kwargs", {})
+        if hasattr(model, "_get_llm_string"):
+            llm_string = model._get_llm_string(stop=self.STOP_SEQUENCES, **kwargs)
+        else:
+            llm_string = str(sorted({ **model.dict(), **kwargs, "stop": self.STOP_SEQUENCES }.items()))
+        return f"{llm_string}\x00streamed"
+
+    def _trace_config(self):
+        # Streamed calls bypass the chain, so the tracer holds their records until the output is parsed in _streamed()
+        if self.tracer is None:
+            return None
+        return { "run_id": uuid.uuid4(), "metadata": { "trace_parse": True } }
+
+    def _streamed(self, query, scanner, config=None, cached=False):
+        # Streamed output is not seen by the chain, so it is parsed here into the same response shape
+        from context import estimate_tokens  # Deferred: context pulls in rdflib, which runs do not otherwise need
+        response = { **query, "text": self.chain.output_parser.parse(scanner.output) }
+        completion = estimate_tokens(scanner.output)
+        # Only the tokens received after the answer and discarded are counted as saved; how many more the model could
+        # have generated is an upper bound kept apart, from the generation budget when it is known
+        budget = getattr(self.llm, "max_new_tokens", None) or getattr(self.llm, "max_tokens", None)
+        saved = estimate_tokens(scanner.text[len(scanner.output):])
+        unspent = max(budget - completion, saved) if budget and scanner.end is not None else None
+        response["stream"] = { "stopped": scanner.end is not None, "completion_tokens": completion, "tokens_saved": saved,
+                               "tokens_unspent": unspent, "cached": cached }
+        if cached:
+            # A cached output costs nothing, so it saves nothing by being cut short
+            self.stream_stats["cached"] += 1
         else:
-            raise Exception(f'Model {model} not supported')
+            self.stream_stats["calls"] += 1
+            self.stream_stats["stopped"] += scanner.end is not None
+            self.stream_stats["completion_tokens"] += completion
+            self.stream_stats["tokens_saved"] += saved
+        record = self.tracer.pending(config["run_id"]) if config else None
+        if record is not None:
+            # Streams stopped at the answer end before the provider reports usage
+            record["completion_tokens"] = record["completion_tokens"] or completion
+            self.tracer.parsed(record, response["text"])
+        return response
+
+    def _text(self, chunk):
+        return chunk if isinstance(chunk, str) else chunk.content
+
+    def _provider(self, model):
+        return backends.backend(model).name
+
+    def _cache(self, cache):
+        if isinstance(cache, ResponseCache):
+            return cache
+        return shared_cache() if cache else None
+
+    def _llm(self, model, temperature=0.1, cache=None):
+        # Backends share clients and their connection pools process-wide and import provider packages only when used
+        return backends.create(model, temperature, cache)
+
+class TripleClassifier(LLM):
+    """Base class of the intensions answering with a "Rationale:" followed by an "Answer:" of 1 or 0."""
+
+    # Rambling models follow the answer with invented triples; these only ever appear after it
+    STOP_SEQUENCES = [ "\n###\nSubject:", "\nIs the following knowledge graph triple" ]
+
+    STRUCTURED_INSTRUCTION = """
+Respond only with a JSON object with a "rationale" string and an "answer" of 1 or 0.
+"""
+
+    REPAIR_TEMPLATE = """
+Subject: <{s}>
+Predicate: <{p}>
+Object: <{o}>
+Rationale: {rationale}
+
+Based on this rationale, is the triple true? Respond with only the
+digit 1 if true, otherwise 0.
+Answer: """
@@ -0,0 +1,170 @@
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Codes used in the answer matrix for triples a model did not answer with 0 or 1
+UNPARSED = -1
+MISSING = -2
+
+class Results:
+    """Experiment results aligned as a models × triples matrix of answer codes."""
+
+    def __init__(self, models, triples, answers, duplicates=None):
+        """
+        Initializes aligned results.
+
+        Parameters:
+            models: A list of model names, one per row of answers.
+            triples: A pandas DataFrame with "s", "p" and "o" columns, one row per column of answers.
+            answers: An int8 array of shape (models, triples) holding 1, 0, UNPARSED or MISSING.
+            duplicates: A dict mapping model names to the number of duplicate records dropped for them (default None, none).
+         """
+        self.models = list(models)
+        self.triples = triples
+        self.answers = answers
+        self.duplicates = duplicates or {}
+
+    @classmethod
+    def from_records(cls, experiments):
+        """
+        Aligns per-model result records on their (s, p, o) triples.
+
+        Records repeating a (model, s, p, o) key, e.g. from a rerun or merged shards, are dropped but for
+        the last one, and counted per model in duplicates.
+
+        Parameters:
+            experiments: A dict mapping model names to lists of result dicts as stored in experiments/,
+                or a pandas DataFrame with "model", "s", "p", "o" and "answer" columns (e.g. from ResultStore.load).
+         """
+        if isinstance(experiments, pd.DataFrame):
+            df = experiments
+        else:
+            df = pd.concat(
+                [ pd.DataFrame.from_records(records, columns=["s", "p", "o", "answer"]).assign(model=model)
+                  for model, records in experiments.items() ],
+                ignore_index=True
+            )
+        models = pd.Categorical(df["model"].astype(str))
+        keys = df["s"].astype(str) + "\x00" + df["p"].astype(str) + "\x00" + df["o"].astype(str)
+        triples = pd.Categorical(keys)
+        answer = df["answer"].astype(str).str.strip()
+        codes = np.where(answer == "1", 1, np.where(answer == "0", 0, UNPARSED)).astype(np.int8)
+        # The last record of each (model, triple) cell is kept; np.unique on the reversed cells finds it
+        cells = models.codes.astype(np.int64) * len(triples.categories) + triples.codes
+        _, last = np.unique(cells[::-1], return_index=True)
+        keep = np.sort(len(cells) - 1 - last)
+        dropped = np.bincount(models.codes, minlength=len(models.categories)) - np.bincount(models.codes[keep], minlength=len(models.categories))
+        matrix = np.full((len(models.categories), len(triples.categories)), MISSING, dtype=np.int8)
+        matrix[models.codes[keep], triples.codes[keep]] = codes[keep]
+        spo = pd.Series(triples.categories).str.split("\x00", expand=True)
+        spo.columns = ["s", "p", "o"]
+        duplicates = { model: int(n) for model, n in zip(models.categories, dropped) if n }
+        return cls(models.categories, spo, matrix, duplicates)
+
+    @classmethod
+    def from_experiment(cls, directory, split="owl-inf"):
+        """
+        Aligns the results of every model on one split of an experiment, as saved by the experiment notebooks.
+
+        Parameters:
+            directory: The experiment directory, e.g. "experiments/nesy4vrd".
+            split: The split to read, e.g. "owl-inf" or "train" (default "owl-inf").
+         """
+        experiments = {}
+        for filename in sorted(glob.glob(os.path.join(directory, f"*-{split}.json"))):
+            records = json.load(open(filename, "r"))
+            model = records[0].get("model") if records else None
+            experiments[model or os.path.basename(filename)[:-len(f"-{split}.json")]] = records
+        return cls.from_records(experiments)
+
+    @property
+    def attempted(self):
+        return self.answers != MISSING
+
+    @property
+    def parsed(self):
+        return (self.answers == 0) | (self.answers == 1)
+
+    @property
+    def negatives(self):
+        return self.answers == 0
+
+    def summary(self):
+        """
+        Returns a DataFrame with, per model, the number of triples attempted (N), parse failures,
+        false negatives (FN), the false negative rate over parsed answers (FNR), and the parse-failure rate.
+
+        Every triple is an entailment of the ontology, so every answer of 0 is a false negative.
+        """
+        n = self.attempted.sum(axis=1)
+        parsed = self.parsed.sum(axis=1)
+        fn = self.negatives.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.DataFrame({
+                "model": self.models,
+                "N": n,
+                "parse_failures": n - parsed,
+                "FN": fn,
+                "FNR": fn / parsed,
+                "parse_failure_rate": (n - parsed) / n,
+            })
+
+    def breakdown(self, by="p", rate=False):
+        """
+        Returns a models × groups DataFrame of false negative counts (or rates over parsed answers) per
+        value of a triple column.
+
+        Parameters:
+            by: The triple column to group by, "s", "p" or "o" (default "p").
+            rate: Whether to return false negative rates instead of counts (default False).
+         """
+        groups = pd.Categorical(self.triples[by])
+        order = np.argsort(groups.codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(groups.codes[order]) != 0])
+        fn = np.add.reduceat(self.negatives[:, order].astype(np.int64), starts, axis=1)
+        if rate:
+            parsed = np.add.reduceat(self.parsed[:, order].astype(np.int64), starts, axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fn = fn / parsed
+        present = groups.categories[groups.codes[order][starts]]
+        return pd.DataFrame(fn, index=self.models, columns=present)
+
+    def agreement(self):
+        """Returns a models × models DataFrame of the fraction of triples both models parsed on which they agree."""
+        positives = (self.answers == 1).astype(np.float32)
+        negatives = self.negatives.astype(np.float32)
+        parsed = self.parsed.astype(np.float32)
+        agree = positives @ positives.T + negatives @ negatives.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.DataFrame(agree / (parsed @ parsed.T), index=self.models, columns=self.models)
+
+    def bootstrap(self, resamples=1000, alpha=0.05, seed=0, chunk=100):
+        """
+        Returns a DataFrame of percentile bootstrap confidence intervals for each model's FNR,
+        resampling triples with replacement.
+
+        Parameters:
+            resamples: The number of bootstrap resamples (default 1000).
+            alpha: One minus the confidence level (default 0.05).
+            seed: The random seed (default 0).
+            chunk: The number of resamples drawn at once, bounding memory (default 100).
+         """
+        rng = np.random.default_rng(seed)
+        triples = self.answers.shape[1]
+        negatives = self.negatives.astype(np.float32)
+        parsed = self.parsed.astype(np.float32)
+        rates = []
+        for start in range(0, resamples, chunk):
+            size = min(chunk, resamples - start)
+            # Multiplicity of each triple in each resample
+            weights = rng.multinomial(triples, np.full(triples, 1.0 / triples), size=size).astype(np.float32)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rates.append((negatives @ weights.T) / (parsed @ weights.T))
+        rates = np.concatenate(rates, axis=1)
+        return pd.DataFrame({
+            "model": self.models,
+            "FNR_low": np.nanquantile(rates, alpha / 2, axis=1),
+            "FNR_high": np.nanquantile(rates, 1 - alpha / 2, axis=1),
+        })
@@ -0,0 +1,265 @@
+"""
+Local mock LLM server speaking the OpenAI chat completions, Anthropic messages and Hugging Face
+text-generation wire formats, for benchmarks and offline runs.
+
+    python -m mock_server --port 8089 --latency 0.2 --tokens-per-second 80 --rate-limit 0.05 --malformed 0.02
+
+    POST /v1/chat/completions   OpenAI (LOCAL_LLM_BASE_URL=http://localhost:8089/v1), streaming or not
+    POST /v1/messages           Anthropic (ANTHROPIC_API_URL=http://localhost:8089), streaming or not
+    POST /hf/<model>            Hugging Face text-generation (huggingface_endpoint(..., endpoint_url=...))
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockLLM:
+    """Simulated model behind the mock server: its answers, latency, throughput, rate limiting and malformed outputs."""
+
+    def __init__(self, latency=0.05, tokens_per_second=200.0, completion_tokens=60, rate_limit=0.0, max_concurrent=None,
+                 retry_after=0.05, malformed=0.0, positive=0.8, seed=0):
+        """
+        Initializes a simulated model.
+
+        Parameters:
+            latency: The seconds before the first token, standing in for prompt processing (default 0.05).
+            tokens_per_second: The generation speed after the first token (default 200.0).
+            completion_tokens: The approximate length of a rationale in tokens (default 60).
+            rate_limit: The probability that a request is answered with a 429 (default 0.0).
+            max_concurrent: The number of requests served at once; requests beyond it get a 429 (default None, unlimited).
+            retry_after: The retry-after header in seconds sent with a 429 (default 0.05).
+            malformed: The probability that an output has no parseable answer (default 0.0).
+            positive: The fraction of triples answered 1, chosen by a hash of the prompt (default 0.8).
+            seed: The seed of the rate limiting and malformed output draws (default 0).
+         """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rate_limit = rate_limit
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.malformed = malformed
+        self.positive = positive
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.counts = { "requests": 0, "rate_limited": 0, "malformed": 0, "streamed": 0, "prompt_tokens": 0, "completion_tokens": 0 }
+
+    def admit(self):
+        """Returns True if a request is served, False if it is rate limited; served requests must be release()d."""
+        with self.lock:
+            self.counts["requests"] += 1
+            if self.random.random() < self.rate_limit or (self.max_concurrent is not None and self.active >= self.max_concurrent):
+                self.counts["rate_limited"] += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+    def complete(self, prompt, stop=None):
+        """Returns the completion for a prompt as a list of token strings, truncated at the first stop sequence."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        answer = "1" if digest[0] < 256 * self.positive else "0"
+        with self.lock:
+            malformed = self.random.random() < self.malformed
+            self.counts["malformed"] += malformed
+        if prompt.rstrip().endswith("Answer:"):
+            # A repair prompt asks only for the answer digit
+            text = "?" if malformed else answer
+        else:
+            words = [ "The", "ontology", "entails", "this", "triple" ] if answer == "1" else [ "Nothing", "entails", "this", "triple" ]
+            rationale = " ".join(words[i % len(words)] for i in range(self.completion_tokens))
+            text = f"Rationale: {rationale}.\nAnswer: {'maybe' if malformed else answer}\n###\nSubject: <:Invented>\n"
+        for sequence in stop or []:
+            text = text.split(sequence, 1)[0]
+        tokens = [ text[i:i + 4] for i in range(0, len(text), 4) ]
+        with self.lock:
+            self.counts["prompt_tokens"] += (len(prompt) + 3) // 4
+            self.counts["completion_tokens"] += len(tokens)
+        return tokens
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._json(200, { "object": "list", "data": [] })
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        llm = self.server.llm
+        if not llm.admit():
+            return self._json(429, { "error": { "type": "rate_limit_error", "message": "Rate limited by mock server" } },
+                              { "retry-after": str(llm.retry_after) })
+        try:
+            if self.path.startswith("/v1/chat/completions"):
+                self._openai(llm, body)
+            elif self.path.startswith("/v1/messages"):
+                self._anthropic(llm, body)
+            elif self.path.startswith("/hf"):
+                self._huggingface(llm, body)
+            else:
+                self._json(404, { "error": { "message": f"Unknown path {self.path}" } })
+        except (BrokenPipeError, ConnectionResetError):
+            # Streaming clients hang up as soon as they have read the answer
+            pass
+        finally:
+            llm.release()
+
+    def _openai(self, llm, body):
+        prompt = self._content(body["messages"][-1]["content"])
+        stop = body.get("stop")
+        tokens = self._generate(llm, prompt, [stop] if isinstance(stop, str) else stop, body.get("stream"))
+        usage = { "prompt_tokens": (len(prompt) + 3) // 4, "completion_tokens": len(tokens), "total_tokens": (len(prompt) + 3) // 4 + len(tokens) }
+        base = { "id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock") }
+        if not body.get("stream"):
+            message = { "role": "assistant", "content": "".join(tokens) }
+            return self._json(200, { **base, "object": "chat.completion", "usage": usage,
+                                     "choices": [ { "index": 0, "message": message, "finish_reason": "stop", "logprobs": None } ] })
+        self._start_events()
+        for token in self._paced(llm, tokens):
+            self._event(None, { **base, "object": "chat.completion.chunk",
+                                "choices": [ { "index": 0, "delta": { "content": token }, "finish_reason": None } ] })
+        self._event(None, { **base, "object": "chat.completion.chunk", "choices": [ { "index": 0, "delta": {}, "finish_reason": "stop" } ] })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _anthropic(self, llm, body):
+        prompt = self._content(body["messages"][-1]["content"])
+        tokens = self._generate(llm, prompt, body.get("stop_sequences"), body.get("stream"))
+        usage = { "input_tokens": (len(prompt) + 3) // 4, "output_tokens": len(tokens) }
+        message = { "id": "msg_mock", "type": "message", "role": "assistant", "model": body.get("model", "mock"),
+                    "stop_reason": "end_turn", "stop_sequence": None }
+        if not body.get("stream"):
+            return self._json(200, { **message, "content": [ { "type": "text", "text": "".join(tokens) } ], "usage": usage })
+        self._start_events()
+        self._event("message_start", { "type": "message_start", "message": { **message, "content": [], "stop_reason": None,
+                                                                                 "usage": { **usage, "output_tokens": 1 } } })
+        self._event("content_block_start", { "type": "content_block_start", "index": 0, "content_block": { "type": "text", "text": "" } })
+        for token in self._paced(llm, tokens):
+            self._event("content_block_delta", { "type": "content_block_delta", "index": 0, "delta": { "type": "text_delta", "text": token } })
+        self._event("content_block_stop", { "type": "content_block_stop", "index": 0 })
+        self._event("message_delta", { "type": "message_delta", "delta": { "stop_reason": "end_turn", "stop_sequence": None },
+                                       "usage": { "output_tokens": len(tokens) } })
+        self._event("message_stop", { "type": "message_stop" })
+
+    def _huggingface(self, llm, body):
+        parameters = body.get("parameters") or {}
+        tokens = self._generate(llm, body["inputs"], parameters.get("stop") or parameters.get("stop_sequences"), False)
+        self._json(200, [ { "generated_text": "".join(tokens) } ])
+
+    def _generate(self, llm, prompt, stop, stream):
+        tokens = llm.complete(prompt, stop)
+        time.sleep(llm.latency)
+        if stream:
+            with llm.lock:
+                llm.counts["streamed"] += 1
+        else:
+            time.sleep(len(tokens) / llm.tokens_per_second)
+        return tokens
+
+    def _paced(self, llm, tokens):
+        for token in tokens:
+            yield token
+            time.sleep(1 / llm.tokens_per_second)
+
+    def _content(self, content):
+        if isinstance(content, str):
+            return content
+        return "".join(block.get("text", "") for block in content)
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, name, payload):
+        event = f"event: {name}\n" if name else ""
+        self.wfile.write(f"{event}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+class MockServer:
+    """Mock LLM server running on a background thread; use as a context manager."""
+
+    def __init__(self, llm=None, host="127.0.0.1", port=0):
+        """
+        Initializes a mock server.
+
+        Parameters:
+            llm: The MockLLM answering requests (default a MockLLM with default settings).
+            host: The interface to listen on (default "127.0.0.1").
+            port: The port to listen on, 0 for any free port (default 0).
+         """
+        self.llm = llm or MockLLM()
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.daemon_threads = True
+        self.server.llm = self.llm
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mock_server", description="Serves a mock LLM in the OpenAI, Anthropic and HF formats.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8089, help="port to listen on (default 8089)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token (default 0.05)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="generation speed (default 200)")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="rationale length in tokens (default 60)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="probability of a 429 (default 0)")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="requests served at once before answering 429")
+    parser.add_argument("--malformed", type=float, default=0.0, help="probability of an output without an answer (default 0)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    args = parser.parse_args(argv)
+    llm = MockLLM(args.latency, args.tokens_per_second, args.completion_tokens, args.rate_limit, args.max_concurrent,
+                  malformed=args.malformed, seed=args.seed)
+    server = MockServer(llm, args.host, args.port)
+    print(f"mock LLM server on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
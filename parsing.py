@@ -0,0 +1,129 @@
+import json
+import re
+import time
+from typing import Dict
+from langchain_core.output_parsers import BaseOutputParser
+
+# Parse outcomes per model name, shared by all parsers and LLM instances in the process
+STATS = {}
+
+def parse_stats(model=None):
+    """
+    Returns the parse counters of one model, or a dict of them for every model seen so far.
+
+    Each entry counts parsed outputs, parse failures, repair calls made and repairs that produced an
+    answer, and the total time spent parsing in seconds.
+
+    Parameters:
+        model: The name of the model (default all models).
+    """
+    if model is not None:
+        return dict(STATS.get(model, _counters()))
+    return { name: dict(counters) for name, counters in STATS.items() }
+
+def count(model, key, value=1):
+    """Adds value to one of the parse counters of a model."""
+    STATS.setdefault(model, _counters())[key] += value
+
+def _counters():
+    return { "parsed": 0, "failures": 0, "repairs": 0, "repaired": 0, "parse_time": 0.0 }
+
+class MarkerParser(BaseOutputParser[Dict[str, str]]):
+    """Base class for parsers that extract fields following "Name:" markers in a single pass over the output."""
+
+    model: str = ""
+
+    def parse(self, text: str) -> Dict[str, str]:
+        start = time.perf_counter()
+        parsed = self._json(text) or self._scan(text)
+        failed = parsed is None
+        if failed:
+            parsed = self.default(text)
+        count(self.model, "failures" if failed else "parsed")
+        count(self.model, "parse_time", time.perf_counter() - start)
+        return parsed
+
+    def for_model(self, model):
+        """Returns a copy of this parser that counts its outcomes under model."""
+        return self.copy(update={ "model": model })
+
+    def default(self, text):
+        """Returns the output for text that could not be parsed."""
+        raise NotImplementedError
+
+    def _scan(self, text):
+        raise NotImplementedError
+
+    def _json(self, text):
+        # Structured output mode asks for a JSON object; anything else falls through to the marker scan
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        if not text.startswith("{"):
+            return None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return None
+        return self._fields(value) if isinstance(value, dict) else None
+
+    def _fields(self, value):
+        raise NotImplementedError
+
+class AnswerParser(MarkerParser):
+    """
+    Parses "Rationale: ... Answer: 0|1" output into rationale and answer.
+
+    Equivalent to RegexParser(r"(?is).*Rationale:\\**\\s*(.*?)Answer:\\**\\s*(0|1)") with "rationale" as the
+    default output key, but linear in the length of the output: the last "Rationale:" that is followed by an
+    answer is found from the marker positions instead of by backtracking.
+     """
+
+    RATIONALE = re.compile(r"Rationale:\**\s*", re.IGNORECASE)
+    ANSWER = re.compile(r"Answer:\**\s*(0|1)", re.IGNORECASE)
+
+    @property
+    def _type(self) -> str:
+        return "answer_parser"
+
+    def default(self, text):
+        return { "rationale": text, "answer": "" }
+
+    def _scan(self, text):
+        answers = list(self.ANSWER.finditer(text))
+        if not answers:
+            return None
+        rationale = None
+        for marker in self.RATIONALE.finditer(text, 0, answers[-1].start()):
+            rationale = marker
+        if rationale is None:
+            return None
+        answer = next(a for a in answers if a.start() >= rationale.end())
+        return { "rationale": text[rationale.end():answer.start()], "answer": answer.group(1) }
+
+    def _fields(self, value):
+        answer = str(value.get("answer", "")).strip()
+        if answer not in ("0", "1"):
+            return None
+        return { "rationale": str(value.get("rationale", "")), "answer": answer }
+
+class RevisionParser(MarkerParser):
+    """Parses a revised rationale: the text after the last "Rationale:" marker, or all of the output if there is none."""
+
+    RATIONALE = re.compile(r"Rationale:\**\s*", re.IGNORECASE)
+
+    @property
+    def _type(self) -> str:
+        return "revision_parser"
+
+    def default(self, text):
+        return { "revision": text }
+
+    def _scan(self, text):
+        markers = list(self.RATIONALE.finditer(text))
+        revision = text[markers[-1].end():] if markers else text
+        return { "revision": revision.strip() } if revision.strip() else None
+
+    def _fields(self, value):
+        revision = value.get("revision", value.get("rationale"))
+        return { "revision": str(revision) } if revision else None
@@ -0,0 +1,25 @@
+from rdflib import URIRef, Literal, BNode
+
+def pp_node(graph, node):
+    if isinstance(node, URIRef):
+        return graph.namespace_manager.normalizeUri(node)
+    elif isinstance(node, Literal):
+        return node.n3()
+    else:
+        return str(node)
+
+def is_testable_triple(triple):
+    s, _, o = triple
+    return isinstance(s, URIRef) and not isinstance(o, BNode)
+
+def to_query(graph, triple, text):
+    """
+    Returns the query dict for a triple as built in the experiment notebooks.
+
+    Parameters:
+        graph: The rdflib Graph whose namespace bindings are used to print the triple.
+        triple: An (s, p, o) tuple of rdflib terms.
+        text: The serialization of the ontology filled into the {graph} slot.
+    """
+    s, p, o = triple
+    return { "s": pp_node(graph, s), "p": pp_node(graph, p), "o": pp_node(graph, o), "graph": text }
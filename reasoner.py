@@ -0,0 +1,339 @@
+import time
+from collections import defaultdict
+import numpy as np
+from rdflib import Graph, BNode, Literal
+from rdflib.namespace import RDF, RDFS, OWL
+from owlrl import DeductiveClosure, OWLRL_Semantics
+from owlrl.AxiomaticTriples import OWLRL_Datatypes_Disjointness
+from owlrl.OWLRL import OWLRL_Annotation_properties
+from owlrl.XsdDatatypes import OWL_RL_Datatypes, OWL_Datatype_Subsumptions
+
+def join(left, right):
+    """
+    Returns index arrays (i, j) of all pairs with left[i] == right[j], as in a relational equi-join.
+
+    Parameters:
+        left: A 1-d integer array of join keys.
+        right: A 1-d integer array of join keys.
+    """
+    order = np.argsort(right, kind="stable")
+    keys = right[order]
+    lo = np.searchsorted(keys, left, "left")
+    counts = np.searchsorted(keys, left, "right") - lo
+    i = np.repeat(np.arange(len(left)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return i, order[np.repeat(lo, counts) + offsets]
+
+class Reasoner:
+    """Semi-naive forward-chaining reasoner for the subset of OWL 2 RL used by the VRD-World experiments, over integer-encoded triples."""
+
+    # Terms are packed three to an int64 key, which bounds the number of distinct terms
+    MAX_TERMS = 1 << 21
+
+    PROPERTY_TYPES = [OWL.ObjectProperty, OWL.DatatypeProperty, RDF.Property]
+
+    def __init__(self, graph):
+        """
+        Initializes a reasoner over a graph, dictionary-encoding its terms.
+
+        The rules implemented are eq-ref, eq-sym, eq-trans, eq-rep-*, prp-dom, prp-rng, prp-symp, prp-trp,
+        prp-spo1, prp-eqp1/2, prp-inv1/2, cls-thing, cls-nothing1, cls-int1/2, cls-uni, cls-oo, cax-sco,
+        cax-eqc1/2, scm-cls, scm-sco, scm-eqc1/2, scm-op, scm-dp, scm-spo, scm-eqp1/2, scm-dom1/2,
+        scm-rng1/2, scm-int, scm-uni, prp-ap and the dt-type rules, with the same side conditions as owlrl.
+        Restrictions (someValuesFrom, allValuesFrom, hasValue, cardinalities), keys and property chains are
+        not implemented; compare() reports any divergence from owlrl.
+
+        Parameters:
+            graph: The rdflib Graph to reason over; it is not modified.
+         """
+        self.graph = graph
+        self.terms = []
+        self.ids = {}
+        self.rounds = 0
+        triples = list(graph) + self._one_time_triples(graph)
+        self._input = self._keys(np.array([ [self.id(t) for t in triple] for triple in graph ], dtype=np.int64).reshape(-1, 3))
+        for term in [RDF.type, RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain, RDFS.range, OWL.sameAs,
+                     OWL.equivalentClass, OWL.equivalentProperty, OWL.inverseOf, OWL.Class, OWL.Thing, OWL.Nothing,
+                     OWL.SymmetricProperty, OWL.TransitiveProperty] + self.PROPERTY_TYPES:
+            self.id(term)
+        self._start = np.array([ [self.id(t) for t in triple] for triple in triples ], dtype=np.int64).reshape(-1, 3)
+        self._lists = { name: self._members(graph, predicate) for name, predicate in
+                        (("union", OWL.unionOf), ("intersection", OWL.intersectionOf), ("one_of", OWL.oneOf)) }
+        if len(self.terms) >= self.MAX_TERMS:
+            raise Exception(f'Graph has {len(self.terms)} terms, more than the {self.MAX_TERMS} supported')
+
+    def id(self, term):
+        if term not in self.ids:
+            self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return self.ids[term]
+
+    def closure(self):
+        """Returns the set of rdflib triples in the deductive closure of the graph."""
+        return set(self._decode(self._closure()))
+
+    def inferred(self):
+        """Returns the set of rdflib triples in the deductive closure of the graph that are not in the graph itself."""
+        return set(self.iter_inferred())
+
+    def iter_inferred(self, chunk=10000):
+        """
+        Yields the rdflib triples in the deductive closure of the graph that are not in the graph itself,
+        decoding them from the int-encoded closure a chunk at a time.
+
+        Parameters:
+            chunk: The number of triples decoded at once (default 10000).
+         """
+        keys = self._closure()
+        keys = keys[~np.isin(keys, self._input)]
+        for start in range(0, len(keys), chunk):
+            yield from self._decode(keys[start:start + chunk])
+
+    def _closure(self):
+        start = self._dedupe(self._start)
+        self._all = self._split(start)
+        self._keys_all = self._keys(start)
+        delta = self._all
+        self._literals = np.array([ isinstance(term, Literal) for term in self.terms ])
+        self.rounds = 0
+        while len(delta[0]):
+            self.rounds += 1
+            derived = self._rules(delta)
+            keys = np.unique(self._keys(derived))
+            keys = keys[~np.isin(keys, self._keys_all, assume_unique=True)]
+            delta = self._split(self._unkeys(keys))
+            self._all = tuple(np.concatenate((a, d)) for a, d in zip(self._all, delta))
+            self._keys_all = np.union1d(self._keys_all, keys)
+        # As in owlrl's post-processing, generalized triples with blank node predicates are dropped
+        keys = self._keys_all
+        bnodes = np.array([ isinstance(t, BNode) for t in self.terms ])
+        return keys[~bnodes[self._unkeys(keys)[:, 1]]]
+
+    def _rules(self, delta):
+        t, d, i = self._all, delta, self.ids
+        TYPE, SCO, SPO, SAME = i[RDF.type], i[RDFS.subClassOf], i[RDFS.subPropertyOf], i[OWL.sameAs]
+        EQC, EQP, DOM, RNG = i[OWL.equivalentClass], i[OWL.equivalentProperty], i[RDFS.domain], i[RDFS.range]
+        out = []
+
+        def emit(s, p, o):
+            out.append(np.stack(np.broadcast_arrays(*(np.asarray(c, dtype=np.int64) for c in (s, p, o))), axis=1).reshape(-1, 3))
+
+        def relation(p):
+            # (delta pairs, all pairs) of a constant predicate
+            return tuple((triples[0][triples[1] == p], triples[2][triples[1] == p]) for triples in (d, t))
+
+        def distinct(r):
+            return tuple((a[a != b], b[a != b]) for a, b in r)
+
+        def swap(r):
+            return tuple((b, a) for a, b in r)
+
+        def compose(left, right):
+            # left(x, y) and right(y, z) give (x, z), with delta on either side
+            xs, zs = [], []
+            for (lx, ly), (ry, rz) in ((left[0], right[1]), (left[1], right[0])):
+                a, b = join(ly, ry)
+                xs.append(lx[a])
+                zs.append(rz[b])
+            return np.concatenate(xs), np.concatenate(zs)
+
+        def by_predicate(r):
+            # r(p, c) and (x, p, y) give (x, y, c), with delta on either side
+            xs, ys, cs = [], [], []
+            for (rp, rc), triples in ((r[0], t), (r[1], d)):
+                a, b = join(triples[1], rp)
+                xs.append(triples[0][a])
+                ys.append(triples[2][a])
+                cs.append(rc[b])
+            return np.concatenate(xs), np.concatenate(ys), np.concatenate(cs)
+
+        sco, spo, same, eqc, eqp = relation(SCO), relation(SPO), relation(SAME), relation(EQC), relation(EQP)
+        dom, rng, typ, inv = relation(DOM), relation(RNG), relation(TYPE), relation(i[OWL.inverseOf])
+
+        # eq-ref
+        terms = np.unique(np.concatenate(d))
+        emit(terms, SAME, terms)
+        # eq-sym
+        emit(same[0][1], SAME, same[0][0])
+        # eq-trans
+        x, z = compose(same, same)
+        emit(x, SAME, z)
+        # eq-rep-s, eq-rep-p, eq-rep-o
+        for (ss, so), triples in ((distinct(same)[0], t), (distinct(same)[1], d)):
+            for column in (0, 1):
+                a, b = join(triples[column], ss)
+                replaced = [ triples[k][a] for k in range(3) ]
+                replaced[column] = so[b]
+                emit(*replaced)
+            a, b = join(triples[2], so)
+            emit(triples[0][a], triples[1][a], ss[b])
+        # prp-dom, prp-rng
+        x, y, c = by_predicate(dom)
+        emit(x, TYPE, c)
+        x, y, c = by_predicate(rng)
+        emit(y, TYPE, c)
+        # prp-symp
+        symmetric = tuple((s[o == i[OWL.SymmetricProperty]],) * 2 for s, o in typ)
+        x, y, p = by_predicate(symmetric)
+        emit(y, p, x)
+        # prp-trp
+        transitive = typ[1][0][typ[1][1] == i[OWL.TransitiveProperty]]
+        if len(transitive):
+            fresh = typ[0][0][typ[0][1] == i[OWL.TransitiveProperty]]
+            restricted_d = tuple(np.concatenate((cd[np.isin(d[1], transitive)], ct[np.isin(t[1], fresh)])) for cd, ct in zip(d, t))
+            restricted_t = tuple(c[np.isin(t[1], transitive)] for c in t)
+            for left, right in ((restricted_d, restricted_t), (restricted_t, restricted_d)):
+                a, b = join(left[2] * self.MAX_TERMS + left[1], right[0] * self.MAX_TERMS + right[1])
+                emit(left[0][a], left[1][a], right[2][b])
+        # prp-spo1
+        x, y, p2 = by_predicate(spo)
+        emit(x, p2, y)
+        # prp-eqp1, prp-eqp2
+        x, y, p2 = by_predicate(distinct(eqp))
+        emit(x, p2, y)
+        x, y, p1 = by_predicate(swap(distinct(eqp)))
+        emit(x, p1, y)
+        # prp-inv1, prp-inv2
+        x, y, p2 = by_predicate(inv)
+        emit(y, p2, x)
+        x, y, p1 = by_predicate(swap(inv))
+        emit(y, p1, x)
+        # cls-uni and cls-int2: static (from, to) class pairs applied to new rdf:type triples
+        members, classes = self._lists["intersection"]
+        for source, target in (self._lists["union"], (classes, members)):
+            a, b = join(typ[0][1], source)
+            emit(typ[0][0][a], TYPE, target[b])
+        # cls-int1
+        members, classes = self._lists["intersection"]
+        for c in np.unique(classes):
+            required = members[classes == c]
+            candidates = np.unique(typ[0][0][np.isin(typ[0][1], required)])
+            if len(candidates):
+                keys = (candidates[:, None] * self.MAX_TERMS + TYPE) * self.MAX_TERMS + required[None, :]
+                emit(candidates[np.isin(keys, self._keys_all).all(axis=1)], TYPE, c)
+        # cax-sco, cax-eqc1, cax-eqc2
+        for r in (distinct(sco), distinct(eqc), swap(distinct(eqc))):
+            x, c2 = compose(typ, r)
+            emit(x, TYPE, c2)
+        # scm-cls
+        classes = typ[0][0][typ[0][1] == i[OWL.Class]]
+        emit(classes, SCO, classes)
+        emit(classes, EQC, classes)
+        emit(classes, SCO, np.full_like(classes, i[OWL.Thing]))
+        emit(np.full_like(classes, i[OWL.Nothing]), SCO, classes)
+        # scm-op, scm-dp
+        properties = typ[0][0][np.isin(typ[0][1], [ i[p] for p in self.PROPERTY_TYPES ])]
+        emit(properties, SPO, properties)
+        emit(properties, EQP, properties)
+        # scm-sco, scm-spo
+        for r, predicate in ((sco, SCO), (spo, SPO)):
+            x, z = compose(distinct(r), r)
+            emit(x[x != z], predicate, z[x != z])
+        # scm-eqc2 (including reflexive pairs), scm-eqp2 (distinct pairs only)
+        for r, predicate in ((sco, EQC), (distinct(spo), EQP)):
+            a, b = r[0]
+            mutual = np.isin((b * self.MAX_TERMS + (SCO if predicate == EQC else SPO)) * self.MAX_TERMS + a, self._keys_all)
+            emit(a[mutual], predicate, b[mutual])
+            emit(b[mutual], predicate, a[mutual])
+        # scm-eqc1, scm-eqp1
+        for r, predicate in ((eqc, SCO), (eqp, SPO)):
+            a, b = distinct(r)[0]
+            emit(a, predicate, b)
+            emit(b, predicate, a)
+        # scm-dom1, scm-dom2, scm-rng1, scm-rng2
+        for r, predicate in ((dom, DOM), (rng, RNG)):
+            p, c2 = compose(r, distinct(sco))
+            emit(p, predicate, c2)
+            p1, c = compose(distinct(spo), r)
+            emit(p1, predicate, c)
+        # cls-oo, scm-int, scm-uni: static list memberships
+        if self.rounds == 1:
+            members, classes = self._lists["one_of"]
+            emit(members, TYPE, classes)
+            members, classes = self._lists["intersection"]
+            emit(classes, SCO, members)
+            members, classes = self._lists["union"]
+            emit(members, SCO, classes)
+        derived = np.concatenate(out)
+        # Literals cannot be predicates
+        return derived[~self._literals[derived[:, 1]]]
+
+    def _one_time_triples(self, graph):
+        # cls-thing, cls-nothing1, prp-ap and the dt-type rules, as in OWLRL_Semantics.one_time_rules
+        triples = [ (OWL.Thing, RDF.type, OWL.Class), (OWL.Nothing, RDF.type, OWL.Class) ]
+        triples += [ (an, RDF.type, OWL.AnnotationProperty) for an in OWLRL_Annotation_properties ]
+        implicit = { o: o.datatype for o in graph.objects() if isinstance(o, Literal) and o.datatype in OWL_RL_Datatypes }
+        used = set(implicit.values())
+        explicit = defaultdict(set)
+        triples += [ (lt, RDF.type, dt) for lt, dt in implicit.items() ]
+        for s, o in graph.subject_objects(RDF.type):
+            if o in OWL_RL_Datatypes:
+                used.add(o)
+                if s not in implicit:
+                    explicit[s].add(o)
+        for s, o in graph.subject_objects(OWL.sameAs):
+            if o in implicit:
+                explicit[s].add(implicit[o])
+            if o in explicit:
+                explicit[s].add(o)
+            if s in explicit:
+                explicit[o].add(s)
+        triples += [ (dt, RDF.type, RDFS.Datatype) for dt in OWL_RL_Datatypes ]
+        triples += [ (dt, RDF.type, RDFS.Datatype) for dts in explicit.values() for dt in dts ]
+        for r, dts in list(explicit.items()) + [ (r, { dt }) for r, dt in implicit.items() ]:
+            for dt in dts:
+                for new_dt in OWL_Datatype_Subsumptions.get(dt, []):
+                    triples += [ (r, RDF.type, new_dt), (new_dt, RDF.type, RDFS.Datatype) ]
+                    used.add(new_dt)
+        triples += [ t for t in OWLRL_Datatypes_Disjointness if t[0] in used and t[2] in used ]
+        return triples
+
+    def _members(self, graph, predicate):
+        # (member, class) pairs of the rdf:List objects of a class expression predicate
+        pairs = [ (self.id(m), self.id(c)) for c, head in graph.subject_objects(predicate) for m in graph.items(head) ]
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def _keys(self, triples):
+        return (triples[:, 0] * self.MAX_TERMS + triples[:, 1]) * self.MAX_TERMS + triples[:, 2]
+
+    def _unkeys(self, keys):
+        return np.stack((keys // self.MAX_TERMS ** 2, keys // self.MAX_TERMS % self.MAX_TERMS, keys % self.MAX_TERMS), axis=1)
+
+    def _dedupe(self, triples):
+        return self._unkeys(np.unique(self._keys(triples)))
+
+    def _split(self, triples):
+        return triples[:, 0], triples[:, 1], triples[:, 2]
+
+    def _decode(self, keys):
+        return [ (self.terms[s], self.terms[p], self.terms[o]) for s, p, o in self._unkeys(keys).tolist() ]
+
+def compare(graph, semantics=OWLRL_Semantics):
+    """
+    Computes the inferred triples of a graph with both owlrl and Reasoner, returning timings and the
+    triples each produces that the other does not.
+
+    Parameters:
+        graph: The rdflib Graph of the ontology; it is not modified.
+        semantics: The owlrl semantics class to compare against (default OWLRL_Semantics).
+    """
+    start = time.perf_counter()
+    closure = Graph()
+    closure += graph
+    DeductiveClosure(semantics).expand(closure)
+    expected = set(closure - graph)
+    owlrl_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    reasoner = Reasoner(graph)
+    inferred = reasoner.inferred()
+    reasoner_seconds = time.perf_counter() - start
+    return {
+        "owlrl_seconds": owlrl_seconds,
+        "reasoner_seconds": reasoner_seconds,
+        "speedup": owlrl_seconds / reasoner_seconds if reasoner_seconds else float("inf"),
+        "rounds": reasoner.rounds,
+        "inferred": len(expected),
+        "missing": expected - inferred,
+        "extra": inferred - expected,
+    }
@@ -0,0 +1,121 @@
+import glob
+import json
+import os
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+class ResultStore:
+    """Columnar store of experiment results, partitioned by experiment, split and model as Parquet files."""
+
+    SPLITS = ["owl-inf", "train", "test", "validate", "fns"]
+
+    SCHEMA = pa.schema([
+        ("s", pa.dictionary(pa.int32(), pa.string())),
+        ("p", pa.dictionary(pa.int32(), pa.string())),
+        ("o", pa.dictionary(pa.int32(), pa.string())),
+        ("model", pa.dictionary(pa.int32(), pa.string())),
+        ("answer", pa.dictionary(pa.int8(), pa.string())),
+        ("rationale", pa.string()),
+    ])
+
+    PARTITIONING = ds.partitioning(
+        pa.schema([("experiment", pa.string()), ("split", pa.string()), ("slug", pa.string())]),
+        flavor="hive"
+    )
+
+    def __init__(self, root="results"):
+        """
+        Initializes a result store rooted at a directory.
+
+        Parameters:
+            root: The root directory of the store (default "results").
+         """
+        self.root = root
+
+    def write(self, records, experiment, split, model):
+        """
+        Writes the result records of one model on one split, replacing any previous ones.
+
+        Parameters:
+            records: A list of result dicts with "s", "p", "o", "model", "rationale" and "answer" entries.
+            experiment: The name of the experiment, e.g. "nesy4vrd".
+            split: The name of the split, e.g. "owl-inf" or "train".
+            model: The name of the model, e.g. "mistralai/Mistral-7B-Instruct-v0.3".
+         """
+        columns = { name: [ self._str(record.get(name)) for record in records ] for name in self.SCHEMA.names }
+        columns["model"] = [ record.get("model") or model for record in records ]
+        table = pa.table(
+            { name: pa.array(columns[name], pa.string()) for name in self.SCHEMA.names }
+        ).cast(self.SCHEMA)
+        directory = self._partition(experiment, split, model)
+        os.makedirs(directory, exist_ok=True)
+        # Rationales are by far the largest column; they get a heavier codec than the short categorical columns
+        pq.write_table(
+            table,
+            os.path.join(directory, "part-0.parquet"),
+            compression={ "s": "snappy", "p": "snappy", "o": "snappy", "model": "snappy", "answer": "snappy", "rationale": "zstd" },
+            compression_level={ "rationale": 9 },
+            use_dictionary=["s", "p", "o", "model", "answer"],
+        )
+
+    def load(self, columns=None, experiment=None, split=None, models=None):
+        """
+        Returns a pandas DataFrame of results, reading only the requested columns and partitions.
+
+        Parameters:
+            columns: The columns to read, e.g. ["model", "p", "answer"] (default all except "rationale").
+            experiment: The experiment to read (default all).
+            split: The split to read (default all).
+            models: A list of model names to read (default all).
+         """
+        return self.table(columns, experiment, split, models).to_pandas()
+
+    def table(self, columns=None, experiment=None, split=None, models=None):
+        """Returns the results as a pyarrow Table; see load()."""
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self.PARTITIONING)
+        if columns is None:
+            columns = [ name for name in dataset.schema.names if name != "rationale" ]
+        condition = None
+        for field, value in (("experiment", experiment), ("split", split)):
+            if value is not None:
+                condition = self._and(condition, ds.field(field) == value)
+        if models is not None:
+            condition = self._and(condition, ds.field("slug").isin([ self._slug(m) for m in models ]))
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def import_experiments(self, directory="experiments"):
+        """
+        Imports every <model>-<split>.json results file under directory/<experiment>/ and returns the
+        list of (experiment, split, model) partitions written.
+
+        Parameters:
+            directory: The directory holding the per-experiment subdirectories (default "experiments").
+         """
+        imported = []
+        for filename in sorted(glob.glob(os.path.join(directory, "*", "*.json"))):
+            experiment = os.path.basename(os.path.dirname(filename))
+            stem = os.path.basename(filename)[:-len(".json")]
+            split = next((s for s in self.SPLITS if stem.endswith(f"-{s}")), None)
+            if split is None:
+                continue
+            records = json.load(open(filename, "r"))
+            model = records[0].get("model") if records else None
+            model = model or stem[:-len(split) - 1]
+            self.write(records, experiment, split, model)
+            imported.append((experiment, split, model))
+        return imported
+
+    def _partition(self, experiment, split, model):
+        return os.path.join(self.root, f"experiment={experiment}", f"split={split}", f"slug={self._slug(model)}")
+
+    def _slug(self, model):
+        # Model names such as "mistralai/Mistral-7B-Instruct-v0.3" or "local:llama3" are not valid directory names;
+        # the whole name is kept, so that models of different organizations or backends do not share a partition
+        return model.replace("/", "__").replace(":", "__")
+
+    def _str(self, value):
+        return value if value is None or isinstance(value, str) else str(value)
+
+    def _and(self, condition, clause):
+        return clause if condition is None else condition & clause
@@ -0,0 +1,131 @@
+"""
+Streaming sampling of testable inferred triples into query splits.
+
+load_closure() holds the ontology, a copy of it in the closure and a third graph of the inferred triples,
+and prepare used to sort and sample a list of all of them. Here the inferred triples are a generator over
+the reasoner's output, filtered lazily by is_testable_triple, and sampled in one pass into a bounded
+reservoir, so that memory beyond the reasoner's own grows with the sample rather than the closure.
+
+The reservoir keeps the triples with the smallest seeded hash priorities (bottom-k sampling), which is a
+uniform sample like random.sample() but does not depend on the order the triples arrive in; rdflib's
+iteration order changes between processes, so this keeps a seeded sample reproducible without sorting.
+"""
+import hashlib
+import heapq
+import random
+from collections import Counter, defaultdict
+from owlrl import DeductiveClosure, OWLRL_Semantics
+from rdflib import Graph
+from queries import is_testable_triple
+
+def inferred_triples(graph, semantics=OWLRL_Semantics, reasoner=False):
+    """
+    Yields the triples in the deductive closure of a graph that are not in the graph itself.
+
+    With owlrl the closure is expanded into a single copy of the graph and the inferred triples are read
+    off it, without building a separate graph of them; with reasoner.Reasoner they are decoded from its
+    int-encoded closure a chunk at a time.
+
+    Parameters:
+        graph: The rdflib Graph of the ontology; it is not modified.
+        semantics: The owlrl semantics class used to compute the closure (default OWLRL_Semantics).
+        reasoner: True to use reasoner.Reasoner instead of owlrl (default False).
+    """
+    if reasoner:
+        from reasoner import Reasoner
+        yield from Reasoner(graph).iter_inferred()
+        return
+    closure = Graph()
+    closure += graph
+    DeductiveClosure(semantics).expand(closure)
+    for triple in closure:
+        if triple not in graph:
+            yield triple
+
+def testable_triples(triples):
+    """Lazily filters an iterable of triples down to those is_testable_triple accepts."""
+    return filter(is_testable_triple, triples)
+
+class ReservoirSampler:
+    """Seeded one-pass sample of triples into named splits, optionally stratified by predicate."""
+
+    def __init__(self, sizes, seed=None, stratify=False):
+        """
+        Initializes an empty sampler.
+
+        Parameters:
+            sizes: A list of (name, size) pairs, e.g. [ ("test", 100), ("train", 100) ].
+            seed: The random seed (default None, a different sample on each run).
+            stratify: True to give each predicate its share of the sample, and of each split, in proportion
+                to its number of triples; this keeps up to the sample size per predicate until the end
+                of the pass (default False).
+         """
+        self.sizes = list(sizes)
+        self.size = sum(size for _, size in self.sizes)
+        self.seed = random.Random().getrandbits(64) if seed is None else seed
+        self.stratify = stratify
+        self.seen = 0
+        self.counts = Counter()
+        # Max-heaps of (-priority, key, triple), one per predicate when stratified
+        self.reservoirs = defaultdict(list)
+
+    def add(self, triple):
+        self.seen += 1
+        stratum = triple[1] if self.stratify else None
+        self.counts[stratum] += 1
+        key = " ".join(term.n3() for term in triple)
+        digest = hashlib.blake2b(f"{self.seed}\x00{key}".encode("utf-8"), digest_size=8).digest()
+        item = (-int.from_bytes(digest, "big"), key, triple)
+        reservoir = self.reservoirs[stratum]
+        if len(reservoir) < self.size:
+            heapq.heappush(reservoir, item)
+        elif item > reservoir[0]:
+            heapq.heapreplace(reservoir, item)
+
+    def extend(self, triples):
+        for triple in triples:
+            self.add(triple)
+        return self
+
+    def splits(self):
+        """Returns a dict mapping split names to their lists of triples, filled in order when there are too few triples."""
+        if self.seen <= self.size or not self.stratify:
+            chosen = sorted((item for reservoir in self.reservoirs.values() for item in reservoir), reverse=True)[:self.size]
+            return self._slices([ item[2] for item in chosen ])
+        # Each predicate's share of the sample by largest remainder, its lowest priorities kept
+        quotas = { p: self.size * n // self.seen for p, n in self.counts.items() }
+        remainders = sorted(self.counts, key=lambda p: (-(self.size * self.counts[p] % self.seen), p.n3()))
+        for p in remainders[:self.size - sum(quotas.values())]:
+            quotas[p] += 1
+        chosen = []
+        for p in sorted(self.reservoirs, key=lambda p: p.n3()):
+            chosen += [ item[2] for item in sorted(self.reservoirs[p], reverse=True)[:quotas[p]] ]
+        # Splits are dealt evenly along the predicate-ordered sample, so each gets every predicate's share
+        labels = sorted(((j + 0.5) / size, i) for i, (_, size) in enumerate(self.sizes) for j in range(size))
+        splits = { name: [] for name, _ in self.sizes }
+        for (_, i), triple in zip(labels, chosen):
+            splits[self.sizes[i][0]].append(triple)
+        return splits
+
+    def _slices(self, triples):
+        splits, start = {}, 0
+        for name, size in self.sizes:
+            splits[name] = triples[start:start + size]
+            start += size
+        return splits
+
+def sample_splits(graph, sizes, seed=None, stratify=False, semantics=OWLRL_Semantics, reasoner=False):
+    """
+    Samples testable inferred triples of a graph into splits in one pass, returning a dict mapping
+    split names to lists of triples.
+
+    Parameters:
+        graph: The rdflib Graph of the ontology; it is not modified.
+        sizes: A list of (name, size) pairs, e.g. [ ("test", 100), ("train", 100) ].
+        seed: The random seed (default None).
+        stratify: True to stratify the sample by predicate (default False).
+        semantics: The owlrl semantics class used to compute the closure (default OWLRL_Semantics).
+        reasoner: True to use reasoner.Reasoner instead of owlrl (default False).
+    """
+    sampler = ReservoirSampler(sizes, seed, stratify)
+    return sampler.extend(testable_triples(inferred_triples(graph, semantics, reasoner))).splits()
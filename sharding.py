@@ -0,0 +1,254 @@
+"""
+Sharded execution of experiment runs across local processes or nodes sharing a work directory.
+
+    workdir/manifest.json          models, shard count and run settings written by plan()
+    workdir/queries.json           the split's queries
+    workdir/leases/shard-<i>.lease the owner and expiry of the lease on shard i
+    workdir/parts/shard-<i>.jsonl  the records of shard i, appended by its lease holder
+    workdir/parts/shard-<i>.done   written once shard i has been run without failed requests
+
+Each (model, query) pair belongs to the shard given by a stable hash of its key, so every process
+computes the same partition; a worker only runs a shard while it holds the lease on it, renewing it
+as it goes, and a lease whose holder died expires and is taken over. merge() writes the canonical
+per-model result files in query order and reports missing and duplicate keys.
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from checkpoint import RunWriter, read_records
+from engine import AsyncEngine
+
+def shard_of(record, shards):
+    """Returns the shard of a (model, s, p, o) key, stable across processes, machines and Python versions."""
+    key = "\x00".join(str(value) for value in RunWriter.key(record))
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big") % shards
+
+class Lease:
+    """Expiring lease on a shard, held as a file created exclusively in a shared directory."""
+
+    def __init__(self, path, owner, seconds=300):
+        """
+        Initializes a lease, not yet acquired.
+
+        Parameters:
+            path: The path of the lease file.
+            owner: A string identifying the holder, e.g. "host:pid:nonce".
+            seconds: The time after which a lease that has not been renewed may be taken over (default 300).
+         """
+        self.path = path
+        self.owner = owner
+        self.seconds = seconds
+
+    def acquire(self):
+        """Returns True if the lease was free or expired and is now held by this owner."""
+        if self._create():
+            return True
+        holder = self._read(self.path)
+        if holder is None or holder["expires"] > time.time():
+            return False
+        # Taking over an expired lease: moving the file aside is atomic, so only one taker succeeds
+        stale = f"{self.path}.{uuid.uuid4().hex}"
+        try:
+            os.rename(self.path, stale)
+        except FileNotFoundError:
+            return False
+        moved = self._read(stale)
+        if moved is not None and moved["expires"] > time.time():
+            # Another taker renewed it between the read and the rename; put it back
+            try:
+                os.link(stale, self.path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        return self._create()
+
+    def renew(self):
+        """Extends the lease; raises an exception if it has been taken over."""
+        holder = self._read(self.path)
+        if holder is None or holder["owner"] != self.owner:
+            raise Exception(f'Lease {self.path} is no longer held by {self.owner}')
+        temporary = f"{self.path}.{uuid.uuid4().hex}"
+        with open(temporary, "w") as f:
+            json.dump(self._content(), f)
+        os.replace(temporary, self.path)
+
+    def release(self):
+        holder = self._read(self.path)
+        if holder is not None and holder["owner"] == self.owner:
+            os.remove(self.path)
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._content(), f)
+        return True
+
+    def _content(self):
+        return { "owner": self.owner, "expires": time.time() + self.seconds }
+
+    def _read(self, path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # A lease being written; treated as held until it has been written or has gone stale
+            return { "owner": None, "expires": os.path.getmtime(path) + self.seconds }
+
+def plan(workdir, queries, models, shards, intension="intension", streaming=False, cache=True, lease_seconds=300):
+    """
+    Creates a work directory for a sharded run, or checks that an existing one is for the same run.
+
+    Parameters:
+        workdir: The work directory, local or on a filesystem shared by the nodes.
+        queries: The list of query dicts of the split.
+        models: The list of model names.
+        shards: The number of shards.
+        intension: The module of the Intension class used, e.g. "intension_v2" (default "intension").
+        streaming: True to stream completions (default False).
+        cache: True to use the shared response cache (default True).
+        lease_seconds: The lease expiry in seconds (default 300).
+    """
+    manifest = { "models": list(models), "shards": shards, "intension": intension, "streaming": streaming, "cache": cache,
+                 "lease_seconds": lease_seconds, "queries": len(queries) }
+    path = os.path.join(workdir, "manifest.json")
+    if os.path.isfile(path):
+        existing = json.load(open(path, "r"))
+        if existing != manifest:
+            raise Exception(f'Work directory {workdir} holds a different run: {existing}')
+        return existing
+    for directory in ("leases", "parts"):
+        os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+    json.dump(queries, open(os.path.join(workdir, "queries.json"), "w+"))
+    # The manifest is written last, so a work directory with a manifest is complete
+    json.dump(manifest, open(f"{path}.tmp", "w+"))
+    os.replace(f"{path}.tmp", path)
+    return manifest
+
+def work(workdir, worker=0, engine=None):
+    """
+    Runs the shards of a work directory until every shard is done or leased by another worker,
+    and returns the number of shards this worker completed.
+
+    Workers start at different shards (worker modulo the shard count) so that they rarely contend for a lease.
+
+    Parameters:
+        workdir: The work directory created by plan().
+        worker: The index of this worker (default 0).
+        engine: The AsyncEngine running the queries (default a new AsyncEngine).
+    """
+    manifest = json.load(open(os.path.join(workdir, "manifest.json"), "r"))
+    queries = json.load(open(os.path.join(workdir, "queries.json"), "r"))
+    shards = manifest["shards"]
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    engine = engine or AsyncEngine()
+    module = importlib.import_module(manifest["intension"])
+    llms = {}
+    completed = 0
+    for i in [ (worker + j) % shards for j in range(shards) ]:
+        done = os.path.join(workdir, "parts", f"shard-{i}.done")
+        if os.path.isfile(done):
+            continue
+        lease = Lease(os.path.join(workdir, "leases", f"shard-{i}.lease"), owner, manifest["lease_seconds"])
+        if not lease.acquire():
+            continue
+        try:
+            # The done marker may have been written while the lease was being acquired
+            if os.path.isfile(done):
+                continue
+            errors = 0
+            with RunWriter(os.path.join(workdir, "parts", f"shard-{i}.jsonl")) as writer:
+                for model in manifest["models"]:
+                    if model not in llms:
+                        llms[model] = module.Intension(model=model, cache=manifest["cache"], streaming=manifest["streaming"])
+                    shard = [ q for q in queries if shard_of({ **q, "model": model }, shards) == i ]
+                    errors += asyncio.run(_leased(engine.checkpoint(llms[model], shard, writer, desc=f"shard {i} {model:28}"), lease))
+            if not errors:
+                open(done, "w").close()
+                completed += 1
+        finally:
+            lease.release()
+    return completed
+
+async def _leased(run, lease):
+    # Renews the lease at a third of its expiry while the run is in progress; a lease taken over by
+    # another worker cancels the run and raises, so this worker stops writing to the shard and never marks it done
+    async def renew():
+        while True:
+            await asyncio.sleep(lease.seconds / 3)
+            lease.renew()
+    run = asyncio.ensure_future(run)
+    renewal = asyncio.ensure_future(renew())
+    try:
+        await asyncio.wait([ run, renewal ], return_when=asyncio.FIRST_COMPLETED)
+        if renewal.done():
+            run.cancel()
+            renewal.result()
+        return run.result()
+    finally:
+        run.cancel()
+        renewal.cancel()
+
+def run_local(workdir, workers=4):
+    """
+    Runs the shards of a work directory in local worker processes and returns the number of shards completed.
+
+    Parameters:
+        workdir: The work directory created by plan().
+        workers: The number of worker processes (default 4).
+    """
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        return sum(pool.starmap(work, [ (workdir, worker) for worker in range(workers) ]))
+
+def merge(workdir, filename):
+    """
+    Merges the shard files of a work directory into per-model lists of records in query order and returns
+    them with a report of, per model, the number of records and the missing and duplicate keys.
+
+    Duplicates, e.g. from a shard rerun after its lease expired mid-write, keep the first record written.
+
+    Parameters:
+        workdir: The work directory created by plan().
+        filename: A function (model) returning the path of the model's result file, or None to write no files.
+    """
+    manifest = json.load(open(os.path.join(workdir, "manifest.json"), "r"))
+    queries = json.load(open(os.path.join(workdir, "queries.json"), "r"))
+    records, duplicates = {}, {}
+    for i in range(manifest["shards"]):
+        path = os.path.join(workdir, "parts", f"shard-{i}.jsonl")
+        if not os.path.isfile(path):
+            continue
+        for record in read_records(path):
+            key = RunWriter.key(record)
+            if key in records:
+                duplicates.setdefault(record["model"], []).append(key[1:])
+            else:
+                records[key] = record
+    results, report = {}, {}
+    for model in manifest["models"]:
+        keys = [ RunWriter.key({ **q, "model": model }) for q in queries ]
+        results[model] = [ records[key] for key in keys if key in records ]
+        report[model] = {
+            "records": len(results[model]),
+            "missing": [ key[1:] for key in keys if key not in records ],
+            "duplicates": duplicates.get(model, []),
+        }
+        if filename is not None and not report[model]["missing"]:
+            path = filename(model)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            json.dump(results[model], open(path, "w+"))
+    return results, report
@@ -0,0 +1,120 @@
+from rdflib import RDF, RDFS, OWL, XSD
+from queries import pp_node
+
+def forms(term, curie):
+    """Returns the ways pp_node may print a well-known term: as its CURIE, or as a full IRI when the prefix is not bound."""
+    return { curie, str(term) }
+
+REFLEXIVE = forms(RDFS.subClassOf, "rdfs:subClassOf") | forms(RDFS.subPropertyOf, "rdfs:subPropertyOf") \
+    | forms(OWL.equivalentClass, "owl:equivalentClass") | forms(OWL.equivalentProperty, "owl:equivalentProperty") \
+    | forms(OWL.sameAs, "owl:sameAs")
+SUBCLASS = forms(RDFS.subClassOf, "rdfs:subClassOf")
+DOMAIN = forms(RDFS.domain, "rdfs:domain")
+RANGE = forms(RDFS.range, "rdfs:range")
+TYPE = forms(RDF.type, "rdf:type")
+THING = forms(OWL.Thing, "owl:Thing")
+NOTHING = forms(OWL.Nothing, "owl:Nothing")
+DATATYPE = forms(RDFS.Datatype, "rdfs:Datatype")
+XSD_PREFIXES = ("xsd:", str(XSD))
+
+class SymbolicFilter:
+    """Recognises triples that are entailed by the OWL and RDFS axioms alone, or asserted in the ontology."""
+
+    PATTERNS = ("reflexive", "nothing", "thing", "domain-thing", "range-thing", "datatype", "asserted")
+
+    def __init__(self, graph=None, patterns=PATTERNS):
+        """
+        Initializes a symbolic filter.
+
+        Parameters:
+            graph: The source ontology as an rdflib Graph, used by the "asserted" pattern (default None).
+            patterns: The patterns to recognise (default all of PATTERNS):
+                "reflexive": X rdfs:subClassOf, rdfs:subPropertyOf, owl:equivalentClass, owl:equivalentProperty or owl:sameAs X;
+                "nothing": owl:Nothing rdfs:subClassOf X;
+                "thing": X rdfs:subClassOf owl:Thing;
+                "domain-thing": P rdfs:domain owl:Thing;
+                "range-thing": P rdfs:range owl:Thing;
+                "datatype": xsd:D rdf:type rdfs:Datatype;
+                "asserted": triples asserted in graph.
+         """
+        for pattern in patterns:
+            if pattern not in self.PATTERNS:
+                raise Exception(f'Unknown symbolic pattern {pattern}')
+        self.patterns = patterns
+        self.asserted = set()
+        if graph is not None and "asserted" in patterns:
+            for s, p, o in graph:
+                self.asserted.add((pp_node(graph, s), pp_node(graph, p), pp_node(graph, o)))
+                self.asserted.add((str(s), str(p), str(o)))
+
+    def match(self, query):
+        """Returns the name of the first pattern a query's triple matches, or None."""
+        s, p, o = query["s"], query["p"], query["o"]
+        for pattern in self.patterns:
+            if pattern == "reflexive" and s == o and p in REFLEXIVE:
+                return pattern
+            if pattern == "nothing" and s in NOTHING and p in SUBCLASS:
+                return pattern
+            if pattern == "thing" and o in THING and p in SUBCLASS:
+                return pattern
+            if pattern == "domain-thing" and o in THING and p in DOMAIN:
+                return pattern
+            if pattern == "range-thing" and o in THING and p in RANGE:
+                return pattern
+            if pattern == "datatype" and s.startswith(XSD_PREFIXES) and p in TYPE and o in DATATYPE:
+                return pattern
+            if pattern == "asserted" and (s, p, o) in self.asserted:
+                return pattern
+        return None
+
+class ShortCircuit:
+    """Front end to an intension that answers symbolically recognised triples without calling the model."""
+
+    def __init__(self, llm, symbolic, mode="answer"):
+        """
+        Initializes a short circuit.
+
+        Parameters:
+            llm: An Intension (or SelfConsistency, Cascade tier, ...) used for all other triples.
+            symbolic: The SymbolicFilter recognising triples.
+            mode: "answer" to answer recognised triples with 1 without a call, "tag" to call the model anyway
+                but mark the records, or "off" to pass every triple through unmarked (default "answer").
+         """
+        if mode not in ("answer", "tag", "off"):
+            raise Exception(f'Unknown short circuit mode {mode}')
+        self.llm = llm
+        self.symbolic = symbolic
+        self.mode = mode
+        self.model = llm.model
+        self.provider = llm.provider
+        self.chain = getattr(llm, "chain", None)
+        self.counts = {}
+
+    def invoke(self, query):
+        """Returns a chain response for one query, from the symbolic filter or the model."""
+        pattern = self._match(query)
+        if pattern is not None and self.mode == "answer":
+            return self._symbolic(query, pattern)
+        return self._tagged(self.llm.invoke(query), pattern)
+
+    async def ainvoke(self, query):
+        """Returns a chain response for one query asynchronously; see invoke()."""
+        pattern = self._match(query)
+        if pattern is not None and self.mode == "answer":
+            return self._symbolic(query, pattern)
+        return self._tagged(await self.llm.ainvoke(query), pattern)
+
+    def _match(self, query):
+        if self.mode == "off":
+            return None
+        pattern = self.symbolic.match(query)
+        self.counts[pattern] = self.counts.get(pattern, 0) + 1
+        return pattern
+
+    def _symbolic(self, query, pattern):
+        return { **query, "text": { "rationale": f"Entailed symbolically ({pattern}).", "answer": "1", "source": "symbolic", "pattern": pattern } }
+
+    def _tagged(self, response, pattern):
+        if self.mode == "off":
+            return response
+        return { **response, "text": { **response["text"], "source": "model", "pattern": pattern } }
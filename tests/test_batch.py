@@ -0,0 +1,80 @@
+import json
+import os
+import time
+from typing import Dict
+import pytest
+from langchain_core.output_parsers import BaseOutputParser
+from backends import ReplayChatModel, replay_key
+from batch import LocalBatches, read_jsonl, run_batch
+from intension import Intension
+from parsing import AnswerParser
+
+class StrictAnswerParser(BaseOutputParser[Dict[str, str]]):
+    """Parser that, unlike AnswerParser, rejects outputs without an answer."""
+
+    @property
+    def _type(self) -> str:
+        return "strict_answer_parser"
+
+    def parse(self, text: str) -> Dict[str, str]:
+        if "Answer:" not in text:
+            raise ValueError(f"No answer in {text!r}")
+        return AnswerParser().parse(text)
+
+class StrictIntension(Intension):
+    OUTPUT_PARSER = StrictAnswerParser()
+
+QUERIES = [ { "s": f":A{i}", "p": "rdfs:subClassOf", "o": ":B", "graph": ":A0 rdfs:subClassOf :B ." } for i in range(4) ]
+
+class CountingBatches(LocalBatches):
+    """LocalBatches counting submissions and downloads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted = 0
+        self.downloaded = 0
+
+    def submit(self, path):
+        self.submitted += 1
+        return super().submit(path)
+
+    def download(self, batch_id, path):
+        self.downloaded += 1
+        return super().download(batch_id, path)
+
+def replay(llm):
+    # The first two triples are answered, the third gets an output without an answer, the fourth no response at all
+    prompts = [ llm.chain.prompt.format(**query) for query in QUERIES ]
+    responses = { replay_key(prompts[0]): "Rationale: it is asserted.\nAnswer: 1", replay_key(prompts[1]): "Rationale: nothing entails it.\nAnswer: 0",
+                  replay_key(prompts[2]): "I cannot tell." }
+    return ReplayChatModel(responses=responses)
+
+@pytest.mark.parametrize("format", [ "openai", "anthropic" ])
+def test_batch_runs_parse_results_and_report_failed_rows(tmp_path, format):
+    llm = StrictIntension(model="replay", cache=False)
+    api = CountingBatches(replay(llm), format=format)
+    records = run_batch(llm, QUERIES, str(tmp_path), api, poll_every=0)
+    assert [ (r["s"], r.get("answer")) for r in records[:2] ] == [ (":A0", "1"), (":A1", "0") ]
+    assert all("error" not in r and r["model"] == "replay" for r in records[:2])
+    assert "No answer" in records[2]["error"] and "answer" not in records[2]
+    assert "No recorded response" in records[3]["error"]
+    requests = list(read_jsonl(os.path.join(str(tmp_path), "requests.jsonl")))
+    body = requests[0]["body"] if format == "openai" else requests[0]["params"]
+    assert body["stop" if format == "openai" else "stop_sequences"] == Intension.STOP_SEQUENCES
+    assert api.submitted == 1 and api.downloaded == 1
+
+def test_an_interrupted_batch_run_resumes_polling_without_resubmitting(tmp_path):
+    llm = StrictIntension(model="replay", cache=False)
+    workdir = str(tmp_path)
+    api = CountingBatches(replay(llm), delay=0.2)
+    with pytest.raises(Exception, match="still running"):
+        run_batch(llm, QUERIES, workdir, api, poll_every=0.01, timeout=0)
+    assert json.load(open(os.path.join(workdir, "job.json")))["status"] == "running"
+    time.sleep(0.2)
+    records = run_batch(llm, QUERIES, workdir, api, poll_every=0.01)
+    assert [ r.get("answer") for r in records[:2] ] == [ "1", "0" ]
+    # A finished batch is read back from its downloaded results
+    assert run_batch(llm, QUERIES, workdir, api) == records
+    assert api.submitted == 1 and api.downloaded == 1
+    with pytest.raises(Exception, match="other queries"):
+        run_batch(llm, QUERIES[:2], workdir, api)
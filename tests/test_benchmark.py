@@ -0,0 +1,56 @@
+import os
+import pytest
+import backends
+import benchmark
+from benchmark import Benchmark, failures, synthetic_ontology, use_mock
+from mock_server import MockLLM, MockServer
+
+def huggingface_client_works():
+    # langchain_huggingface 0.0.3 posts through AsyncInferenceClient.post, which newer huggingface_hub releases removed
+    try:
+        from huggingface_hub import AsyncInferenceClient
+    except ImportError:
+        return False
+    return hasattr(AsyncInferenceClient, "post")
+
+@pytest.fixture(autouse=True)
+def restore_backends(monkeypatch):
+    monkeypatch.setattr(backends, "REGISTRY", list(backends.REGISTRY))
+    monkeypatch.delenv("HUGGINGFACEHUB_API_TOKEN", raising=False)
+
+# owlrl is slow under tracemalloc, which measures the memory of each stage's warm-up run
+@pytest.fixture
+def ontology(tmp_path):
+    path = tmp_path / "ontology.ttl"
+    path.write_text(synthetic_ontology(classes=10, properties=3))
+    return str(path)
+
+@pytest.mark.parametrize("model", [
+    "gpt-4o-mini-2024-07-18",
+    "claude-3-haiku-20240307",
+    pytest.param("meta-llama/Meta-Llama-3-70B-Instruct", marks=pytest.mark.skipif(not huggingface_client_works(),
+                                                                                   reason="installed huggingface_hub is incompatible with langchain_huggingface")),
+])
+def test_the_benchmark_runs_end_to_end_against_the_mock_server(ontology, model):
+    mock = MockLLM(latency=0.0, tokens_per_second=100000.0, completion_tokens=10)
+    with MockServer(mock) as server, Benchmark(ontology, queries=5, models=[ model ], mock=mock, repeat=1) as run_benchmark:
+        use_mock(server.url)
+        run = run_benchmark.run()
+    chain = f"chain:{backends.backend(model).name}"
+    assert list(run["stages"]) == [ "parse_closure", "build_queries", "render_prompts", chain, "parse_outputs", "compute_metrics" ]
+    assert run["stages"][chain]["items"] == 5
+    assert run["stages"][chain]["errors"] == 0
+    assert run["stages"][chain]["unparsed"] == 0
+    assert failures(run) == []
+
+def test_a_run_with_failed_requests_exits_non_zero_and_is_not_added_to_the_history(ontology, tmp_path, monkeypatch):
+    # Routes the OpenAI models to a path the mock server answers with 404, which is not retried
+    monkeypatch.setattr(benchmark, "use_mock", lambda url: backends.register("openai",
+        lambda model, temperature, cache: backends.openai_chat(model, temperature, cache, base_url=f"{url}/missing", api_key="mock"),
+        models=backends.OPENAI_MODELS))
+    history = str(tmp_path / "history.jsonl")
+    with pytest.raises(SystemExit) as exit:
+        benchmark.main([ "--ontology", ontology, "--queries", "3", "--repeat", "1", "--model", "gpt-4o-mini-2024-07-18",
+                         "--latency", "0", "--rate-limit", "0", "--malformed", "0", "--history", history ])
+    assert exit.value.code == 1
+    assert not os.path.exists(history)
@@ -0,0 +1,41 @@
+import json
+from checkpoint import RunWriter, export_json, read_records
+
+def record(i):
+    return { "s": f":A{i}", "p": "rdfs:subClassOf", "o": ":B", "model": "m", "rationale": "because", "answer": "1" }
+
+def write_corrupt_file(path):
+    with open(path, "wb") as f:
+        f.write((json.dumps(record(0)) + "\n").encode("utf-8"))
+        f.write(b'{"s": ":A1", "p": "rdfs:subCl\n')
+        f.write(b"\xff\xfe not utf-8\n")
+        f.write(b"[1, 2]\n")
+        f.write((json.dumps(record(1)) + "\n").encode("utf-8"))
+        f.write(b'{"s": ":A2", "p"')
+
+def test_reading_skips_undecodable_lines(tmp_path, capsys):
+    path = str(tmp_path / "run.jsonl")
+    write_corrupt_file(path)
+    assert [ r["s"] for r in read_records(path) ] == [ ":A0", ":A1" ]
+    assert "skipped 4 undecodable lines" in capsys.readouterr().err
+    export_json(path, str(tmp_path / "run.json"))
+    assert json.load(open(tmp_path / "run.json")) == [ record(0), record(1) ]
+
+def test_recovery_drops_undecodable_lines_and_the_partial_tail(tmp_path, capsys):
+    path = str(tmp_path / "run.jsonl")
+    write_corrupt_file(path)
+    with RunWriter(path) as writer:
+        assert writer.completed == { RunWriter.key(record(0)), RunWriter.key(record(1)) }
+        writer.write(record(2))
+    assert "dropped 3 undecodable lines" in capsys.readouterr().err
+    assert list(read_records(path)) == [ record(0), record(1), record(2) ]
+    assert capsys.readouterr().err == ""
+
+def test_recovery_leaves_a_clean_file_alone(tmp_path, capsys):
+    path = str(tmp_path / "run.jsonl")
+    with RunWriter(path) as writer:
+        writer.write(record(0))
+    with RunWriter(path) as writer:
+        writer.write(record(1))
+    assert list(read_records(path)) == [ record(0), record(1) ]
+    assert capsys.readouterr().err == ""
@@ -0,0 +1,55 @@
+import glob
+import json
+import os
+import pytest
+from rdflib import Graph, RDFS
+from rdflib.compare import isomorphic
+from benchmark import synthetic_ontology
+from compact import compact_turtle, round_trip
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EDGE_CASES = """
+@prefix : <http://example.org/edge#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+:Pet owl:equivalentClass [ owl:unionOf ( :Cat :Dog ) ] .
+:Cat rdfs:subClassOf [ a owl:Restriction ; owl:onProperty :eats ; owl:someValuesFrom :Fish ] ;
+    rdfs:comment "A cat."@en , "Un chat."@fr ; :lives 9 ; :weight 4.5 ; :indoor true ; :born "2020-01-01"^^xsd:date .
+:odd.name :p <http://example.org/other/a%20b?q=1> .
+_:a :next _:b .
+_:b :next _:a .
+_:shared :p :Cat .
+:Dog :q _:shared .
+:Fish :q _:shared .
+"""
+
+def ontologies():
+    # The ontologies shipped with the experiments, the benchmark's synthetic ontology and edge cases of the serializer
+    texts = {}
+    for filename in sorted(glob.glob(os.path.join(ROOT, "experiments", "*", "*.json"))):
+        for record in json.load(open(filename, "r")):
+            if record.get("graph"):
+                texts.setdefault(record["graph"], os.path.relpath(filename, ROOT))
+    cases = [ (name, text, "turtle") for text, name in texts.items() ]
+    for filename in sorted(glob.glob(os.path.join(ROOT, "data", "**", "*.owl"), recursive=True) +
+                           glob.glob(os.path.join(ROOT, "data", "**", "*.ttl"), recursive=True)):
+        cases.append((os.path.relpath(filename, ROOT), open(filename, "r").read(), "turtle"))
+    cases.append(("synthetic", synthetic_ontology(), "turtle"))
+    cases.append(("edge cases", EDGE_CASES, "turtle"))
+    return cases
+
+CASES = ontologies()
+
+@pytest.mark.parametrize("name,text,format", CASES, ids=[ case[0] for case in CASES ])
+@pytest.mark.parametrize("comments", [ True, False ])
+def test_compact_serialization_is_lossless(name, text, format, comments):
+    graph = Graph().parse(data=text, format=format)
+    compact = compact_turtle(graph, comments=comments)
+    assert round_trip(graph, compact, comments)
+    expected = graph if comments else Graph().parse(data=text, format=format)
+    if not comments:
+        expected.remove((None, RDFS.comment, None))
+    assert isomorphic(expected, Graph().parse(data=compact, format="turtle"))
@@ -0,0 +1,44 @@
+from rdflib import Graph
+from context import ContextExtractor
+
+ONTOLOGY = """
+@prefix : <http://example.org/> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+
+:A rdfs:subClassOf :B .
+:B rdfs:subClassOf :C .
+:Sibling rdfs:subClassOf :B .
+:Nephew rdfs:subClassOf :Sibling .
+:Other rdfs:subClassOf :C .
+:Part rdfs:subClassOf [ owl:unionOf ( :A :Unrelated ) ] .
+:Unrelated rdfs:label "unrelated" .
+:x :hasPart :y .
+:hasPart rdfs:domain :Whole ; rdfs:range :Part .
+:Whole rdfs:subClassOf :Thing .
+"""
+
+def subjects(text):
+    return { line.split()[0] for line in text.splitlines() if line.startswith(":") }
+
+def test_subclass_context_excludes_siblings_and_descendants_of_the_object():
+    extractor = ContextExtractor(Graph().parse(data=ONTOLOGY, format="turtle"), full_text=ONTOLOGY)
+    context = subjects(extractor.extract(":A", "rdfs:subClassOf", ":C"))
+    assert { ":A", ":B" } <= context
+    assert not context & { ":Sibling", ":Nephew", ":Other", ":Part", ":Unrelated" }
+
+def test_type_context_includes_domain_and_range_axioms():
+    extractor = ContextExtractor(Graph().parse(data=ONTOLOGY, format="turtle"), full_text=ONTOLOGY)
+    context = subjects(extractor.extract(":x", "rdf:type", ":Thing"))
+    assert { ":x", ":hasPart", ":Whole" } <= context
+    assert ":Sibling" not in context
+
+def test_type_context_of_an_object_includes_the_assertion_and_range_axioms():
+    extractor = ContextExtractor(Graph().parse(data=ONTOLOGY + ":hasPiece rdfs:subPropertyOf :hasPart .\n:z :hasPiece :w .\n", format="turtle"),
+                                 full_text=ONTOLOGY)
+    context = extractor.extract(":y", "rdf:type", ":Part")
+    assert ":x :hasPart :y ." in context
+    assert { ":x", ":hasPart", ":Part" } <= subjects(context)
+    context = subjects(extractor.extract(":w", "rdf:type", ":Part"))
+    assert { ":z", ":hasPiece", ":hasPart", ":Part" } <= context
+    assert not context & { ":Sibling", ":x" }
@@ -0,0 +1,42 @@
+import asyncio
+from engine import AsyncEngine
+from exemplar_pipeline import ExemplarPipeline
+
+class Model:
+    """Stand-in for a model that records how many of its calls are in flight at once."""
+
+    def __init__(self, provider, text):
+        self.model = f"{provider}-model"
+        self.provider = provider
+        self.text = text
+        self.active = 0
+        self.peak = 0
+
+    async def ainvoke(self, query):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return { **query, "text": dict(self.text) }
+
+def results(n):
+    return [ { "s": f":A{i}", "p": "rdfs:subClassOf", "o": ":B", "model": "m", "rationale": "no", "answer": "0" } for i in range(n) ]
+
+def test_validation_calls_keep_within_the_validator_provider_limit(tmp_path):
+    generator = Model("generating", { "revision": "It is entailed." })
+    validator = Model("validating", { "answer": "1" })
+    engine = AsyncEngine(limits={ "generating": 4, "validating": 1 })
+    pipeline = ExemplarPipeline(generator, validator, "", str(tmp_path / "store.jsonl"), engine)
+    counts = pipeline.run(results(8))
+    assert counts["validated"] == 8
+    assert generator.peak == 4
+    assert validator.peak == 1
+
+def test_a_validator_on_the_generator_provider_shares_its_slot(tmp_path):
+    generator = Model("shared", { "revision": "It is entailed." })
+    validator = Model("shared", { "answer": "0" })
+    engine = AsyncEngine(limits={ "shared": 2 })
+    pipeline = ExemplarPipeline(generator, validator, "", str(tmp_path / "store.jsonl"), engine)
+    counts = pipeline.run(results(4))
+    assert counts["rejected"] == 4
+    assert validator.peak <= 2
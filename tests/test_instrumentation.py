@@ -0,0 +1,19 @@
+import asyncio
+from instrumentation import CallTracer
+from intension import Intension
+from test_llm import QUERY
+
+def test_streams_stopped_at_the_answer_are_traced_as_parsed_calls():
+    tracer = CallTracer()
+    intension = Intension(model="streaming-test", cache=False, streaming=True).instrument(tracer)
+    intension.invoke(QUERY)
+    intension.invoke(QUERY)
+    asyncio.run(intension.ainvoke(QUERY))
+    assert intension.stream_stats["stopped"] == 3
+    assert len(tracer.records) == 3
+    for record in tracer.records:
+        assert "error" not in record
+        assert record["parse"] == "parsed"
+        assert record["retries"] == 0
+        assert record["completion_tokens"] > 0
+    assert not tracer._failures and not tracer._pending
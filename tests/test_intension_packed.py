@@ -0,0 +1,43 @@
+import re
+from typing import Any, List, Optional
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+import backends
+from backends import ReplayChatModel
+from intension_packed import PackedIntension, PackedOutputParser
+
+class MisnumberingChatModel(ReplayChatModel):
+    """Model answering 1 for triples whose object is :True, numbering the blocks of packs from 0 and of single triples from 1."""
+
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "misnumbering-test"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.prompts.append(prompt)
+        objects = re.findall(r"Object: <(.*)>", prompt)
+        start = 0 if len(objects) > 1 else 1
+        text = "".join(f"### {start + i}\nRationale: because\nAnswer: {int(o == ':True')}\n" for i, o in enumerate(objects))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+backends.register("misnumbering-test", lambda model, temperature, cache: MisnumberingChatModel(cache=cache, prompts=[]),
+                  pattern=r"misnumbering-test")
+
+QUERIES = [ { "s": f":S{i}", "p": ":p", "o": ":True" if i % 2 else ":False", "graph": ":S1 :p :True ." } for i in range(4) ]
+
+def test_parser_returns_blocks_in_order():
+    text = "### 2\nRationale: b\nAnswer: 0\n### 1\nRationale: a\nAnswer: 1\n### 3\nRationale: c\n"
+    assert PackedOutputParser().parse(text) == [
+        (2, { "rationale": "b", "answer": "0" }), (1, { "rationale": "a", "answer": "1" }), (3, { "rationale": "c", "answer": "" }),
+    ]
+
+def test_misnumbered_packs_fall_back_to_single_calls():
+    intension = PackedIntension(model="misnumbering-test", cache=False, pack_size=4)
+    results = intension.run(QUERIES)
+    assert [ r["answer"] for r in results ] == [ "0", "1", "0", "1" ]
+    assert [ (r["s"], r["o"]) for r in results ] == [ (q["s"], q["o"]) for q in QUERIES ]
+    # One pack of four, then the four triples one per call
+    assert len(intension.llm.prompts) == 5
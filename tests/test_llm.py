@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, List, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import backends
+from backends import ReplayChatModel
+from cache import ResponseCache
+from intension import Intension
+
+OUTPUT = "Rationale: the subject is a subclass of the object.\nAnswer: 1\n###\nSubject: <:Invented>\n"
+
+class StreamingChatModel(ReplayChatModel):
+    """Replay model that streams its output a few characters at a time and counts the calls reaching it."""
+
+    calls: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-test"
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        self.calls.append("stream")
+        text = self.default
+        for i in range(0, len(text), 4):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + 4]))
+
+backends.register("streaming-test", lambda model, temperature, cache: StreamingChatModel(default=OUTPUT, cache=cache, calls=[]),
+                  pattern=r"streaming-test")
+
+QUERY = { "s": ":A", "p": "rdfs:subClassOf", "o": ":B", "graph": ":A rdfs:subClassOf :B ." }
+
+def test_streamed_calls_are_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    intension = Intension(model="streaming-test", cache=cache, streaming=True)
+    first = intension.invoke(QUERY)
+    second = intension.invoke(QUERY)
+    assert intension.llm.calls == [ "stream" ]
+    assert first["text"] == second["text"] and first["text"]["answer"] == "1"
+    assert cache.stats()["hits"] == 1 and cache.stats()["entries"] == 1
+
+def test_async_streamed_calls_are_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    intension = Intension(model="streaming-test", cache=cache, streaming=True)
+    asyncio.run(intension.ainvoke(QUERY))
+    response = asyncio.run(intension.ainvoke(QUERY))
+    assert intension.llm.calls == [ "stream" ]
+    assert response["text"]["answer"] == "1"
+    assert cache.stats()["hits"] == 1
+
+class JSONModeChatModel(ReplayChatModel):
+    """Replay model that, like OpenAI's JSON mode, rejects requests in JSON mode whose prompt does not mention JSON."""
+
+    requests: List[dict] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "json-mode-test"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.requests.append({ "response_format": kwargs.get("response_format"), "stop": stop })
+        if kwargs.get("response_format") and "JSON" not in prompt:
+            raise Exception("'messages' must contain the word 'json' in some form, to use 'response_format' of type 'json_object'")
+        # The answer is left out of the JSON object, so that every output needs repair
+        text = "1" if prompt.rstrip().endswith("Answer:") else '{"rationale": "The subject is a subclass of the object."}'
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+# Registered as "local" so that structured=True binds JSON mode, as for local and OpenAI models
+backends.register("local", lambda model, temperature, cache: JSONModeChatModel(cache=cache, requests=[]), pattern=r"json-mode-test")
+
+def test_structured_outputs_are_repaired_outside_json_mode():
+    intension = Intension(model="json-mode-test", cache=False, structured=True)
+    model = intension.llm.bound
+    assert intension.llm.kwargs == { "response_format": { "type": "json_object" } }
+    response = intension.invoke(QUERY)
+    assert response["text"]["answer"] == "1"
+    assert model.requests == [ { "response_format": { "type": "json_object" }, "stop": None }, { "response_format": None, "stop": [ "\n" ] } ]
+    responses = intension.batch([ QUERY, QUERY ])
+    assert [ r["text"]["answer"] for r in responses ] == [ "1", "1" ]
+    assert asyncio.run(intension.ainvoke(QUERY))["text"]["answer"] == "1"
+
+def test_only_discarded_tokens_of_uncached_streams_count_as_saved(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    intension = Intension(model="streaming-test", cache=cache, streaming=True)
+    first = intension.invoke(QUERY)
+    second = intension.invoke(QUERY)
+    # Chunks are 4 characters, so at most one chunk beyond the answer is read and discarded
+    assert 0 < first["stream"]["tokens_saved"] <= 1
+    assert second["stream"]["cached"] and second["stream"]["tokens_saved"] == 0
+    assert intension.stream_stats == { "calls": 1, "stopped": 1, "completion_tokens": first["stream"]["completion_tokens"],
+                                       "tokens_saved": first["stream"]["tokens_saved"], "cached": 1 }
+
+class BudgetedStreamingChatModel(StreamingChatModel):
+    """Streaming replay model with a generation budget, as set by max_tokens on provider models."""
+
+    max_tokens: int = 500
+
+backends.register("budgeted-test", lambda model, temperature, cache: BudgetedStreamingChatModel(default=OUTPUT, cache=cache, calls=[]),
+                  pattern=r"budgeted-test")
+
+def test_the_generation_budget_bounds_unspent_tokens_apart_from_the_saving():
+    intension = Intension(model="budgeted-test", cache=False, streaming=True)
+    stream = intension.invoke(QUERY)["stream"]
+    assert stream["tokens_saved"] <= 1
+    assert stream["tokens_unspent"] == 500 - stream["completion_tokens"]
+    assert intension.stream_stats["tokens_saved"] == stream["tokens_saved"]
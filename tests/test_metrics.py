@@ -0,0 +1,15 @@
+from metrics import MISSING, Results
+
+def test_duplicate_records_keep_the_last_and_are_counted():
+    experiments = {
+        "a": [
+            { "s": ":A", "p": ":p", "o": ":B", "answer": "0" },
+            { "s": ":C", "p": ":p", "o": ":D", "answer": "1" },
+            { "s": ":A", "p": ":p", "o": ":B", "answer": "1" },
+        ],
+        "b": [ { "s": ":C", "p": ":p", "o": ":D", "answer": "0" } ],
+    }
+    results = Results.from_records(experiments)
+    assert results.duplicates == { "a": 1 }
+    assert results.answers.tolist() == [ [ 1, 1 ], [ MISSING, 0 ] ]
+    assert list(results.summary()["N"]) == [ 2, 1 ]
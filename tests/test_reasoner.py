@@ -0,0 +1,55 @@
+import pytest
+from rdflib import Graph
+from reasoner import compare
+
+PREFIXES = """
+@prefix : <http://example.org/reasoner#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+"""
+
+# One small ontology per rule, each with an instance for the rule to fire on
+RULES = {
+    "subClassOf": """
+        :A a owl:Class ; rdfs:subClassOf :B . :B a owl:Class ; rdfs:subClassOf :C . :C a owl:Class .
+        :a a :A .
+    """,
+    "subPropertyOf": """
+        :p a owl:ObjectProperty ; rdfs:subPropertyOf :q . :q a owl:ObjectProperty ; rdfs:subPropertyOf :r . :r a owl:ObjectProperty .
+        :a :p :b .
+    """,
+    "domain": """
+        :p a owl:ObjectProperty ; rdfs:domain :A . :A a owl:Class ; rdfs:subClassOf :B . :B a owl:Class .
+        :a :p :b .
+    """,
+    "range": """
+        :p a owl:ObjectProperty ; rdfs:range :A . :A a owl:Class ; rdfs:subClassOf :B . :B a owl:Class .
+        :a :p :b .
+    """,
+    "inverse": """
+        :p a owl:ObjectProperty ; owl:inverseOf :q . :q a owl:ObjectProperty .
+        :a :p :b . :c :q :d .
+    """,
+    "transitive": """
+        :p a owl:ObjectProperty, owl:TransitiveProperty .
+        :a :p :b . :b :p :c . :c :p :d .
+    """,
+    "equivalence": """
+        :A a owl:Class ; owl:equivalentClass :B . :B a owl:Class .
+        :p a owl:ObjectProperty ; owl:equivalentProperty :q . :q a owl:ObjectProperty .
+        :a a :A ; :p :b ; owl:sameAs :c . :c :q :d .
+    """,
+}
+
+@pytest.mark.parametrize("rule", list(RULES))
+def test_the_reasoner_infers_what_owlrl_infers(rule):
+    result = compare(Graph().parse(data=PREFIXES + RULES[rule], format="turtle"))
+    assert result["inferred"] > 0
+    assert result["missing"] == set()
+    assert result["extra"] == set()
+
+def test_the_reasoner_infers_what_owlrl_infers_with_all_rules_together():
+    result = compare(Graph().parse(data=PREFIXES + "".join(RULES.values()), format="turtle"))
+    assert result["missing"] == set()
+    assert result["extra"] == set()
@@ -0,0 +1,13 @@
+from result_store import ResultStore
+
+def records(model, answer):
+    return [ { "s": ":A", "p": "rdfs:subClassOf", "o": ":B", "model": model, "rationale": "because", "answer": answer } ]
+
+def test_models_with_the_same_name_from_different_sources_are_kept_apart(tmp_path):
+    store = ResultStore(str(tmp_path))
+    models = { "org-a/model": "1", "org-b/model": "0", "local:model": "1", "model": "0" }
+    for model, answer in models.items():
+        store.write(records(model, answer), "nesy4vrd", "test", model)
+    results = store.load(columns=[ "model", "answer" ])
+    assert dict(zip(results["model"].astype(str), results["answer"].astype(str))) == models
+    assert list(store.load(columns=[ "model" ], models=[ "org-b/model" ])["model"].astype(str)) == [ "org-b/model" ]
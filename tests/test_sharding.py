@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import time
+import pytest
+from checkpoint import RunWriter
+from sharding import Lease, _leased, merge, plan, shard_of
+
+def test_an_expired_lease_is_taken_over_and_the_old_holder_can_no_longer_renew(tmp_path):
+    path = str(tmp_path / "shard-0.lease")
+    old, new = Lease(path, "old", seconds=0.05), Lease(path, "new", seconds=60)
+    assert old.acquire()
+    assert not new.acquire()
+    time.sleep(0.1)
+    assert new.acquire()
+    with pytest.raises(Exception, match="no longer held"):
+        old.renew()
+    old.release()
+    assert json.load(open(path))["owner"] == "new"
+
+def test_a_run_whose_lease_is_taken_over_is_cancelled(tmp_path):
+    path = str(tmp_path / "shard-0.lease")
+    lease = Lease(path, "old", seconds=0.3)
+    assert lease.acquire()
+    written = []
+    async def run():
+        while True:
+            written.append(len(written))
+            await asyncio.sleep(0.02)
+    async def main():
+        task = asyncio.ensure_future(_leased(run(), lease))
+        await asyncio.sleep(0.05)
+        # Another worker takes the lease over
+        json.dump({ "owner": "new", "expires": time.time() + 60 }, open(path, "w"))
+        with pytest.raises(Exception, match="no longer held"):
+            await task
+        stopped = len(written)
+        await asyncio.sleep(0.1)
+        return stopped
+    started = time.time()
+    stopped = asyncio.run(main())
+    assert time.time() - started < 1
+    assert len(written) == stopped
+
+def test_a_finished_run_returns_its_result(tmp_path):
+    lease = Lease(str(tmp_path / "shard-0.lease"), "owner", seconds=0.03)
+    assert lease.acquire()
+    async def run():
+        await asyncio.sleep(0.05)
+        return 3
+    assert asyncio.run(_leased(run(), lease)) == 3
+
+def test_merge_reports_missing_and_duplicate_keys(tmp_path):
+    workdir = str(tmp_path)
+    queries = [ { "s": f":A{i}", "p": "rdfs:subClassOf", "o": ":B" } for i in range(4) ]
+    plan(workdir, queries, [ "m1", "m2" ], shards=2)
+    records = [ { **q, "model": model, "rationale": "", "answer": "1" } for model in ("m1", "m2") for q in queries ]
+    # m2 misses its last query and has its first written twice, as by a shard rerun after a lost lease
+    records = [ r for r in records if not (r["model"] == "m2" and r["s"] == ":A3") ] + [ { **records[4], "answer": "0" } ]
+    for record in records:
+        with RunWriter(os.path.join(workdir, "parts", f"shard-{shard_of(record, 2)}.jsonl")) as writer:
+            writer.write(record)
+    filename = lambda model: os.path.join(workdir, "out", f"{model}.json")
+    results, report = merge(workdir, filename)
+    assert report["m1"] == { "records": 4, "missing": [], "duplicates": [] }
+    assert report["m2"]["records"] == 3
+    assert report["m2"]["missing"] == [ (":A3", "rdfs:subClassOf", ":B") ]
+    assert report["m2"]["duplicates"] == [ (":A0", "rdfs:subClassOf", ":B") ]
+    assert [ r["s"] for r in results["m1"] ] == [ ":A0", ":A1", ":A2", ":A3" ]
+    assert results["m2"][0]["answer"] == "1"
+    assert os.path.isfile(filename("m1")) and not os.path.isfile(filename("m2"))
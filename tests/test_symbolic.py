@@ -0,0 +1,16 @@
+import pytest
+from rdflib import OWL, RDFS
+from symbolic import SymbolicFilter
+
+@pytest.mark.parametrize("query, pattern", [
+    ({ "s": "vrd:feed", "p": "rdfs:domain", "o": "owl:Thing" }, "domain-thing"),
+    ({ "s": "vrd:feed", "p": "rdfs:range", "o": "owl:Thing" }, "range-thing"),
+    ({ "s": "http://example.org/vrd#feed", "p": str(RDFS.range), "o": str(OWL.Thing) }, "range-thing"),
+    ({ "s": "vrd:feed", "p": "rdfs:range", "o": "vrd:Animal" }, None),
+])
+def test_domain_and_range_of_owl_thing_are_recognised(query, pattern):
+    assert SymbolicFilter().match(query) == pattern
+
+def test_range_thing_can_be_left_out():
+    patterns = tuple(p for p in SymbolicFilter.PATTERNS if p != "range-thing")
+    assert SymbolicFilter(patterns=patterns).match({ "s": "vrd:feed", "p": "rdfs:range", "o": "owl:Thing" }) is None
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, ClassVar, List, Optional
+import backends
+from backends import ReplayChatModel
+from engine import AsyncEngine
+from intension import Intension
+from test_llm import OUTPUT, QUERY
+from voting import SelfConsistency
+
+class ConcurrencyChatModel(ReplayChatModel):
+    """Replay model recording the largest number of its calls in flight at once."""
+
+    # Shared by every instance, so that the samplers' models are counted together
+    counts: ClassVar[dict] = { "active": 0, "peak": 0 }
+
+    @property
+    def _llm_type(self) -> str:
+        return "concurrency-test"
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        self.counts["active"] += 1
+        self.counts["peak"] = max(self.counts["peak"], self.counts["active"])
+        try:
+            await asyncio.sleep(0.01)
+            return self._generate(messages, stop, run_manager, **kwargs)
+        finally:
+            self.counts["active"] -= 1
+
+backends.register("concurrency-test", lambda model, temperature, cache: ConcurrencyChatModel(default=OUTPUT, cache=cache),
+                  pattern=r"concurrency-test")
+
+def test_samples_stay_within_the_engine_limit():
+    voting = SelfConsistency(Intension(model="concurrency-test", cache=False), k=5, margin=5, temperature=0.7)
+    queries = [ { **QUERY, "s": f":S{i}" } for i in range(6) ]
+    records = asyncio.run(AsyncEngine(limits={ "concurrency-test": 3 }).run(voting, queries))
+    assert [ r["samples"] for r in records ] == [ [ "1" ] * 5 ] * 6
+    assert ConcurrencyChatModel.counts["peak"] == 3
+
+def test_samples_keep_json_mode():
+    intension = Intension(model="json-mode-test", cache=False, structured=True)
+    voting = SelfConsistency(intension, k=3, temperature=0.7)
+    for sampler in voting.samplers:
+        assert sampler.llm.kwargs == { "response_format": { "type": "json_object" } }
+        assert sampler.chain.llm is sampler.llm
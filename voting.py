@@ -0,0 +1,120 @@
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from langchain.chains import LLMChain
+import backends
+from cache import SaltedCache
+from engine import SLOT
+
+class SelfConsistency:
+    """Adaptive self-consistency voting over repeated samples of an Intension, with sequential early stopping."""
+
+    def __init__(self, intension, k=5, margin=2, temperature=None):
+        """
+        Initializes a voting classifier around an intension.
+
+        Samples are drawn until one answer leads the other by margin votes, or k samples have been drawn.
+        With the default margin of 2, two agreeing first samples settle the vote; a split vote draws
+        only as many further samples as could still settle it, concurrently; run by an AsyncEngine, the
+        samples of all queries together stay within the engine's limit for the provider.
+
+        Parameters:
+            intension: An Intension (or other LLM whose output has "rationale" and "answer" entries).
+            k: The maximum number of samples per triple (default 5).
+            margin: The lead in votes at which sampling stops (default 2).
+            temperature: The sampling temperature (default the temperature of the intension).
+         """
+        self.intension = intension
+        self.model = intension.model
+        self.provider = intension.provider
+        self.k = k
+        self.margin = margin
+        self.temperature = intension.temperature if temperature is None else temperature
+        self.samplers = [ self._sampler(i) for i in range(k) ]
+        self.queries = 0
+        self.calls = 0
+
+    def invoke(self, query):
+        """
+        Returns a chain response for one query whose "text" holds the majority answer, a rationale given for it,
+        and the answers of all samples drawn.
+
+        Parameters:
+            query: The input dict for the chain.
+        """
+        responses = []
+        with ThreadPoolExecutor(max_workers=self.k) as executor:
+            while self._needed(responses):
+                indices = range(len(responses), len(responses) + self._needed(responses))
+                responses.extend(executor.map(lambda i: self.samplers[i].invoke(query), indices))
+        return self._vote(query, responses)
+
+    async def ainvoke(self, query):
+        """
+        Returns a chain response for one query asynchronously; see invoke().
+
+        Parameters:
+            query: The input dict for the chain.
+        """
+        responses = []
+        while self._needed(responses):
+            indices = range(len(responses), len(responses) + self._needed(responses))
+            responses.extend(await self._samples(query, indices))
+        return self._vote(query, responses)
+
+    def stats(self):
+        """Returns the number of triples voted on, the number of samples drawn and the mean samples per triple."""
+        return { "queries": self.queries, "calls": self.calls, "mean_calls": self.calls / self.queries if self.queries else 0.0 }
+
+    async def _samples(self, query, indices):
+        slot = SLOT.get()
+        if slot is None:
+            return await asyncio.gather(*[ self.samplers[i].ainvoke(query) for i in indices ])
+        # Run by an AsyncEngine, the query holds one slot of the provider's limit; further samples run alongside
+        # only in slots that are free now, and otherwise in turn, since waiting for a slot while holding one can deadlock
+        extra = 0
+        while extra < len(indices) - 1 and not slot.locked():
+            await slot.acquire()
+            extra += 1
+        async def lane(part):
+            return [ (i, await self.samplers[i].ainvoke(query)) for i in part ]
+        try:
+            lanes = await asyncio.gather(*[ lane(indices[j::extra + 1]) for j in range(extra + 1) ])
+        finally:
+            for _ in range(extra):
+                slot.release()
+        return [ response for _, response in sorted((item for part in lanes for item in part), key=lambda item: item[0]) ]
+
+    def _sampler(self, i):
+        # Each sample has its own cache entries, so reruns are reproducible without every sample being the same cached response;
+        # the first sample at the intension's own temperature shares the entries of ordinary single-sample runs
+        if self.temperature == self.intension.temperature and (self.intension.cache is None or i == 0):
+            return self.intension
+        sampler = copy.copy(self.intension)
+        cache = None if self.intension.cache is None else SaltedCache(self.intension.cache, f"sample-{i}")
+        sampler.cache = cache
+        sampler.llm = backends.create(self.model, self.temperature, cache)
+        if hasattr(self.intension.llm, "bound"):
+            # Structured intensions bind JSON mode to their model
+            sampler.llm = sampler.llm.bind(**self.intension.llm.kwargs)
+        sampler.chain = LLMChain(llm=sampler.llm, prompt=self.intension.chain.prompt, output_parser=self.intension.chain.output_parser)
+        if self.intension.tracer is not None:
+            sampler.instrument(self.intension.tracer)
+        return sampler
+
+    def _needed(self, responses):
+        answers = [ r["text"].get("answer") for r in responses ]
+        lead = abs(answers.count("1") - answers.count("0"))
+        if lead >= self.margin:
+            return 0
+        return min(self.margin - lead, self.k - len(responses))
+
+    def _vote(self, query, responses):
+        answers = [ r["text"].get("answer", "") for r in responses ]
+        ones, zeros = answers.count("1"), answers.count("0")
+        # Ties, possible only when the cap is reached, go to the first parsed sample
+        answer = "1" if ones > zeros else "0" if zeros > ones else next((a for a in answers if a), "")
+        winner = next((r for r in responses if r["text"].get("answer") == answer), responses[0])
+        self.queries += 1
+        self.calls += len(responses)
+        return { **query, "text": { **winner["text"], "answer": answer, "samples": answers } }